@@ -0,0 +1,173 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Generate synthetic evaluation and run directories for benchmarking
+Prost Lab itself.
+"""
+
+import json
+import os
+import random
+
+from lab import tools
+
+from prostlab.reports import PlanningReport
+
+
+_POSITIVE_FLOAT_KEYWORDS = ["time", "perc", "avg"]
+
+
+def _is_list_attribute(attribute):
+    return attribute.function.__name__.startswith("elementwise")
+
+
+def _get_value(attribute, rng):
+    if "reward" in attribute:
+        return rng.uniform(-100.0, 0.0)
+    if any(keyword in attribute for keyword in _POSITIVE_FLOAT_KEYWORDS):
+        return rng.uniform(0.01, 100.0)
+    return rng.randint(1, 100000)
+
+
+def generate_run(algorithm, domain, problem, list_length, rng):
+    """Return the properties of a single synthetic run with values for
+    all attributes in :py:attr:`PlanningReport.PREDEFINED_ATTRIBUTES`."""
+    run = {
+        "id": [algorithm, domain, problem],
+        "algorithm": algorithm,
+        "domain": domain,
+        "problem": problem,
+        "run_dir": "runs-00001-00100/{}-{}-{}".format(algorithm, domain, problem),
+        "min_reward": -100.0,
+        "max_reward": None,
+        "node": "ase{:02d}.cluster.bc2.ch".format(rng.randint(1, 24)),
+        "local_revision": "main",
+        "global_revision": "0123abc",
+        "revision_summary": "0123abc",
+        "build_options": [],
+        "parser_options": [],
+        "driver_options": ["-s", "1"],
+        "search_engine": "IPC2014",
+        "planner_wall_clock_time": rng.uniform(10.0, 1000.0),
+        "raw_memory": rng.randint(10000, 3000000),
+    }
+    for attribute in PlanningReport.PREDEFINED_ATTRIBUTES:
+        # Skip computed attributes and patterns such as "*_std".
+        if attribute == "ipc_score" or "*" in str(attribute):
+            continue
+        if _is_list_attribute(attribute):
+            run[attribute] = [_get_value(attribute, rng) for _ in range(list_length)]
+        else:
+            run[attribute] = _get_value(attribute, rng)
+    run["average_reward"] = rng.uniform(-100.0, 0.0)
+    return run
+
+
+def generate_eval_dir(
+    path, num_algorithms, num_domains, num_problems, list_length, seed=0
+):
+    """Write a properties file with one run for each combination of
+    *num_algorithms* algorithms, *num_domains* domains and
+    *num_problems* problems per domain to the eval dir *path*.
+
+    List attributes contain *list_length* values.
+    """
+    rng = random.Random(seed)
+    props = {}
+    for algo_index in range(num_algorithms):
+        algorithm = "algo-{:03d}".format(algo_index)
+        for domain_index in range(num_domains):
+            domain = "domain{:03d}-2014".format(domain_index)
+            for problem_index in range(1, num_problems + 1):
+                problem = "inst-{:02d}".format(problem_index)
+                run = generate_run(algorithm, domain, problem, list_length, rng)
+                props["-".join(run["id"])] = run
+    tools.makedirs(path)
+    with open(os.path.join(path, "properties"), "w") as f:
+        json.dump(props, f, indent=2, separators=(",", ": "), sort_keys=True)
+    return len(props)
+
+
+def _get_step_lines(rng):
+    return [
+        "Entries in probabilistic state value cache: {}".format(rng.randint(0, 10 ** 6)),
+        "Buckets in probabilistic state value cache: {}".format(rng.randint(0, 10 ** 6)),
+        "Entries in probabilistic applicable actions cache: {}".format(rng.randint(0, 10 ** 4)),
+        "Buckets in probabilistic applicable actions cache: {}".format(rng.randint(0, 10 ** 4)),
+        "Number of remaining steps in first solved state: {}".format(rng.randint(0, 40)),
+        "Number of trials in first relevant state: {}".format(rng.randint(1, 10 ** 5)),
+        "Number of search nodes in first relevant state: {}".format(rng.randint(1, 10 ** 6)),
+        "Percentage exploration in first relevant state: {:.4f}".format(rng.random()),
+        "Entries in deterministic state value cache: {}".format(rng.randint(0, 10 ** 6)),
+        "Buckets in deterministic state value cache: {}".format(rng.randint(0, 10 ** 6)),
+        "Entries in deterministic applicable actions cache: {}".format(rng.randint(0, 10 ** 4)),
+        "Buckets in deterministic applicable actions cache: {}".format(rng.randint(0, 10 ** 4)),
+        "Entries in IDS reward cache: {}".format(rng.randint(0, 10 ** 5)),
+        "Buckets in IDS reward cache: {}".format(rng.randint(0, 10 ** 5)),
+        "Average search depth in first relevant state: {:.4f}".format(rng.uniform(1, 20)),
+        "Total number of runs: {}".format(rng.randint(1, 10 ** 5)),
+        "Total average search depth: {:.4f}".format(rng.uniform(1, 20)),
+    ]
+
+
+def generate_run_dir(path, num_rounds, horizon, filler_lines=20, seed=0):
+    """Write a ``run.log`` and a ``driver.log`` that contain all patterns
+    of the Prost, THTS and IDS parsers for *num_rounds* rounds with
+    *horizon* steps each to the run dir *path*.
+
+    Each step is padded with *filler_lines* lines that match no pattern.
+    """
+    rng = random.Random(seed)
+    tools.makedirs(path)
+    lines = [
+        "PROST parser complete running time: {:.2f}s".format(rng.uniform(0.1, 100)),
+        "THTS heuristic IDS: Setting max search depth to: {}".format(rng.randint(1, 15)),
+    ]
+    total_reward = 0.0
+    for round_index in range(1, num_rounds + 1):
+        round_reward = 0.0
+        for step in range(1, horizon + 1):
+            lines.append(
+                "Planning step {}/{} in round {}/{}".format(
+                    step, horizon, round_index, num_rounds
+                )
+            )
+            lines.extend(
+                "Filler output of step {} (line {})".format(step, index)
+                for index in range(filler_lines)
+            )
+            lines.extend(_get_step_lines(rng))
+            round_reward += rng.uniform(-10, 0)
+        total_reward += round_reward
+        lines.append(
+            ">>> END OF ROUND {} -- REWARD RECEIVED: {:.4f}".format(
+                round_index, round_reward
+            )
+        )
+    lines.append(">>> END OF SESSION  -- TOTAL REWARD: {:.4f}".format(total_reward))
+    lines.append(
+        ">>> END OF SESSION  -- AVERAGE REWARD: {:.4f}".format(total_reward / num_rounds)
+    )
+    lines.append("PROST complete running time: {:.2f}".format(rng.uniform(100, 1000)))
+    tools.write_file(os.path.join(path, "run.log"), "\n".join(lines) + "\n")
+    tools.write_file(
+        os.path.join(path, "driver.log"),
+        "node: synthetic-node\nplanner wall-clock time: {:.2f}s\n".format(
+            rng.uniform(100, 1000)
+        ),
+    )
+    tools.write_file(os.path.join(path, "properties"), "{}")
@@ -0,0 +1,286 @@
+#! /usr/bin/env python
+#
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measure the time and memory Prost Lab needs to generate reports and to
+parse logs on synthetic data, and compare them to stored baselines.
+
+Each benchmark runs in a separate process, so that its peak memory
+usage (maximum resident set size) can be measured reliably. Since
+absolute numbers depend on the machine, every invocation also runs a
+fixed reference benchmark (the calibration workload of the supervisor
+in a process that imports the report modules) and baselines store time
+and memory relative to it. Regenerate the baselines with
+``--update-baselines`` whenever a change affects the performance of
+reports or parsers, and commit them together with the change.
+
+    ./benchmarks/run_benchmarks.py                  # compare to baselines
+    ./benchmarks/run_benchmarks.py report-medium    # run a single benchmark
+    ./benchmarks/run_benchmarks.py --update-baselines
+
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(DIR)
+sys.path.insert(0, REPO)
+
+from lab import tools
+
+import generate
+
+
+BASELINES_FILE = os.path.join(DIR, "baselines.json")
+PARSERS_DIR = os.path.join(REPO, "prostlab", "parsers")
+
+#: Benchmark that all results are measured relative to.
+REFERENCE = "reference"
+
+#: Report benchmarks: (algorithms, domains, problems per domain, list length).
+REPORT_SIZES = {
+    "report-small": (4, 8, 10, 40),
+    "report-medium": (12, 16, 20, 40),
+    "report-large": (24, 24, 20, 60),
+}
+
+#: Parser benchmarks: (parser, run dirs, rounds, horizon).
+PARSER_SIZES = {
+    "parse-prost": ("prost-parser.py", 20, 30, 40),
+    "parse-thts": ("thts-parser.py", 20, 30, 40),
+    "parse-ids": ("ids-parser.py", 20, 30, 40),
+}
+
+REPORT_ATTRIBUTES = [
+    "ipc_score",
+    "average_reward",
+    "total_time",
+    "round_reward",
+    "trials_first_relevant_state",
+    "search_nodes_first_relevant_state",
+    "entries_prob_state_value_cache",
+]
+
+
+def _benchmark_report(tmp_dir, num_algorithms, num_domains, num_problems, list_length):
+    from prostlab.reports.absolute import AbsoluteReport
+
+    eval_dir = os.path.join(tmp_dir, "benchmark-eval")
+    generate.generate_eval_dir(
+        eval_dir, num_algorithms, num_domains, num_problems, list_length
+    )
+    report = AbsoluteReport(attributes=REPORT_ATTRIBUTES)
+    start = time.perf_counter()
+    report(eval_dir, os.path.join(tmp_dir, "report.html"))
+    return time.perf_counter() - start
+
+
+def _benchmark_parser(tmp_dir, parser, num_run_dirs, num_rounds, horizon):
+    run_dirs = []
+    for index in range(num_run_dirs):
+        run_dir = os.path.join(tmp_dir, "run-{:05d}".format(index))
+        generate.generate_run_dir(run_dir, num_rounds, horizon, seed=index)
+        run_dirs.append(run_dir)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [REPO] + [path for path in [env.get("PYTHONPATH")] if path]
+    )
+    start = time.perf_counter()
+    for run_dir in run_dirs:
+        subprocess.check_call(
+            [sys.executable, os.path.join(PARSERS_DIR, parser)], cwd=run_dir, env=env
+        )
+    return time.perf_counter() - start
+
+
+def _benchmark_reference():
+    # Import the same modules as the report benchmarks, so that the
+    # memory ratio reflects the data structures of the report.
+    from prostlab.reports.absolute import AbsoluteReport  # noqa: F401
+    from prostlab.supervisor import calibrate
+
+    return calibrate()
+
+
+def run_single_benchmark(name):
+    """Run the benchmark *name* in this process and print its results."""
+    tools.configure_logging(level=logging.WARNING)
+    tmp_dir = tempfile.mkdtemp(prefix="prostlab-benchmark-")
+    try:
+        if name == REFERENCE:
+            wall_time = _benchmark_reference()
+            usage = resource.RUSAGE_SELF
+        elif name in REPORT_SIZES:
+            wall_time = _benchmark_report(tmp_dir, *REPORT_SIZES[name])
+            usage = resource.RUSAGE_SELF
+        else:
+            wall_time = _benchmark_parser(tmp_dir, *PARSER_SIZES[name])
+            usage = resource.RUSAGE_CHILDREN
+    finally:
+        shutil.rmtree(tmp_dir)
+    # ru_maxrss is given in KiB on Linux.
+    memory = resource.getrusage(usage).ru_maxrss
+    print(json.dumps({"time": round(wall_time, 3), "memory": memory}))
+
+
+def run_benchmark(name):
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), "--single", name]
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def get_relative_result(result, reference):
+    """Return *result* relative to the *reference* result."""
+    return {
+        key: round(result[key] / reference[key], 3) for key in ["time", "memory"]
+    }
+
+
+def load_baselines():
+    """Return the stored relative baselines keyed by benchmark name."""
+    if not os.path.exists(BASELINES_FILE):
+        return {}
+    with open(BASELINES_FILE) as f:
+        return json.load(f)["benchmarks"]
+
+
+def write_baselines(baselines, reference):
+    with open(BASELINES_FILE, "w") as f:
+        json.dump(
+            {"reference": reference, "benchmarks": baselines},
+            f,
+            indent=2,
+            sort_keys=True,
+        )
+        f.write("\n")
+
+
+def compare(name, relative, baseline, time_tolerance, memory_tolerance):
+    """Return a list of regressions of the *relative* result compared
+    to the relative *baseline*."""
+    regressions = []
+    for key, tolerance in [("time", time_tolerance), ("memory", memory_tolerance)]:
+        if key in baseline and relative[key] > baseline[key] * tolerance:
+            regressions.append(
+                "{name}: relative {key} {value} exceeds baseline {base} "
+                "by more than a factor of {tolerance}".format(
+                    name=name,
+                    key=key,
+                    value=relative[key],
+                    base=baseline[key],
+                    tolerance=tolerance,
+                )
+            )
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        help="benchmarks to run (default: all): {}".format(
+            ", ".join(sorted(REPORT_SIZES) + sorted(PARSER_SIZES))
+        ),
+    )
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    parser.add_argument(
+        "--update-baselines",
+        action="store_true",
+        help="store the results as new baselines",
+    )
+    parser.add_argument(
+        "--time-tolerance",
+        type=float,
+        default=1.3,
+        help="allowed factor between measured and baseline time (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--memory-tolerance",
+        type=float,
+        default=1.2,
+        help="allowed factor between measured and baseline memory (default: %(default)s)",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.single:
+        run_single_benchmark(args.single)
+        return
+
+    all_names = sorted(REPORT_SIZES) + sorted(PARSER_SIZES)
+    for name in args.benchmarks:
+        if name not in all_names:
+            sys.exit("Unknown benchmark: {}".format(name))
+    names = args.benchmarks or all_names
+    baselines = load_baselines()
+    reference = run_benchmark(REFERENCE)
+    print(
+        "{:15} {:9.3f}s {:10d} KiB".format(
+            REFERENCE, reference["time"], reference["memory"]
+        )
+    )
+    results = {}
+    regressions = []
+    for name in names:
+        result = run_benchmark(name)
+        relative = get_relative_result(result, reference)
+        results[name] = relative
+        print(
+            "{:15} {:9.3f}s {:10d} KiB  (x{:.3f} time, x{:.3f} memory)".format(
+                name,
+                result["time"],
+                result["memory"],
+                relative["time"],
+                relative["memory"],
+            )
+        )
+        if name in baselines:
+            regressions.extend(
+                compare(
+                    name,
+                    relative,
+                    baselines[name],
+                    args.time_tolerance,
+                    args.memory_tolerance,
+                )
+            )
+
+    if args.update_baselines:
+        baselines.update(results)
+        write_baselines(baselines, reference)
+        print("Wrote baselines to {}".format(BASELINES_FILE))
+    elif regressions:
+        print("\n".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Pack finished run directories into a few indexed archives per
+experiment and read runs from these archives.
+
+Archives are zip files in the ``archives`` directory of the experiment.
+Each archive contains the files of up to *runs_per_archive* runs under
+their original paths (e.g., ``runs-00001-00100/00001/properties``), and
+the central directory of the zip format allows reading the files of a
+single run without unpacking the archive. The file ``archives.json`` in
+the experiment directory maps each archived run directory to its
+archive. Print a file of an archived run with::
+
+    python -m prostlab.archive EXP_DIR runs-00001-00100/00001 run.log
+
+"""
+
+import argparse
+from glob import glob
+import gzip
+import json
+import logging
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import zipfile
+
+from lab import tools
+from lab.experiment import STATIC_RUN_PROPERTIES_FILENAME
+from lab.fetcher import _check_eval_dir, Fetcher
+
+from prostlab.retry import classify_run, NODE_FAILURE
+from prostlab.supervisor import COMPRESSED_SUFFIX
+
+
+ARCHIVES_DIR = "archives"
+INDEX_FILE = "archives.json"
+
+
+def _get_run_dirs(exp_path):
+    return sorted(glob(os.path.join(exp_path, "runs-*-*", "*")))
+
+
+def _add_to_zip(archive, path, name):
+    """Add the file, directory or symbolic link *path* to *archive*
+    under *name*."""
+    if os.path.islink(path):
+        info = zipfile.ZipInfo(name)
+        info.external_attr = (stat.S_IFLNK | 0o777) << 16
+        archive.writestr(info, os.readlink(path))
+    elif os.path.isdir(path):
+        for entry in sorted(os.listdir(path)):
+            _add_to_zip(archive, os.path.join(path, entry), name + "/" + entry)
+    else:
+        # Compressing compressed logs again only costs time.
+        if path.endswith(COMPRESSED_SUFFIX):
+            compression = zipfile.ZIP_STORED
+        else:
+            compression = zipfile.ZIP_DEFLATED
+        archive.write(path, name, compress_type=compression)
+
+
+def _extract_from_zip(archive, prefix, dest):
+    """Extract all files below *prefix* in *archive* to *dest*."""
+    for info in archive.infolist():
+        if not info.filename.startswith(prefix + "/"):
+            continue
+        path = os.path.join(dest, info.filename[len(prefix) + 1 :])
+        tools.makedirs(os.path.dirname(path))
+        if stat.S_ISLNK(info.external_attr >> 16):
+            os.symlink(archive.read(info).decode(), path)
+        else:
+            with archive.open(info) as src, open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+
+
+class RunArchive(object):
+    """Read access to the archived runs of the experiment at *exp_path*.
+
+    >>> archive = RunArchive("/path/to/exp")
+    >>> for run_dir in archive.run_dirs:
+    ...     log = archive.read_log(run_dir, "run.log")
+
+    """
+
+    def __init__(self, exp_path):
+        self.exp_path = exp_path
+        self.index_file = os.path.join(exp_path, INDEX_FILE)
+        self.index = {}
+        if os.path.exists(self.index_file):
+            with open(self.index_file) as f:
+                self.index = json.load(f)
+        self._archives = {}
+
+    @property
+    def run_dirs(self):
+        """Sorted paths of the archived runs relative to the experiment."""
+        return sorted(self.index)
+
+    def _get_archive(self, run_dir):
+        name = self.index[run_dir]
+        if name not in self._archives:
+            self._archives[name] = zipfile.ZipFile(os.path.join(self.exp_path, name))
+        return self._archives[name]
+
+    def close(self):
+        for archive in self._archives.values():
+            archive.close()
+        self._archives = {}
+
+    def exists(self, run_dir, filename):
+        try:
+            self._get_archive(run_dir).getinfo(run_dir + "/" + filename)
+        except KeyError:
+            return False
+        return True
+
+    def read(self, run_dir, filename):
+        """Return the content of *filename* in the archived *run_dir* as
+        bytes. Raise KeyError if the file does not exist."""
+        return self._get_archive(run_dir).read(run_dir + "/" + filename)
+
+    def read_log(self, run_dir, filename):
+        """Return the content of the log *filename* in the archived
+        *run_dir*, which may have been compressed, as a string or None if
+        the log does not exist."""
+        for name in [filename, filename + COMPRESSED_SUFFIX]:
+            if self.exists(run_dir, name):
+                data = self.read(run_dir, name)
+                if name.endswith(COMPRESSED_SUFFIX):
+                    data = gzip.decompress(data)
+                return data.decode(errors="replace")
+        return None
+
+    def _read_properties(self, run_dir, filename):
+        if not self.exists(run_dir, filename):
+            return {}
+        return json.loads(self.read(run_dir, filename).decode())
+
+    def fetch_run(self, run_dir):
+        """Return the properties of the archived *run_dir* like
+        :meth:`lab.fetcher.Fetcher.fetch_dir` does for run directories."""
+        props = tools.Properties()
+        props.update(self._read_properties(run_dir, STATIC_RUN_PROPERTIES_FILENAME))
+        props.update(self._read_properties(run_dir, "properties"))
+        if not self.exists(run_dir, "driver.log"):
+            props.add_unexplained_error(
+                "driver.log is missing. Probably the run was never started."
+            )
+        for filename in ["driver.err", "run.err"]:
+            content = self.read_log(run_dir, filename)
+            if content:
+                props.add_unexplained_error("{}: {}".format(filename, content))
+        props["run_archive"] = self.index[run_dir]
+        return props
+
+    def extract(self, run_dir, dest):
+        """Extract the files of the archived *run_dir* to *dest*."""
+        _extract_from_zip(self._get_archive(run_dir), run_dir, dest)
+
+    def update_runs(self, function):
+        """Extract each archived run to a temporary directory, call
+        *function* with this directory and store the changed run in its
+        archive again, e.g., to parse all runs again."""
+        self.close()
+        for name in sorted(set(self.index.values())):
+            path = os.path.join(self.exp_path, name)
+            tmp_dir = tempfile.mkdtemp(prefix="prostlab-archive-")
+            try:
+                with zipfile.ZipFile(path) as archive:
+                    archive.extractall(tmp_dir)
+                    # extractall() writes the targets of symbolic links to files.
+                    for info in archive.infolist():
+                        if stat.S_ISLNK(info.external_attr >> 16):
+                            link = os.path.join(tmp_dir, info.filename)
+                            os.remove(link)
+                            os.symlink(archive.read(info).decode(), link)
+                run_dirs = [run for run in self.run_dirs if self.index[run] == name]
+                for run_dir in run_dirs:
+                    function(os.path.join(tmp_dir, run_dir))
+                with zipfile.ZipFile(path + ".tmp", "w") as archive:
+                    for run_dir in run_dirs:
+                        _add_to_zip(archive, os.path.join(tmp_dir, run_dir), run_dir)
+                os.replace(path + ".tmp", path)
+            finally:
+                shutil.rmtree(tmp_dir)
+            logging.info("Updated {} runs in {}".format(len(run_dirs), name))
+
+    def _save_index(self):
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self.index, f, indent=1, sort_keys=True)
+        os.replace(tmp_file, self.index_file)
+
+
+class RunArchiver(object):
+    """Pack finished run directories into indexed archives.
+
+    A run is finished if it was executed and either succeeded, failed
+    because of the planner, or failed because of the infrastructure and
+    has already been retried *max_retries* times (see
+    :class:`prostlab.retry.RunRetrier`). Runs whose node failed are never
+    archived, since they cannot be told apart from runs that are still
+    executed. The files of finished runs,
+    including their properties, logs and links to the RDDL files, are
+    added to the archive ``archives/runs-<first>-<last>.zip`` that
+    covers their run ID, and the run directories are removed. Runs that
+    are not finished remain in place, so archiving can be repeated after
+    they finished.
+    """
+
+    def __call__(self, exp_path, runs_per_archive=1000, max_retries=2):
+        archive = RunArchive(exp_path)
+        groups = {}
+        num_unfinished = 0
+        for run_dir in _get_run_dirs(exp_path):
+            if not self._is_finished(run_dir, max_retries):
+                num_unfinished += 1
+                continue
+            run_id = int(os.path.basename(run_dir))
+            first = (run_id - 1) // runs_per_archive * runs_per_archive + 1
+            name = os.path.join(
+                ARCHIVES_DIR,
+                "runs-{:0>5}-{:0>5}.zip".format(first, first + runs_per_archive - 1),
+            )
+            groups.setdefault(name, []).append(run_dir)
+
+        tools.makedirs(os.path.join(exp_path, ARCHIVES_DIR))
+        for name, run_dirs in sorted(groups.items()):
+            path = os.path.join(exp_path, name)
+            mode = "a" if os.path.exists(path) else "w"
+            with zipfile.ZipFile(path, mode) as zip_file:
+                for run_dir in run_dirs:
+                    rel_dir = os.path.relpath(run_dir, exp_path)
+                    _add_to_zip(zip_file, run_dir, rel_dir)
+                    archive.index[rel_dir] = name
+            # Only remove runs once the archive and the index are on disk.
+            archive._save_index()
+            for run_dir in run_dirs:
+                shutil.rmtree(run_dir)
+            logging.info("Archived {} runs in {}".format(len(run_dirs), name))
+
+        for runs_dir in glob(os.path.join(exp_path, "runs-*-*")):
+            if os.path.isdir(runs_dir) and not os.listdir(runs_dir):
+                os.rmdir(runs_dir)
+        logging.info(
+            "Archived {} runs, {} runs are not finished".format(
+                sum(len(run_dirs) for run_dirs in groups.values()), num_unfinished
+            )
+        )
+
+    def _is_finished(self, run_dir, max_retries):
+        if not os.path.exists(os.path.join(run_dir, "properties")):
+            return False
+        failure = classify_run(run_dir)
+        if failure is None:
+            return True
+        with open(os.path.join(run_dir, "properties")) as f:
+            retries = json.load(f).get("retries", [])
+        return failure != NODE_FAILURE and len(retries) >= max_retries
+
+
+class ArchiveFetcher(Fetcher):
+    """Fetch properties from run directories and from archived runs.
+
+    The fetcher behaves like :class:`lab.fetcher.Fetcher`, but also
+    reads runs that were packed by :class:`RunArchiver`. Fetched archived
+    runs have the additional property ``run_archive``, the path of their
+    archive relative to the experiment directory.
+    """
+
+    def __call__(self, src_dir, eval_dir=None, merge=None, filter=None, **kwargs):
+        archive = RunArchive(src_dir)
+        if not archive.run_dirs:
+            return Fetcher.__call__(
+                self, src_dir, eval_dir=eval_dir, merge=merge, filter=filter, **kwargs
+            )
+
+        run_filter = tools.RunFilter(filter, **kwargs)
+        eval_dir = eval_dir or src_dir.rstrip("/") + "-eval"
+        logging.info(f"Fetching properties from {src_dir} to {eval_dir}")
+        if merge is None:
+            _check_eval_dir(eval_dir)
+        elif not merge and os.path.exists(eval_dir):
+            tools.remove_path(eval_dir)
+        combined_props = tools.Properties(os.path.join(eval_dir, "properties"))
+
+        slurm_err_content = tools.get_slurm_err_content(src_dir)
+        if slurm_err_content:
+            logging.error("There was output to *-grid-steps/slurm.err")
+
+        run_dirs = _get_run_dirs(src_dir)
+        logging.info(
+            "Scanning properties from {:d} run directories and {:d} archived "
+            "runs".format(len(run_dirs), len(archive.run_dirs))
+        )
+        new_props = tools.Properties()
+        for props in [self.fetch_dir(run_dir) for run_dir in run_dirs] + [
+            archive.fetch_run(run_dir) for run_dir in archive.run_dirs
+        ]:
+            if slurm_err_content:
+                props.add_unexplained_error("output-to-slurm.err")
+            new_props["-".join(props["id"])] = props
+        archive.close()
+        run_filter.apply(new_props)
+        combined_props.update(new_props)
+
+        unexplained_errors = 0
+        for props in combined_props.values():
+            error_message = tools.get_unexplained_errors_message(props)
+            if error_message:
+                logging.error(error_message)
+                unexplained_errors += 1
+
+        tools.makedirs(eval_dir)
+        combined_props.write()
+        logging.info(
+            "Wrote properties file (contains {} runs with unexplained "
+            "errors).".format(unexplained_errors)
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Print a file of an archived run or extract the run."
+    )
+    parser.add_argument("exp_dir", help="experiment directory")
+    parser.add_argument("run_dir", help="run directory, e.g., runs-00001-00100/00001")
+    parser.add_argument("filename", nargs="?", help="file to print, e.g., run.log")
+    parser.add_argument("--extract", metavar="DIR", help="extract the run to DIR")
+    args = parser.parse_args()
+
+    archive = RunArchive(args.exp_dir)
+    run_dir = args.run_dir.strip("/")
+    if run_dir not in archive.index:
+        sys.exit("Run {} is not archived in {}".format(run_dir, args.exp_dir))
+    if args.extract:
+        archive.extract(run_dir, args.extract)
+    if args.filename:
+        content = archive.read_log(run_dir, args.filename)
+        if content is None:
+            sys.exit("{} not found in {}".format(args.filename, run_dir))
+        sys.stdout.write(content)
+
+
+if __name__ == "__main__":
+    main()
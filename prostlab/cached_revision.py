@@ -15,10 +15,95 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import glob
+import hashlib
+import json
+import logging
 import os.path
+import shutil
 import subprocess
+import tempfile
 
+from lab import tools
 from lab.cached_revision import CachedRevision
+from lab.environments import LocalEnvironment
+
+
+class PGOTraining(object):
+    """A short workload for training profile-guided optimization (PGO)
+    builds.
+
+    The instrumented planner is run on the tasks of *suite* with
+    *search_engine_desc*, *parser_options* and *driver_options* like in
+    a regular experiment with *num_runs* rounds and *time_per_step*
+    seconds per step, using *processes* parallel processes. Keep the
+    suite small, but representative of the experiments the build is
+    used for.
+
+    >>> training = PGOTraining(IPC2011[:5], "IPC2014", num_runs=2)
+    >>> exp.add_algorithm("ipc14-pgo", repo, "master", "IPC2014", pgo=training)
+
+    """
+
+    def __init__(
+        self,
+        suite,
+        search_engine_desc="IPC2014",
+        parser_options=None,
+        driver_options=None,
+        num_runs=1,
+        time_per_step=0.5,
+        processes=None,
+    ):
+        self.suite = suite
+        self.search_engine_desc = search_engine_desc
+        self.parser_options = parser_options or []
+        self.driver_options = driver_options or []
+        self.num_runs = num_runs
+        self.time_per_step = time_per_step
+        self.processes = processes
+
+    @property
+    def key(self):
+        """A short hash of everything that influences the profile."""
+        data = [
+            [[task.domain, str(task.problem)] for task in self.suite],
+            self.search_engine_desc,
+            self.parser_options,
+            self.driver_options,
+            self.num_runs,
+            self.time_per_step,
+        ]
+        return hashlib.sha1(json.dumps(data).encode()).hexdigest()[:8]
+
+    def train(self, cached_rev):
+        """Execute the training runs with the cached revision
+        *cached_rev*, which must have been built with instrumentation."""
+        # Avoid a circular import.
+        from prostlab.experiment import ProstAlgorithm, ProstExperiment
+
+        path = os.path.join(tempfile.mkdtemp(prefix="prostlab-pgo-"), "training")
+        exp = ProstExperiment(
+            self.suite,
+            num_runs=self.num_runs,
+            time_per_step=self.time_per_step,
+            revision_cache=os.path.dirname(cached_rev.path),
+            path=path,
+            environment=LocalEnvironment(processes=self.processes),
+        )
+        exp._add_config(
+            ProstAlgorithm(
+                "pgo-training",
+                cached_rev,
+                self.parser_options,
+                self.driver_options,
+                self.search_engine_desc,
+            )
+        )
+        try:
+            exp.build()
+            exp.start_runs()
+        finally:
+            shutil.rmtree(os.path.dirname(path))
 
 
 class CachedProstRevision(CachedRevision):
@@ -27,22 +112,74 @@ class CachedProstRevision(CachedRevision):
     It provides methods for caching and compiling given revisions.
     """
 
-    def __init__(self, repo, rev, build_options):
+    def __init__(self, repo, rev, build_options, pgo=None):
         """
         * *repo*: Path to Prost repository.
         * *rev*: Prost revision.
         * *build_options*: List of build.py options.
+        * *pgo*: If given, a :class:`PGOTraining`. The planner is then
+          built with instrumentation, trained on the given workload and
+          built again with the recorded profile. PGO builds are cached
+          separately from regular builds, and ``"pgo:<key>"`` is
+          appended to their build options, where ``<key>`` identifies
+          the training workload.
         """
+        self.pgo = pgo
         super().__init__(repo, rev, ["./build.py"] + build_options, ["scripts"])
-        self.build_options = build_options
+        self.build_options = list(build_options)
+        if pgo is not None:
+            self.build_options.append("pgo:" + pgo.key)
+
+    def _compute_hashed_name(self):
+        name = super()._compute_hashed_name()
+        if self.pgo is not None:
+            name += "_pgo" + self.pgo.key
+        return name
+
+    def _build(self, flags):
+        """Build the planner with *flags* for the compiler and the linker."""
+        env = dict(os.environ)
+        for variable in ["CXXFLAGS", "LDFLAGS"]:
+            env[variable] = " ".join([env.get(variable, ""), flags]).strip()
+        logging.info("Building {} with {}".format(self.path, flags))
+        if subprocess.call(self.build_cmd, cwd=self.path, env=env) != 0:
+            logging.critical(f"Build failed in {self.path}")
+        tools.write_file(self._get_sentinel_file(), "")
+
+    def _compile(self):
+        if self.pgo is None:
+            super()._compile()
+            return
+        profile_dir = os.path.join(self.path, "pgo-profile")
+        self._build("-fprofile-generate=" + profile_dir)
+        self.pgo.train(self)
+        if not glob.glob(os.path.join(profile_dir, "**", "*.gcda"), recursive=True):
+            shutil.rmtree(self.path)
+            logging.critical("PGO training did not produce any profile data.")
+        # Compile everything again, since the build system caches the flags.
+        os.remove(self._get_sentinel_file())
+        shutil.rmtree(os.path.join(self.path, "builds"))
+        self._build(
+            "-fprofile-use={} -fprofile-correction -Wno-missing-profile".format(
+                profile_dir
+            )
+        )
+        shutil.rmtree(profile_dir)
 
     def _cleanup(self):
-        # Strip binaries.
+        # Strip binaries, but keep their symbols in separate files next
+        # to them, so that profilers can still name the functions.
         binaries = []
         for path in glob.glob(os.path.join(self.path, "builds", "*", "*", "*")):
             if os.path.basename(path) in ["rddl-parser", "search"]:
                 binaries.append(path)
+        for binary in binaries:
+            subprocess.call(["objcopy", "--only-keep-debug", binary, binary + ".debug"])
         subprocess.call(["strip"] + binaries)
+        for binary in binaries:
+            subprocess.call(
+                ["objcopy", "--add-gnu-debuglink=" + binary + ".debug", binary]
+            )
 
         # Compress src directory.
         subprocess.call(
@@ -0,0 +1,224 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Module that stores the results of many Prost experiments in a single
+SQLite database and permits querying them.
+"""
+
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+
+from lab import tools
+
+
+#: Run properties that are stored in separate, indexed columns. Queries
+#: may only restrict these columns, the experiment name and the time of
+#: the fetch.
+INDEXED_ATTRIBUTES = [
+    "domain",
+    "problem",
+    "algorithm",
+    "global_revision",
+    "search_engine",
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    experiment TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    domain TEXT,
+    problem TEXT,
+    algorithm TEXT,
+    global_revision TEXT,
+    search_engine TEXT,
+    fetch_time REAL NOT NULL,
+    properties BLOB NOT NULL,
+    PRIMARY KEY (experiment, run_id)
+);
+"""
+
+
+def _encode_properties(run):
+    # Lists of per-round values dominate the size of a run, so we store
+    # the properties as compressed JSON without any whitespace.
+    text = json.dumps(run, separators=(",", ":"), sort_keys=True)
+    return zlib.compress(text.encode("utf-8"))
+
+
+def _decode_properties(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def _get_timestamp(value):
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    return float(value)
+
+
+class ResultsDatabase(object):
+    """Store runs of many experiments in a SQLite database.
+
+    Each run is stored together with the name of the experiment it
+    belongs to and the time it was added. Adding a run with the same
+    experiment name and run ID again replaces the old entry.
+
+    >>> db = ResultsDatabase("/path/to/results.db")
+    >>> runs = db.get_runs({"domain": "elevators-2011", "global_revision": "0a1b2c3"})
+
+    """
+
+    def __init__(self, path):
+        """
+        *path* is the path to the database file. It is created if it does
+        not exist yet.
+        """
+        self.path = os.path.abspath(path)
+        tools.makedirs(os.path.dirname(self.path))
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript(_SCHEMA)
+        for attr in INDEXED_ATTRIBUTES + ["fetch_time"]:
+            self.connection.execute(
+                f"CREATE INDEX IF NOT EXISTS runs_{attr} ON runs ({attr})"
+            )
+        self.connection.commit()
+
+    def add_runs(self, experiment, props, fetch_time=None):
+        """Add all runs in *props* (a mapping from run IDs to properties)
+        under the experiment name *experiment*.
+
+        *fetch_time* defaults to the current time.
+        """
+        if fetch_time is None:
+            fetch_time = time.time()
+        fetch_time = _get_timestamp(fetch_time)
+        rows = [
+            [experiment, run_id]
+            + [run.get(attr) for attr in INDEXED_ATTRIBUTES]
+            + [fetch_time, _encode_properties(run)]
+            for run_id, run in props.items()
+        ]
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO runs VALUES ({})".format(
+                    ", ".join(["?"] * (len(INDEXED_ATTRIBUTES) + 4))
+                ),
+                rows,
+            )
+        logging.info(
+            "Added {} runs of {} to {}.".format(len(rows), experiment, self.path)
+        )
+
+    def _get_where_clause(self, query):
+        conditions = []
+        parameters = []
+        for key, value in sorted(query.items()):
+            if key == "since":
+                conditions.append("fetch_time >= ?")
+                parameters.append(_get_timestamp(value))
+            elif key == "until":
+                conditions.append("fetch_time <= ?")
+                parameters.append(_get_timestamp(value))
+            elif key in INDEXED_ATTRIBUTES or key == "experiment":
+                if isinstance(value, (list, tuple, set)):
+                    value = sorted(value)
+                    conditions.append(
+                        "{} IN ({})".format(key, ", ".join(["?"] * len(value)))
+                    )
+                    parameters.extend(value)
+                else:
+                    conditions.append(f"{key} = ?")
+                    parameters.append(value)
+            else:
+                logging.critical(
+                    'Invalid query key "{}". Valid keys are "experiment", '
+                    '"since", "until" and {}.'.format(key, INDEXED_ATTRIBUTES)
+                )
+        if not conditions:
+            return "", parameters
+        return " WHERE " + " AND ".join(conditions), parameters
+
+    def get_runs(self, query=None):
+        """Return the properties of all runs that match *query*.
+
+        *query* is a dictionary that maps attributes from
+        :py:data:`INDEXED_ATTRIBUTES` or ``"experiment"`` to a value
+        or a list of values. The keys ``"since"`` and ``"until"``
+        restrict the time at which runs were added and accept
+        :py:class:`datetime.datetime` objects or Unix timestamps.
+
+        If several experiments contain a run with the same ID, the
+        most recently added run is used.
+
+        >>> from datetime import datetime, timedelta
+        >>> runs = db.get_runs({
+        ...     "domain": "elevators-2011",
+        ...     "global_revision": ["0a1b2c3", "4d5e6f7"],
+        ...     "since": datetime.now() - timedelta(days=183)})
+
+        """
+        where, parameters = self._get_where_clause(query or {})
+        cursor = self.connection.execute(
+            "SELECT run_id, properties FROM runs{} ORDER BY fetch_time".format(where),
+            parameters,
+        )
+        props = tools.Properties()
+        for run_id, blob in cursor:
+            props[run_id] = _decode_properties(blob)
+        return props
+
+    def get_experiments(self):
+        """Return the sorted names of all experiments in the database."""
+        cursor = self.connection.execute("SELECT DISTINCT experiment FROM runs")
+        return sorted(name for (name,) in cursor)
+
+
+class DatabaseFetcher(object):
+    """
+    Add the runs of an evaluation directory to a :class:`ResultsDatabase`.
+
+    .. note::
+
+        Using :py:meth:`exp.add_database_fetcher()
+        <prostlab.experiment.ProstExperiment.add_database_fetcher>` is more
+        convenient.
+
+    """
+
+    def __call__(self, eval_dir, database, experiment=None, filter=None, **kwargs):
+        """
+        Read the properties file in *eval_dir*, apply the given
+        :py:class:`filters <lab.reports.Report>` and add the remaining
+        runs to the database at *database* under the name *experiment*,
+        which defaults to the name of *eval_dir* without the ``-eval``
+        suffix.
+        """
+        props_file = os.path.join(eval_dir, "properties")
+        if not os.path.exists(props_file):
+            logging.critical("Properties file not found at %s" % props_file)
+        props = tools.Properties(filename=props_file)
+        tools.RunFilter(filter, **kwargs).apply(props)
+
+        if experiment is None:
+            experiment = os.path.basename(eval_dir.rstrip("/"))
+            if experiment.endswith("-eval"):
+                experiment = experiment[: -len("-eval")]
+        ResultsDatabase(database).add_runs(experiment, props)
@@ -17,30 +17,59 @@
 """
 A module for running Prost experiments.
 """
+import copy
+import filecmp
+from glob import glob
+import hashlib
+import inspect
+import itertools
+import json
+import logging
 import os
+import random
+import re
+import subprocess
 
 from collections import defaultdict, OrderedDict
 
+from lab import tools
+from lab.environments import GridEnvironment
 from lab.experiment import Experiment, get_default_data_dir, Run
 
+from prostlab.archive import ArchiveFetcher, RunArchive, RunArchiver
 from prostlab.cached_revision import CachedProstRevision
+from prostlab.database import DatabaseFetcher
+from prostlab.manifest import read_declared_names
 from prostlab.parsers import get_all_attributes_of_algorithm, get_default_attributes_of_algorithm
+from prostlab.racing import Race
+from prostlab.retry import (
+    check_login_node,
+    classify_run,
+    create_experiment,
+    execute_runs,
+    NODE_FAILURE,
+    RunRetrier,
+)
+from prostlab.supervisor import RETRY_BACKOFF
 
 
 DIR = os.path.dirname(os.path.abspath(__file__))
 PARSERS_DIR = os.path.join(DIR, "parsers")
+SUPERVISOR = os.path.join(DIR, "supervisor.py")
+SUPERVISOR_RESOURCE_NAME = "prostlab_supervisor"
+SERVER_POOL_BENCHMARKS_DIR = "server-pool-benchmarks"
 
 
 def _get_planner_resource_name(cached_rev):
     return "prost_" + cached_rev.name
 
 
-def _get_server_resource_name(cached_rev):
-    return "rddlsim_" + cached_rev.name
+def _get_code_resource_name(cached_rev):
+    return "code_" + cached_rev.name
 
 
-def _get_wrapper_resource_name(cached_rev):
-    return "wrapper_" + cached_rev.name
+def _get_server_resource_name(cached_rev):
+    return "rddlsim_" + cached_rev.name
 
 
 class ProstRun(Run):
@@ -48,36 +77,111 @@ class ProstRun(Run):
 
     """
 
-    def __init__(self, exp, config, task, port, rddlsim_runtime, run_time):
+    def __init__(
+        self,
+        exp,
+        config,
+        task,
+        port,
+        rddlsim_runtime,
+        run_time,
+        memory_limit=None,
+        start_tier=0,
+        rddlsim_seed=0,
+        planner_seed=1,
+        replicate=0,
+    ):
         Run.__init__(self, exp)
         self.config = config
         self.task = task
         self.port = port
         self.rddlsim_runtime = rddlsim_runtime
+        self.run_time = run_time
+        self.memory_tiers = exp.memory_tiers or [memory_limit or exp.memory_limit]
+        self.start_tier = start_tier
+        self.memory_limit = self.memory_tiers[start_tier]
+        self.rddlsim_seed = rddlsim_seed
+        self.planner_seed = planner_seed
+        self.replicate = replicate
+        self.driver_options = config.get_driver_options(self.memory_limit, planner_seed)
+
+        # All attempts of the run are executed by a single command, so its
+        # time limit covers the maximum number of attempts and the waiting
+        # time between retries.
+        max_attempts = len(self.memory_tiers) - start_tier + exp.max_retries
+        self.command_time_limit = (
+            max_attempts * run_time
+            + RETRY_BACKOFF * exp.max_retries * (exp.max_retries + 1) // 2
+        )
+        # Like lab, allow for disk latencies on the wall-clock time.
+        wall_clock_time_limit = max(30, self.command_time_limit * 1.5)
 
         self._set_properties()
 
         self.add_resource("", self.task.domain_file, "domain.rddl", symlink=True)
         self.add_resource("", self.task.problem_file, "problem.rddl", symlink=True)
 
+        # Options are passed as "--option=value", since values may start
+        # with a dash.
+        command = [
+            tools.get_python_executable(),
+            "{" + SUPERVISOR_RESOURCE_NAME + "}",
+            "--server={" + _get_server_resource_name(config.cached_revision) + "}",
+            "--planner={" + _get_planner_resource_name(config.cached_revision) + "}",
+            "--code-dir={" + _get_code_resource_name(config.cached_revision) + "}",
+            "--benchmarks-dir=./",
+            "--port={}".format(self.port),
+            "--seed={}".format(self.rddlsim_seed),
+            "--planner-seed={}".format(self.planner_seed),
+            "--rddlsim-runtime={}".format(self.rddlsim_runtime),
+            "--num-runs={}".format(self.experiment.num_runs),
+            "--problem=" + self.task.problem_name,
+            "--parser-options=" + " ".join(self.config.parser_options),
+            "--driver-options=" + " ".join(self.config.driver_options),
+            "--search-engine=" + self.config.search_engine_desc,
+            "--memory-tiers=" + ",".join(str(tier) for tier in self.memory_tiers),
+            "--start-tier={}".format(self.start_tier),
+            "--max-retries={}".format(exp.max_retries),
+            "--time-limit={}".format(max(30, run_time * 1.5)),
+            # Leave the supervisor time to stop the planner and write the
+            # properties before lab kills it.
+            "--total-time-limit={}".format(wall_clock_time_limit - 10),
+        ]
+        if exp.server_pool:
+            # Run directories are two levels below the experiment directory.
+            command += [
+                "--server-pool",
+                "--server-pool-benchmarks-dir=../../" + SERVER_POOL_BENCHMARKS_DIR,
+            ]
+        if exp.stage_code:
+            command.append("--stage-code")
+        if exp.compress_logs:
+            # Lab cannot limit compressed output, so the supervisor does.
+            command += ["--compress-logs"] + [
+                "--{}-stdout-limit={}".format(kind, limit)
+                for kind, limit in [
+                    ("soft", exp.soft_stdout_limit),
+                    ("hard", exp.hard_stdout_limit),
+                ]
+                if limit is not None
+            ]
+        if exp.calibrate_nodes:
+            command.append("--calibrate")
+        if exp.anytime_checkpoints:
+            command.append(
+                "--anytime-checkpoints="
+                + ",".join(str(checkpoint) for checkpoint in exp.anytime_checkpoints)
+            )
+        if exp.is_profiled(task):
+            command += [
+                "--profile",
+                "--profile-frequency={}".format(exp.profile_frequency),
+            ]
         self.add_command(
             "planner",
-            [
-                "{" + _get_wrapper_resource_name(config.cached_revision) + "}",
-                "{" + _get_server_resource_name(config.cached_revision) + "}",
-                "./",
-                str(self.port),
-                str(self.experiment.rddlsim_seed),
-                str(self.rddlsim_runtime),
-                str(self.experiment.num_runs),
-                "{" + _get_planner_resource_name(config.cached_revision) + "}",
-                self.task.problem_name,
-                " ".join(self.config.parser_options),
-                " ".join(self.config.driver_options),
-                self.config.search_engine_desc,
-            ],
-            time_limit = run_time,
-            memory_limit = exp.memory_limit,
+            command,
+            time_limit = self.command_time_limit,
+            memory_limit = self.memory_tiers[-1],
             soft_stdout_limit = exp.soft_stdout_limit,
             hard_stdout_limit = exp.hard_stdout_limit,
             soft_stderr_limit = exp.soft_stderr_limit,
@@ -93,7 +197,7 @@ class ProstRun(Run):
         self.set_property("revision_summary", self.config.cached_revision.summary)
         self.set_property("build_options", self.config.cached_revision.build_options)
         self.set_property("parser_options", self.config.parser_options)
-        self.set_property("driver_options", self.config.driver_options)
+        self.set_property("driver_options", self.driver_options)
         self.set_property("search_engine", self.config.search_engine_desc)
 
         self.set_property("domain", self.task.domain)
@@ -109,8 +213,112 @@ class ProstRun(Run):
 
         self.set_property("port", self.port)
         self.set_property("enforced_time_limit", self.rddlsim_runtime)
+        self.set_property(
+            "search_time_budget",
+            self.task.horizon * self.experiment.num_runs * self.experiment.time_per_step,
+        )
+        self.set_property("num_runs", self.experiment.num_runs)
+        self.set_property("time_per_step", self.experiment.time_per_step)
+        self.set_property("time_buffer", self.experiment.time_buffer)
+        self.set_property("run_time_limit", self.run_time)
+        self.set_property("command_time_limit", self.command_time_limit)
+        self.set_property("run_memory_limit", self.memory_limit)
+        self.set_property("memory_tier", self.start_tier)
+        self.set_property("rddlsim_seed", self.rddlsim_seed)
+        self.set_property("planner_seed", self.planner_seed)
+        self.set_property("replicate", self.replicate)
+
+        run_id = [self.config.name, self.task.domain, str(self.task.problem)]
+        if len(self.experiment.get_replicates()) > 1:
+            run_id.append("seed-{}-{}".format(self.rddlsim_seed, self.planner_seed))
+        self.set_property("id", run_id)
+
+
+def _is_flag(option):
+    if not option.startswith("-"):
+        return False
+    try:
+        float(option)
+    except ValueError:
+        return True
+    return False
 
-        self.set_property("id", [self.config.name, self.task.domain, str(self.task.problem)])
+
+def normalize_options(options):
+    """Return a canonical form of the list of *options*.
+
+    Options that start with a dash are paired with the following value
+    (if any), and the pairs are sorted, since the order of options does
+    not matter to Prost. If an option occurs more than once, the last
+    value counts. Values that are no options keep their order.
+    """
+    options = [str(option) for option in options]
+    positional = []
+    pairs = {}
+    index = 0
+    while index < len(options):
+        option = options[index]
+        if not _is_flag(option):
+            positional.append(option)
+            index += 1
+        elif index + 1 < len(options) and not _is_flag(options[index + 1]):
+            pairs[option] = options[index + 1]
+            index += 2
+        else:
+            pairs[option] = None
+            index += 1
+    return tuple(positional) + tuple(sorted(pairs.items()))
+
+
+def normalize_search_engine(desc):
+    """Return a canonical form of the search engine description *desc*,
+    in which whitespace is normalized and the options of each
+    (bracketed) component are sorted."""
+    tokens = re.findall(r"\[|\]|[^\s\[\]]+", desc)
+
+    def parse(index):
+        parts = []
+        while index < len(tokens):
+            token = tokens[index]
+            if token == "[":
+                part, index = parse(index + 1)
+                parts.append("[" + part + "]")
+            elif token == "]":
+                return _join_options(parts), index + 1
+            else:
+                parts.append(token)
+                index += 1
+        return _join_options(parts), index
+
+    result, index = parse(0)
+    if index != len(tokens) or tokens.count("[") != tokens.count("]"):
+        # Leave unbalanced descriptions to the planner's parser.
+        return " ".join(tokens)
+    return result
+
+
+def _join_options(parts):
+    words = []
+    for part in normalize_options(parts):
+        if isinstance(part, tuple):
+            words.extend(word for word in part if word is not None)
+        else:
+            words.append(part)
+    return " ".join(words)
+
+
+def _get_alternatives(options):
+    """Return the list of alternative option lists that *options*
+    describes (see :meth:`ProstExperiment.add_algorithm_sweep`)."""
+    if options is None:
+        return [[]]
+    if isinstance(options, dict):
+        flags = list(options)
+        return [
+            [str(word) for pair in zip(flags, values) for word in pair]
+            for values in itertools.product(*(options[flag] for flag in flags))
+        ]
+    return [list(alternative) for alternative in options]
 
 
 class ProstAlgorithm(object):
@@ -129,14 +337,68 @@ class ProstAlgorithm(object):
     def get_default_attributes(self):
         return get_default_attributes_of_algorithm(self.search_engine_desc)
 
+    def get_driver_options(self, memory_limit, seed=1):
+        """Return the driver options for a run with a memory limit of
+        *memory_limit* MiB and the planner seed *seed*."""
+        return [
+            "-s", str(seed), "-ram", str((memory_limit - 512) * 1024)
+        ] + self.driver_options
+
+    @property
+    def key(self):
+        """All components (excluding the name) in normalized form."""
+        revision = self.cached_revision
+        return (
+            os.path.abspath(revision.repo),
+            revision.global_rev,
+            tuple(sorted(revision.build_options)),
+            normalize_options(self.parser_options),
+            normalize_options(self.driver_options),
+            normalize_search_engine(self.search_engine_desc),
+        )
+
     def __eq__(self, other):
         """Return true iff all components (excluding the name) match."""
-        return (
-            self.cached_revision == other.cached_revision
-            and self.parser_options == other.parser_options
-            and self.driver_options == other.driver_options
-            and self.search_engine_desc == other.search_engine_desc
+        return self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+def _copy_experiment_setup(src, dest):
+    """Add the parsers, resources, new files, commands and properties of
+    the experiment *src* to the experiment *dest*.
+
+    Lab has no public API for reading what was added to an experiment,
+    so this function reads the containers of lab's experiment class,
+    which Prost Lab requires in the version pinned in ``setup.py``.
+    """
+    try:
+        parsers = {}
+        for resource in src.resources:
+            if resource.is_parser:
+                parsers[resource.name] = resource.source
+            else:
+                dest.add_resource(
+                    resource.name, resource.source, resource.dest, resource.symlink
+                )
+        names = {path: name for name, path in src.env_vars_relative.items()}
+        for path, content, permissions in src.new_files:
+            dest.add_new_file(names.get(path, ""), path, content, permissions)
+        # Parsers add their commands, so add both in their original order.
+        for name, (command, kwargs) in src.commands.items():
+            if name in parsers:
+                dest.add_parser(parsers[name])
+            else:
+                dest.add_command(name, command, **kwargs)
+        properties = dict(src.properties)
+    except (AttributeError, TypeError, ValueError) as err:
+        logging.critical(
+            "Cannot copy the setup of the experiment with this version of "
+            "lab ({}). Install the version required by Prost Lab.".format(err)
         )
+    for name, value in properties.items():
+        dest.set_property(name, value)
 
 
 class ProstExperiment(Experiment):
@@ -162,6 +424,7 @@ class ProstExperiment(Experiment):
     PROST_PARSER = os.path.join(PARSERS_DIR, "prost-parser.py")
     THTS_PARSER = os.path.join(PARSERS_DIR, "thts-parser.py")
     IDS_PARSER = os.path.join(PARSERS_DIR, "ids-parser.py")
+    ANYTIME_PARSER = os.path.join(PARSERS_DIR, "anytime-parser.py")
 
     def __init__(
         self,
@@ -170,6 +433,8 @@ class ProstExperiment(Experiment):
         time_per_step=1.0,
         initial_port=2000,
         rddlsim_seed=0,
+        rddlsim_seeds=None,
+        planner_seeds=None,
         rddlsim_enforces_runtime=False,
         revision_cache=None,
         time_buffer=300,
@@ -178,6 +443,16 @@ class ProstExperiment(Experiment):
         hard_stdout_limit=20 * 1024,
         soft_stderr_limit=64,
         hard_stderr_limit=10 * 1024,
+        predictor=None,
+        memory_tiers=None,
+        max_retries=0,
+        server_pool=False,
+        stage_code=False,
+        compress_logs=False,
+        profile_fraction=0.0,
+        profile_frequency=99,
+        calibrate_nodes=False,
+        anytime_checkpoints=None,
         path=None,
         environment=None,
     ):
@@ -196,6 +471,17 @@ class ProstExperiment(Experiment):
 
         *rddlsim_seed* is the value with which rddlsim is seeded.
 
+        *rddlsim_seeds* and *planner_seeds* are lists of seeds for rddlsim
+        and the planner, which default to ``[rddlsim_seed]`` and ``[1]``.
+        Each algorithm is run on each task once per combination of an
+        rddlsim seed and a planner seed (see :meth:`.get_replicates`).
+        The replicates are ordinary runs that are scheduled independently,
+        and their ``rddlsim_seed``, ``planner_seed`` and ``replicate``
+        properties tell them apart. Reports can average the replicates of
+        each task and algorithm and provide their standard deviations (see
+        *aggregate_replicates* in :class:`prostlab.reports.PlanningReport`). A seed in the
+        *driver_options* of an algorithm overrides the planner seeds.
+
         If *rddlsim_enforces_runtime* is True, rddlsim terminates after the time that is
         computed as the product of *num_runs*, *time_per_step* and the instance horizon.
 
@@ -212,6 +498,73 @@ class ProstExperiment(Experiment):
         *soft_stdout_limit*, *hard_stdout_limit*, *soft_stderr_limit* and 
         *hard_stderr_limit* limit the amount of data each experiment may write to disk,
 
+        If given, *predictor* must be a :class:`prostlab.prediction.RunPredictor`
+        that estimates the time and memory of each run from past experiments.
+        The time and memory limits of each run are then tightened to the
+        prediction, which allows the grid engine to schedule more runs per node.
+        The *time_buffer* and *memory_limit* remain upper bounds.
+
+        If given, *memory_tiers* must be an ascending list of memory limits in
+        MiB, the largest of which must not exceed *memory_limit*. Runs then start
+        with the lowest tier (or, with a *predictor*, the lowest tier above the
+        predicted memory limit) and are repeated with the next tier if they run
+        out of memory. The tier of the final attempt is stored in the
+        ``memory_tier`` property, all attempts in the ``attempts`` property.
+        Each attempt has the full time limit of the run, and the time limit of
+        the command that executes all attempts (``command_time_limit``) covers
+        the maximum number of attempts, including retries (see below).
+
+        Runs that fail because of the infrastructure (e.g., rddlsim cannot bind
+        its port or the JVM crashes) are repeated up to *max_retries* times. By
+        default, they are not repeated. Each retry adds the time limit of the
+        run to ``command_time_limit``, so only allow retries if the grid
+        accepts the longer jobs. See :meth:`.add_retry_step` for runs whose
+        node fails.
+
+        If *server_pool* is True, runs on the same node share long-lived rddlsim
+        servers instead of starting a new server for each run, which saves the
+        startup time and memory of the JVM. Sessions are still separate for each
+        run. See :class:`prostlab.supervisor.PooledServer` for details. Since
+        rddlsim looks up domains and instances by the names declared in the
+        RDDL files, different files of the suites must not declare the same
+        name. Run suites that reuse names (e.g., different versions of a
+        domain) in separate experiments.
+
+        If *stage_code* is True, the first run of each planner revision on a node
+        copies the code of the revision to node-local storage, and all runs on
+        the node execute the planner and rddlsim from this copy instead of the
+        shared file system. See :func:`prostlab.supervisor.stage_code`.
+
+        If *compress_logs* is True, the standard output of Prost and rddlsim is
+        compressed while it is written (to ``run.log.gz`` and ``server.log.gz``).
+        *soft_stdout_limit* and *hard_stdout_limit* still apply to the
+        uncompressed output. The built-in parsers and parsers derived from
+        :class:`prostlab.repeated_pattern_parser.RepeatedPatternParser` read
+        compressed logs transparently.
+
+        If *profile_fraction* is positive, the planner is executed under the
+        sampling profiler ``perf`` with *profile_frequency* samples per second
+        on this fraction of the tasks (see :meth:`.is_profiled`). The profile
+        is stored in ``perf.data.gz`` in the run directory and the hottest
+        functions of the search in the ``profile_hot_functions`` property,
+        which :class:`prostlab.reports.hot_functions.HotFunctionsReport`
+        aggregates. Nodes without ``perf`` run the planner as usual.
+
+        If *calibrate_nodes* is True, the first run on each node measures the
+        speed of the node with a short benchmark and caches it on the node. All
+        runs store the speed in the ``node_speed_factor`` property, which
+        reports use to normalize times from different kinds of nodes (see
+        :class:`prostlab.reports.PlanningReport`).
+
+        If given, *anytime_checkpoints* is a list of times in seconds below
+        *time_per_step*. The planner then reports for each step which action
+        it would have taken had it stopped at these times. Add
+        :attr:`ANYTIME_PARSER` to estimate the average reward for each
+        checkpoint, which
+        :class:`prostlab.reports.anytime.AnytimeReport` shows as reward-time
+        curves. This requires a planner that supports anytime profiles (see
+        ``prostlab/parsers/anytime-parser.py`` for the output format).
+
         See :class:`lab.experiment.Experiment` for an explanation of
         the *path* and *environment* parameters.
 
@@ -230,6 +583,8 @@ class ProstExperiment(Experiment):
         self.time_per_step = time_per_step
         self.initial_port = initial_port
         self.rddlsim_seed = rddlsim_seed
+        self.rddlsim_seeds = list(rddlsim_seeds or [rddlsim_seed])
+        self.planner_seeds = list(planner_seeds or [1])
         self.rddlsim_enforces_runtime = rddlsim_enforces_runtime
 
         self.revision_cache = revision_cache or os.path.join(
@@ -242,9 +597,36 @@ class ProstExperiment(Experiment):
         self.hard_stdout_limit = hard_stdout_limit
         self.soft_stderr_limit = soft_stderr_limit
         self.hard_stderr_limit = hard_stderr_limit
+        self.predictor = predictor
+        self.memory_tiers = memory_tiers
+        self.max_retries = max_retries
+        self.server_pool = server_pool
+        self.stage_code = stage_code
+        self.compress_logs = compress_logs
+        self.profile_fraction = profile_fraction
+        self.profile_frequency = profile_frequency
+        self.calibrate_nodes = calibrate_nodes
+        self.anytime_checkpoints = sorted(anytime_checkpoints or [])
+        if any(not 0 < checkpoint < time_per_step for checkpoint in self.anytime_checkpoints):
+            logging.critical(
+                "Anytime checkpoints must lie between 0 and {}s: {}".format(
+                    time_per_step, anytime_checkpoints
+                )
+            )
+        if memory_tiers and (
+            sorted(memory_tiers) != list(memory_tiers) or memory_tiers[-1] > memory_limit
+        ):
+            logging.critical(
+                "Memory tiers must be ascending and at most {} MiB: {}".format(
+                    memory_limit, memory_tiers
+                )
+            )
 
         # Use OrderedDict to ensure that names are unique and ordered.
         self.configs = OrderedDict()
+        # Map configs to their names to find duplicates in constant time.
+        self._config_names = {}
+        self._cached_revisions = {}
 
     def add_algorithm(
         self,
@@ -255,6 +637,7 @@ class ProstExperiment(Experiment):
         build_options=None,
         parser_options=None,
         driver_options=None,
+        pgo=None,
     ):
         """Add a Prost algorithm to the experiment, i.e., a
         planner configuration in a given repository at a given
@@ -283,11 +666,18 @@ class ProstExperiment(Experiment):
         be parsed by the ProstPlanner class in the search component of
         the planner. See the ``PROST Planner Options`` section in the
         output of running ``prost.py`` for available options. The list
-        is always prepended with ``["-s", "1", "-ram", "3145728"]``.
+        is always prepended with ``["-s", "1", "-ram", "3145728"]``,
+        where the RAM limit is the memory limit of the run minus 512 MiB.
         Specifying a custom seed or RAM limit overrides these default
         values. If a custom memory limit is specified, make sure it is no 
         larger than the *memory_limit* of this class.
 
+        If given, *pgo* must be a :class:`prostlab.cached_revision.PGOTraining`.
+        The planner is then built with profile-guided optimization: an
+        instrumented build is trained on the given workload and the planner is
+        built again with the recorded profile. See
+        :class:`prostlab.cached_revision.CachedProstRevision`.
+
         Example experiment setup to test Prost2011 in the latest revision 
         on the master branch:
 
@@ -299,29 +689,132 @@ class ProstExperiment(Experiment):
         >>> exp.add_algorithm("ipc11", repo, rev, "IPC2011")
 
         """
+        config = self._get_config(
+            name, repo, rev, search_engine_desc, build_options, parser_options,
+            driver_options, pgo,
+        )
+        print("{}: {}".format(config.name, config.search_engine_desc))
+        if config in self._config_names:
+            logging.critical(
+                "Configs {} and {} are identical.".format(
+                    self._config_names[config], config.name
+                )
+            )
+        self._add_config(config)
+
+    def _get_config(
+        self,
+        name,
+        repo,
+        rev,
+        search_engine_desc,
+        build_options,
+        parser_options,
+        driver_options,
+        pgo=None,
+    ):
         if not isinstance(name, str):
             logging.critical("Config name must be a string: {}".format(name))
         if name in self.configs:
             logging.critical("Config names must be unique: {}".format(name))
-        build_options = build_options or []
-        parser_options = parser_options or []
-        driver_options = ["-s", "1", "-ram", str((self.memory_limit-512)*1024),] + (driver_options or [])
-        config = ProstAlgorithm(
+        build_options = [str(option) for option in build_options or []]
+        # Resolving a revision calls the version control system, so only
+        # do it once per revision and build options.
+        key = (repo, rev, tuple(build_options), pgo and pgo.key)
+        if key not in self._cached_revisions:
+            self._cached_revisions[key] = CachedProstRevision(
+                repo, rev, build_options, pgo
+            )
+        return ProstAlgorithm(
             name,
-            CachedProstRevision(repo, rev, build_options),
-            parser_options,
-            driver_options,
+            self._cached_revisions[key],
+            [str(option) for option in parser_options or []],
+            [str(option) for option in driver_options or []],
             search_engine_desc,
         )
 
-        print("{}: {}".format(config.name, config.search_engine_desc))
-        for conf in self.configs.values():
-            if config == conf:
-                logging.critical(
-                    "Configs {conf.name} and {config.name} are "
-                    "identical.".format(**locals())
-                )
-        self.configs[name] = config
+    def _add_config(self, config):
+        self.configs[config.name] = config
+        self._config_names[config] = config.name
+
+    def add_algorithm_sweep(
+        self,
+        prefix,
+        repo,
+        rev,
+        search_engine_descs,
+        build_options=None,
+        parser_options=None,
+        driver_options=None,
+        sample=None,
+        seed=0,
+        pgo=None,
+    ):
+        """Add an algorithm for each combination of the given options.
+
+        *search_engine_descs* is a list of search engine descriptions. Each
+        of *build_options*, *parser_options* and *driver_options* is either
+        a list of alternatives, each of which is a list of options as for
+        :meth:`.add_algorithm`, or a dictionary that maps options to lists
+        of values, which is expanded to all combinations of the values.
+
+        If *sample* is None, all combinations (the Cartesian product of the
+        alternatives) are added. Otherwise, *sample* combinations are drawn
+        at random with *seed*. *pgo* is passed to all algorithms (see
+        :meth:`.add_algorithm`).
+
+        Combinations that only differ in the order of their options or that
+        are identical to existing algorithms are skipped. The algorithms are
+        called ``<prefix>-<index>`` in the order of the combinations, and
+        their names are returned.
+
+        >>> exp.add_algorithm_sweep(
+        ...     "uct", repo, "master", ["[THTS -act [MC] -out [UMC] -backup [MC]]"],
+        ...     driver_options={"-t": [1, 2], "-se-rounds": [10, 100]})
+        ['uct-0001', 'uct-0002', 'uct-0003', 'uct-0004']
+
+        """
+        dimensions = [
+            list(search_engine_descs),
+            _get_alternatives(build_options),
+            _get_alternatives(parser_options),
+            _get_alternatives(driver_options),
+        ]
+        sizes = [len(dimension) for dimension in dimensions]
+        num_combinations = 1
+        for size in sizes:
+            num_combinations *= size
+        if sample is None:
+            indices = range(num_combinations)
+        else:
+            indices = random.Random(seed).sample(
+                range(num_combinations), min(sample, num_combinations)
+            )
+        width = len(str(len(indices)))
+        names = []
+        num_duplicates = 0
+        for index in indices:
+            # Decode the index of the combination in mixed radix.
+            combination = []
+            for dimension, size in zip(reversed(dimensions), reversed(sizes)):
+                index, position = divmod(index, size)
+                combination.append(dimension[position])
+            driver, parser, build, desc = combination
+            name = "{}-{:0>{}}".format(prefix, len(names) + 1, max(width, 4))
+            config = self._get_config(
+                name, repo, rev, desc, build, parser, driver, pgo
+            )
+            if config in self._config_names:
+                num_duplicates += 1
+                continue
+            self._add_config(config)
+            names.append(name)
+        logging.info(
+            "Added {} algorithms for sweep {} and skipped {} duplicates.".format(
+                len(names), prefix, num_duplicates
+            )
+        )
+        return names
 
     def build(self, **kwargs):
         """Add Prost code, runs and write everything to disk.
@@ -336,12 +829,17 @@ class ProstExperiment(Experiment):
         self.set_property("num_runs", self.num_runs)
         self.set_property("time_per_step", self.time_per_step)
         self.set_property("rddlsim_seed", self.rddlsim_seed)
+        self.set_property("rddlsim_seeds", self.rddlsim_seeds)
+        self.set_property("planner_seeds", self.planner_seeds)
         self.set_property("initial_port", self.initial_port)
         self.set_property("rddlsim_enforces_runtime", self.rddlsim_enforces_runtime)
 
-        self._cache_revisions()
-        self._add_code()
-        self._add_runs()
+        # Grid environments build the experiment again before they submit
+        # the runs of an experiment that has already been built.
+        if not self.runs:
+            self._cache_revisions()
+            self._add_code()
+            self._add_runs()
 
         Experiment.build(self, **kwargs)
 
@@ -357,10 +855,11 @@ class ProstExperiment(Experiment):
 
     def _add_code(self):
         """Add the compiled code to the experiment."""
+        self.add_resource(SUPERVISOR_RESOURCE_NAME, SUPERVISOR, "supervisor.py")
         for cached_rev in self._get_unique_cached_revisions():
             cache_path = os.path.join(self.revision_cache, cached_rev.name)
             dest_path = "code-" + cached_rev.name
-            self.add_resource("", cache_path, dest_path)
+            self.add_resource(_get_code_resource_name(cached_rev), cache_path, dest_path)
             self.add_resource(
                 _get_planner_resource_name(cached_rev),
                 os.path.join(cache_path, "prost.py"),
@@ -371,23 +870,353 @@ class ProstExperiment(Experiment):
                 os.path.join(cache_path, "testbed", "run-server.py"),
                 os.path.join(dest_path, "testbed", "run-server.py"),
             )
-            self.add_resource(
-                _get_wrapper_resource_name(cached_rev),
-                os.path.join(cache_path, "testbed", "prostlab-wrapper.sh"),
-                os.path.join(dest_path, "testbed", "prostlab-wrapper.sh"),
-            )
+        if self.server_pool:
+            # Pooled servers load the RDDL files of all runs.
+            declared = {}
+            for task in self.suites:
+                for filename in [task.domain_file, task.problem_file]:
+                    for kind, name in read_declared_names(filename):
+                        other = declared.setdefault((kind, name), filename)
+                        if other != filename and not filecmp.cmp(
+                            other, filename, shallow=False
+                        ):
+                            logging.critical(
+                                "Pooled servers cannot distinguish the {} {} in {} "
+                                "and {}. Use separate experiments for suites "
+                                "that reuse names.".format(kind, name, other, filename)
+                            )
+                    dest = "{}-{}".format(task.domain, os.path.basename(filename))
+                    self.add_resource(
+                        "", filename, os.path.join(SERVER_POOL_BENCHMARKS_DIR, dest)
+                    )
 
     def _add_runs(self):
         port = self.initial_port
+        num_tightened = 0
         for config in self.configs.values():
             for task in self.suites:
-                run_time = int(task.horizon * self.num_runs * self.time_per_step)
+                search_time = int(task.horizon * self.num_runs * self.time_per_step)
                 rddlsim_run_time = 0
                 if self.rddlsim_enforces_runtime:
-                    rddlsim_run_time = run_time
-                run_time += self.time_buffer
-                self.add_run(ProstRun(self, config, task, port, rddlsim_run_time, run_time))
-                port += 1
+                    rddlsim_run_time = search_time
+                run_time = search_time + self.time_buffer
+                memory_limit = self.memory_limit
+                if self.predictor:
+                    limits = self.predictor.get_limits(
+                        config.name, task, search_time, run_time, memory_limit
+                    )
+                    if limits != (run_time, memory_limit):
+                        num_tightened += 1
+                    run_time, memory_limit = limits
+                start_tier = 0
+                if self.memory_tiers and memory_limit < self.memory_limit:
+                    # Skip the tiers below the predicted memory limit.
+                    while (
+                        start_tier < len(self.memory_tiers) - 1
+                        and self.memory_tiers[start_tier] < memory_limit
+                    ):
+                        start_tier += 1
+                for replicate, (rddlsim_seed, planner_seed) in enumerate(
+                    self.get_replicates()
+                ):
+                    self.add_run(
+                        ProstRun(
+                            self,
+                            config,
+                            task,
+                            port,
+                            rddlsim_run_time,
+                            run_time,
+                            memory_limit,
+                            start_tier,
+                            rddlsim_seed,
+                            planner_seed,
+                            replicate,
+                        )
+                    )
+                    port += 1
+        if self.predictor:
+            logging.info(
+                "Tightened the limits of {} of {} runs.".format(
+                    num_tightened, len(self.runs)
+                )
+            )
+
+    def get_replicates(self):
+        """Return the list of (rddlsim seed, planner seed) pairs with
+        which each algorithm is run on each task."""
+        return list(itertools.product(self.rddlsim_seeds, self.planner_seeds))
+
+    def is_profiled(self, task):
+        """Return whether the runs on *task* are profiled.
+
+        The decision only depends on the task and *profile_fraction*, so
+        all algorithms are profiled on the same tasks, and a task that
+        is profiled stays profiled when the fraction is increased.
+        """
+        if self.profile_fraction <= 0:
+            return False
+        digest = hashlib.sha1(
+            "{}:{}".format(task.domain, task.problem).encode()
+        ).hexdigest()
+        return int(digest[:8], 16) < self.profile_fraction * 16 ** 8
+
+    def add_database_fetcher(
+        self, database, src=None, experiment=None, name=None, filter=None, **kwargs
+    ):
+        """Add a step that adds the runs of an evaluation directory to the
+        :class:`~prostlab.database.ResultsDatabase` at *database*.
+
+        *src* must be an evaluation directory. It defaults to
+        ``exp.eval_dir``, so the step should be run after the regular
+        fetcher. The runs are stored under the name *experiment*, which
+        defaults to the name of this experiment.
+
+        If no *name* is given, call this step "fetch-to-database".
+
+        You can push only a subset of runs by passing
+        :py:class:`filters <lab.reports.Report>` with the *filter*
+        argument.
+
+        >>> exp.add_fetcher(name="fetch")
+        >>> exp.add_database_fetcher("/path/to/results.db")
+
+        """
+        src = src or self.eval_dir
+        experiment = experiment or self.name
+        name = name or "fetch-to-database"
+        self.add_step(
+            name,
+            DatabaseFetcher(),
+            src,
+            database,
+            experiment=experiment,
+            filter=filter,
+            **kwargs,
+        )
+
+    def add_retry_step(self, name="retry", max_retries=2):
+        """Add a step that executes runs again that failed because of the
+        infrastructure, e.g., because their node died.
+
+        Runs are repeated at most *max_retries* times and genuine planner
+        failures are never repeated. See :class:`prostlab.retry.RunRetrier`
+        for details. The step must be run after all runs finished and before
+        the results are fetched. The runs are executed by a separate
+        experiment ``<path>-<name>-<n>`` in the environment of this experiment
+        like the runs of the experiment step. On a grid, the step submits them
+        as a new job and returns, so run it on its own on the login node
+        (e.g., ``./exp.py retry``) and fetch the results once the job is done.
+
+        >>> exp.add_step("start", exp.start_runs)
+        >>> exp.add_retry_step()
+        >>> exp.add_fetcher(name="fetch")
+
+        """
+        self.add_step(
+            name, RunRetrier(), self, max_retries=max_retries, step_name=name
+        )
+
+    def add_archive_step(self, name="archive", runs_per_archive=1000, max_retries=2):
+        """Add a step that packs finished run directories into indexed archives
+        with *runs_per_archive* runs each, which saves inodes and makes
+        fetching faster. Runs that may still be retried (see
+        :meth:`.add_retry_step` with *max_retries*) are not archived.
+
+        See :class:`prostlab.archive.RunArchiver` for details. The fetcher
+        and the parse-again step of the experiment read the archived runs
+        directly, and :class:`prostlab.archive.RunArchive` gives access to
+        the logs of single runs.
+
+        >>> exp.add_retry_step()
+        >>> exp.add_archive_step()
+        >>> exp.add_fetcher(name="fetch")
+
+        """
+        self.add_step(
+            name,
+            RunArchiver(),
+            self.path,
+            runs_per_archive=runs_per_archive,
+            max_retries=max_retries,
+        )
+
+    def add_race_step(self, race=None, name="race"):
+        """Add a step that races the algorithms of the experiment against each
+        other instead of running all algorithms on all tasks.
+
+        *race* must be a :class:`prostlab.racing.Race`, which splits the suite
+        into waves and decides after each wave which algorithms are
+        significantly worse than the best one. These algorithms are not run
+        on the tasks of later waves.
+
+        Each wave is built as a separate experiment in the directory
+        ``wave-<n>`` of the experiment. It has the settings, parsers and
+        resources of this experiment and the surviving algorithms, and its
+        runs are started in the environment of this experiment (see
+        :func:`prostlab.retry.execute_runs`). In a local environment, the step
+        executes the whole race. On a grid, the step submits the runs of the
+        next wave and returns, so run it on its own on the login node (e.g.,
+        ``./exp.py race``) and execute it again once the runs are done, which
+        evaluates the wave and submits the next one. The race is over when
+        ``race.json`` lists no pending wave. The results of all waves are
+        fetched into the evaluation directory of the experiment, and the
+        course of the race is written to ``race.json`` in the evaluation
+        directory. The step replaces the build, start and fetch steps.
+
+        >>> exp.add_race_step(Race(tasks_per_wave=10))
+        >>> exp.add_report(AbsoluteReport(attributes=["ipc_score"]))
+
+        """
+        self.add_step(name, self.race, race or Race(), step_name=name)
+
+    def _get_options(self):
+        """Return the constructor arguments for an experiment with the
+        settings of this experiment."""
+        parameters = inspect.signature(ProstExperiment.__init__).parameters
+        return {
+            name: getattr(self, name)
+            for name in parameters
+            if name not in ["self", "suites", "path", "environment"]
+        }
+
+    def _get_wave_experiment(self, index, configs, suite):
+        wave = create_experiment(
+            ProstExperiment,
+            suite,
+            path=os.path.join(self.path, "wave-{:02d}".format(index)),
+            environment=copy.copy(self.environment),
+            **self._get_options()
+        )
+        for name in configs:
+            wave._add_config(self.configs[name])
+        _copy_experiment_setup(self, wave)
+        return wave
+
+    def _write_race_state(self, state):
+        with open(os.path.join(self.eval_dir, "race.json"), "w") as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+
+    def race(self, race, step_name="race"):
+        """Race the algorithms of the experiment. See :meth:`.add_race_step`."""
+        if not self.configs:
+            logging.critical("You must add at least one config.")
+        check_login_node(self.environment, step_name)
+        state_file = os.path.join(self.eval_dir, "race.json")
+        state = None
+        if os.path.exists(state_file):
+            with open(state_file) as f:
+                state = json.load(f)
+        if state is None or state.get("pending_wave") is None:
+            self._remove_experiment_dir()
+            tools.makedirs(self.path)
+            if os.path.exists(self.eval_dir):
+                tools.confirm_overwrite_or_abort(self.eval_dir)
+                tools.remove_path(self.eval_dir)
+            tools.makedirs(self.eval_dir)
+            state = {"survivors": list(self.configs), "waves": [], "pending_wave": None}
+        waves = race.get_waves(self.suites)
+        fetcher = ArchiveFetcher()
+        while True:
+            index = state["pending_wave"]
+            if index is not None:
+                wave_path = os.path.join(self.path, "wave-{:02d}".format(index))
+                run_dirs = glob(os.path.join(wave_path, "runs-*-*", "*"))
+                num_pending = sum(
+                    classify_run(run_dir) == NODE_FAILURE for run_dir in run_dirs
+                )
+                if num_pending:
+                    logging.info(
+                        "{} of {} runs of wave {} have not finished. Execute step "
+                        "{} again once they are done.".format(
+                            num_pending, len(run_dirs), index, step_name
+                        )
+                    )
+                    return
+                survivors = state["survivors"]
+                fetcher(wave_path, self.eval_dir, merge=True)
+                props = tools.Properties(os.path.join(self.eval_dir, "properties"))
+                eliminated, result = race.eliminate(props, survivors)
+                state["survivors"] = [
+                    config for config in survivors if config not in eliminated
+                ]
+                result.update(
+                    wave=index, tasks=len(waves[index - 1]), eliminated=eliminated
+                )
+                state["waves"].append(result)
+                state["pending_wave"] = None
+                self._write_race_state(state)
+            index = len(state["waves"]) + 1
+            if index > len(waves):
+                break
+            suite = waves[index - 1]
+            logging.info(
+                "Wave {}: {} tasks, algorithms {}".format(
+                    index, len(suite), state["survivors"]
+                )
+            )
+            wave = self._get_wave_experiment(index, state["survivors"], suite)
+            wave.build()
+            state["pending_wave"] = index
+            self._write_race_state(state)
+            execute_runs(wave, "start")
+            if isinstance(self.environment, GridEnvironment):
+                logging.info(
+                    "Submitted wave {}. Execute step {} again once its runs "
+                    "are done.".format(index, step_name)
+                )
+                return
+        logging.info("Algorithms that survived the race: {}".format(state["survivors"]))
+
+    def add_fetcher(
+        self, src=None, dest=None, merge=None, name=None, filter=None, **kwargs
+    ):
+        """Add a step that fetches results like
+        :meth:`lab.experiment.Experiment.add_fetcher`, but also reads runs
+        that were archived by the step added with :meth:`.add_archive_step`.
+        """
+        src = src or self.path
+        dest = dest or self.eval_dir
+        name = name or "fetch-%s" % os.path.basename(src.rstrip("/"))
+        self.add_step(
+            name, ArchiveFetcher(), src, dest, merge=merge, filter=filter, **kwargs
+        )
+
+    def add_parse_again_step(self):
+        """Add a step that copies the parsers to the experiment directory again
+        and runs them in all run directories and all archived runs.
+
+        Unlike :meth:`lab.experiment.Experiment.add_parse_again_step`, the
+        step does not remove the properties files, since the supervisor stores
+        properties of the runs in them. Parsers overwrite the attributes they
+        find. Run the fetcher again afterwards.
+        """
+
+        def run_parsers():
+            if not os.path.isdir(self.path):
+                logging.critical(f"{self.path} is missing or not a directory")
+            self._build_resources(only_parsers=True)
+            parsers = [
+                os.path.join(self.path, self.env_vars_relative[resource.name])
+                for resource in self.resources
+                if resource.is_parser
+            ]
+
+            def parse_run(run_dir):
+                for parser in parsers:
+                    subprocess.check_call(
+                        [tools.get_python_executable(), parser],
+                        cwd=run_dir,
+                        stdout=subprocess.DEVNULL,
+                    )
+
+            run_dirs = sorted(glob(os.path.join(self.path, "runs-*-*", "*")))
+            logging.info(f"Parsing properties in {len(run_dirs):d} run directories")
+            for run_dir in run_dirs:
+                parse_run(run_dir)
+            RunArchive(self.path).update_runs(parse_run)
+
+        self.add_step("parse-again", run_parsers)
 
     def get_all_attributes(self):
         """Return all attributes that are parsed by one of the default parsers.
@@ -0,0 +1,253 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A manifest of the RDDL files in a benchmarks directory that allows
+building suites without reading or checking the benchmark files.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import logging
+import os
+import re
+
+from lab import tools
+from lab.experiment import get_default_data_dir
+
+
+MANIFEST_VERSION = 2
+
+_HORIZON_RE = re.compile(r"horizon\s*=\s*(.+)\s*;\s*\n")
+_COMMENT_RE = re.compile(r"//[^\n]*")
+_FLUENT_KIND_RE = re.compile(
+    r":\s*\{\s*(state-fluent|action-fluent|interm-fluent|observ-fluent|non-fluent)\b"
+)
+_MAX_NONDEF_ACTIONS_RE = re.compile(r"max-nondef-actions\s*=\s*(\d+|pos-inf)")
+_OBJECTS_RE = re.compile(r"\bobjects\s*\{")
+_OBJECT_TYPE_RE = re.compile(r":\s*\{([^}]*)\}")
+_DECLARATION_RE = re.compile(r"^\s*(domain|non-fluents|instance)\s+([\w-]+)\s*\{", re.M)
+
+
+def read_horizon(problem_file):
+    """Return the horizon of the instance in *problem_file* or None if the
+    file does not specify a horizon."""
+    with open(problem_file) as f:
+        for line in f:
+            match = _HORIZON_RE.search(line)
+            if match:
+                return int(match.group(1))
+    return None
+
+
+def read_declared_names(filename):
+    """Return the (kind, name) pairs of the domains, non-fluents and
+    instances declared in the RDDL file *filename*."""
+    with open(filename, errors="replace") as f:
+        content = _COMMENT_RE.sub("", f.read())
+    return _DECLARATION_RE.findall(content)
+
+
+def _get_block(content, start):
+    """Return the content between the opening brace before *start* and
+    its matching closing brace."""
+    depth = 1
+    for index in range(start, len(content)):
+        if content[index] == "{":
+            depth += 1
+        elif content[index] == "}":
+            depth -= 1
+            if depth == 0:
+                return content[start:index]
+    return content[start:]
+
+
+def get_rddl_statistics(content):
+    """Return size statistics of the RDDL domain or instance *content*.
+
+    Domain files yield the number of fluents of each kind, instance
+    files the number of objects and the number of concurrent actions.
+    """
+    content = _COMMENT_RE.sub("", content)
+    statistics = {}
+    kinds = _FLUENT_KIND_RE.findall(content)
+    if kinds:
+        for kind in [
+            "state-fluent",
+            "action-fluent",
+            "interm-fluent",
+            "observ-fluent",
+            "non-fluent",
+        ]:
+            name = "num_{}s".format(kind.replace("-", "_"))
+            statistics[name] = kinds.count(kind)
+    match = _OBJECTS_RE.search(content)
+    if match:
+        objects = _get_block(content, match.end())
+        statistics["num_objects"] = sum(
+            len([name for name in names.split(",") if name.strip()])
+            for names in _OBJECT_TYPE_RE.findall(objects)
+        )
+    match = _MAX_NONDEF_ACTIONS_RE.search(content)
+    if match:
+        value = match.group(1)
+        statistics["max_nondef_actions"] = None if value == "pos-inf" else int(value)
+    return statistics
+
+
+def analyze_file(filename):
+    """Return the hash, horizon and size statistics of the RDDL file
+    *filename*."""
+    with open(filename, "rb") as f:
+        data = f.read()
+    content = data.decode("utf-8", errors="replace")
+    match = _HORIZON_RE.search(content)
+    return {
+        "hash": hashlib.sha1(data).hexdigest(),
+        "horizon": int(match.group(1)) if match else None,
+        "statistics": get_rddl_statistics(content),
+    }
+
+
+def _scan_rddl_files(directory):
+    """Yield (path, stat result) pairs for all RDDL files below *directory*."""
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                yield from _scan_rddl_files(entry.path)
+            elif entry.is_file() and entry.name.endswith(".rddl"):
+                yield entry.path, entry.stat()
+
+
+class BenchmarkManifest(object):
+    """A cached description of all RDDL files in a benchmarks directory.
+
+    For each file, the manifest stores its path relative to the
+    benchmarks directory, size, modification time, SHA-1 hash and
+    derived properties like the horizon and size statistics (see
+    :func:`get_rddl_statistics`). Looking up a file in the manifest does
+    no file I/O, and :meth:`refresh` only reads files that are new or
+    have changed since the last refresh.
+
+    >>> manifest = BenchmarkManifest.load()
+    >>> suite = [Problem("elevators-2011", 1, -65.2, manifest=manifest,
+    ...     benchmarks_dir=os.path.join(manifest.benchmarks_dir, "elevators-2011"))]
+
+    """
+
+    def __init__(self, benchmarks_dir=None, path=None, processes=None):
+        """
+        *benchmarks_dir* defaults to the value of the environment
+        variable ``PROST_BENCHMARKS``.
+
+        *path* is the file in which the manifest is stored. It defaults
+        to ``<scriptdir>/data/benchmark-manifest.json``.
+
+        New and changed files are analyzed with *processes* parallel
+        processes, which defaults to the number of CPUs.
+        """
+        if benchmarks_dir is None:
+            if "PROST_BENCHMARKS" not in os.environ:
+                logging.critical("Environment variable PROST_BENCHMARKS is not set.")
+            benchmarks_dir = os.environ["PROST_BENCHMARKS"]
+        self.benchmarks_dir = os.path.abspath(benchmarks_dir)
+        self.path = path or os.path.join(
+            get_default_data_dir(), "benchmark-manifest.json"
+        )
+        self.processes = processes
+        self.entries = {}
+
+    @classmethod
+    def load(cls, benchmarks_dir=None, path=None, refresh=None, processes=None):
+        """Load the manifest from disk.
+
+        If *refresh* is True, the manifest is refreshed afterwards. If it
+        is None (the default), the manifest is only refreshed if it did
+        not exist yet or belongs to a different benchmarks directory.
+        """
+        manifest = cls(benchmarks_dir, path, processes)
+        outdated = True
+        if os.path.exists(manifest.path):
+            with open(manifest.path) as f:
+                data = json.load(f)
+            if (
+                data.get("version") == MANIFEST_VERSION
+                and data.get("benchmarks_dir") == manifest.benchmarks_dir
+            ):
+                manifest.entries = data["entries"]
+                outdated = False
+        if refresh or (refresh is None and outdated):
+            manifest.refresh()
+        return manifest
+
+    def save(self):
+        data = {
+            "version": MANIFEST_VERSION,
+            "benchmarks_dir": self.benchmarks_dir,
+            "entries": self.entries,
+        }
+        tools.makedirs(os.path.dirname(self.path))
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def refresh(self):
+        """Add new and changed files, remove deleted files and save the
+        manifest if anything changed."""
+        if not os.path.isdir(self.benchmarks_dir):
+            logging.critical(f"Benchmarks dir not found: {self.benchmarks_dir}")
+
+        changed = []
+        seen = set()
+        for path, stat in _scan_rddl_files(self.benchmarks_dir):
+            key = os.path.relpath(path, self.benchmarks_dir)
+            seen.add(key)
+            entry = self.entries.get(key)
+            if (
+                entry is None
+                or entry["size"] != stat.st_size
+                or entry["mtime"] != stat.st_mtime_ns
+            ):
+                changed.append((key, path, stat))
+        removed = set(self.entries) - seen
+        for key in removed:
+            del self.entries[key]
+        if len(changed) > 1 and self.processes != 1:
+            with ProcessPoolExecutor(max_workers=self.processes) as executor:
+                results = list(
+                    executor.map(analyze_file, [path for _, path, _ in changed])
+                )
+        else:
+            results = [analyze_file(path) for _, path, _ in changed]
+        for (key, _, stat), entry in zip(changed, results):
+            entry["size"] = stat.st_size
+            entry["mtime"] = stat.st_mtime_ns
+            self.entries[key] = entry
+
+        logging.info(
+            "Refreshed benchmark manifest: {} files, {} new or changed, "
+            "{} removed.".format(len(self.entries), len(changed), len(removed))
+        )
+        if changed or removed:
+            self.save()
+
+    def get(self, filename):
+        """Return the entry for *filename* or None if the manifest does not
+        contain it."""
+        key = os.path.relpath(os.path.abspath(filename), self.benchmarks_dir)
+        return self.entries.get(key)
@@ -26,6 +26,12 @@ def get_all_prost_parser_attributes():
         "total_reward",
         "average_reward",
         "round_reward",
+        "num_steps",
+        "search_time_per_step",
+        "search_time_budget_utilization",
+        "enforced_time_limit_utilization",
+        "non_search_time",
+        "run_time_limit_utilization",
     ]
 
 def get_default_prost_parser_attributes():
@@ -0,0 +1,117 @@
+#! /usr/bin/env python
+#
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Parse the decisions Prost would have taken at the anytime checkpoints.
+
+For each step, the planner writes one line per checkpoint and one
+line for the executed action after it took its decision:
+
+    Anytime checkpoint <time>s: <q-value> <action>
+    Anytime final: <q-value> <action>
+
+where <action> is the best action after <time> seconds or the executed
+action, respectively, and <q-value> is its Q-value estimate at the end
+of the step. Since all checkpoints lie below the time per step, none of
+the checkpoint lines describes the executed action. Steps without a
+final line are ignored.
+"""
+
+import re
+
+from prostlab.repeated_pattern_parser import RepeatedPatternParser
+
+
+CHECKPOINT_REGEX = re.compile(r"^Anytime checkpoint ([\d.]+)s: (\S+) (.*)$")
+FINAL_REGEX = re.compile(r"^Anytime final: (\S+) (.*)$")
+
+
+def _get_steps(content):
+    """Return a list of pairs for each step: a dictionary that maps the
+    checkpoints to the action and its Q-value, and the executed action
+    with its Q-value."""
+    steps = []
+    for line in content.splitlines():
+        if line.startswith("Planning step "):
+            steps.append(({}, None))
+            continue
+        if not steps:
+            continue
+        match = CHECKPOINT_REGEX.match(line)
+        if match:
+            time, q_value, action = match.groups()
+            steps[-1][0][float(time)] = (action.strip(), float(q_value))
+            continue
+        match = FINAL_REGEX.match(line)
+        if match:
+            q_value, action = match.groups()
+            steps[-1] = (steps[-1][0], (action.strip(), float(q_value)))
+    return [(step, final) for step, final in steps if step and final]
+
+
+def add_anytime_profile(content, props):
+    """Estimate the average reward the planner would have achieved if
+    it had stopped at each checkpoint.
+
+    The estimate assumes that the Q-value estimates at the end of a step
+    are accurate: taking the action of an earlier checkpoint loses the
+    difference between its Q-value and the Q-value of the executed
+    action.
+    """
+    steps = _get_steps(content)
+    if not steps:
+        return
+    checkpoints = sorted({time for step, _ in steps for time in step})
+    num_rounds = len(re.findall(r"^>>> END OF ROUND", content, re.M))
+    match = re.search(r">>> END OF SESSION  -- AVERAGE REWARD: (.+)\n", content)
+    agreement = []
+    q_value_loss = []
+    for checkpoint in checkpoints:
+        num_agreeing = 0
+        loss = 0.0
+        for step, (final_action, final_q_value) in steps:
+            # Use the latest decision before the checkpoint.
+            times = [time for time in step if time <= checkpoint]
+            action, q_value = step[max(times)] if times else step[min(step)]
+            num_agreeing += action == final_action
+            loss += max(0.0, final_q_value - q_value)
+        agreement.append(num_agreeing / len(steps))
+        q_value_loss.append(loss)
+    props["anytime_checkpoints"] = checkpoints
+    props["anytime_agreement"] = agreement
+    props["anytime_q_value_loss_per_step"] = [loss / len(steps) for loss in q_value_loss]
+    if match and num_rounds:
+        average_reward = float(match.group(1))
+        props["anytime_estimated_reward"] = [
+            average_reward - loss / num_rounds for loss in q_value_loss
+        ]
+
+
+class AnytimeParser(RepeatedPatternParser):
+    def __init__(self):
+        RepeatedPatternParser.__init__(self)
+
+        self.add_function(add_anytime_profile)
+
+
+def main():
+    parser = AnytimeParser()
+    parser.parse()
+
+
+main()
@@ -16,6 +16,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
+import re
+
 from prostlab.repeated_pattern_parser import RepeatedPatternParser
 
 
@@ -26,6 +29,46 @@ def add_planner_time(content, props):
         pass
 
 
+def count_steps(content, props):
+    props["num_steps"] = len(re.findall(r"^Planning step ", content, re.M))
+
+
+def add_time_budget_utilization(content, props):
+    """Relate the time the planner used to the time it was given.
+
+    The search time budget, the run time limit and the limit enforced by
+    rddlsim are static properties of the run, and *num_steps* counts the
+    steps that were planned.
+    """
+    try:
+        with open("static-properties") as f:
+            limits = json.load(f)
+    except (OSError, ValueError):
+        limits = {}
+    num_steps = props.get("num_steps")
+    search_time = props.get("search_time")
+    if search_time is None:
+        return
+    if num_steps:
+        props["search_time_per_step"] = search_time / num_steps
+    if limits.get("search_time_budget"):
+        props["search_time_budget_utilization"] = (
+            search_time / limits["search_time_budget"]
+        )
+    if limits.get("enforced_time_limit"):
+        props["enforced_time_limit_utilization"] = (
+            search_time / limits["enforced_time_limit"]
+        )
+    wall_clock_time = props.get("planner_wall_clock_time")
+    if wall_clock_time is not None:
+        # The time buffer has to cover everything but the search.
+        props["non_search_time"] = max(0.0, wall_clock_time - search_time)
+        if limits.get("run_time_limit"):
+            props["run_time_limit_utilization"] = (
+                wall_clock_time / limits["run_time_limit"]
+            )
+
+
 class ProstParser(RepeatedPatternParser):
     def __init__(self):
         RepeatedPatternParser.__init__(self)
@@ -55,6 +98,8 @@ class ProstParser(RepeatedPatternParser):
         )
 
         self.add_function(add_planner_time)
+        self.add_function(count_steps)
+        self.add_function(add_time_budget_utilization)
 
         self.add_pattern(
             "total_reward",
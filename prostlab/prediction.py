@@ -0,0 +1,257 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Predict the time and memory Prost runs need from past experiments.
+"""
+
+from collections import defaultdict
+import logging
+import math
+import os
+
+from lab import tools
+
+from prostlab.database import ResultsDatabase
+
+
+def _solve(matrix, vector):
+    """Solve the linear system *matrix* x = *vector* with Gaussian
+    elimination and partial pivoting."""
+    size = len(vector)
+    rows = [list(row) + [value] for row, value in zip(matrix, vector)]
+    for col in range(size):
+        pivot = max(range(col, size), key=lambda row: abs(rows[row][col]))
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        for row in range(col + 1, size):
+            factor = rows[row][col] / rows[col][col]
+            for index in range(col, size + 1):
+                rows[row][index] -= factor * rows[col][index]
+    solution = [0.0] * size
+    for row in reversed(range(size)):
+        value = rows[row][size] - sum(
+            rows[row][index] * solution[index] for index in range(row + 1, size)
+        )
+        solution[row] = value / rows[row][row]
+    return solution
+
+
+class _LogLinearModel(object):
+    """Ridge regression of log(1 + target) on log(1 + features)."""
+
+    def __init__(self, samples, regularization=1e-3):
+        size = len(samples[0][0]) + 1
+        matrix = [[0.0] * size for _ in range(size)]
+        vector = [0.0] * size
+        self.max_error = 0.0
+        for features, target in samples:
+            x = self._transform(features)
+            y = math.log1p(target)
+            for i in range(size):
+                vector[i] += x[i] * y
+                for j in range(size):
+                    matrix[i][j] += x[i] * x[j]
+        for i in range(1, size):
+            matrix[i][i] += regularization * len(samples)
+        matrix[0][0] += 1e-9
+        self.weights = _solve(matrix, vector)
+        # Remember the largest underestimation on the training data, so
+        # that predictions err on the safe side.
+        for features, target in samples:
+            error = math.log1p(target) - self._predict_log(features)
+            self.max_error = max(self.max_error, error)
+
+    @staticmethod
+    def _transform(features):
+        return [1.0] + [math.log1p(max(0.0, value)) for value in features]
+
+    def _predict_log(self, features):
+        x = self._transform(features)
+        return sum(weight * value for weight, value in zip(self.weights, x))
+
+    def predict(self, features):
+        return math.expm1(self._predict_log(features) + self.max_error)
+
+
+class RunPredictor(object):
+    """Estimate the time and memory of Prost runs from past runs.
+
+    The time of a run consists of the search time, which is given by
+    the experiment (horizon * num_runs * time_per_step), and an overhead
+    that is dominated by parsing the instance. The predictor estimates
+    this overhead and the peak memory (the ``raw_memory`` property in
+    KiB) of each run.
+
+    If the training runs contain the task, the largest value that was
+    observed for it is used, preferring runs of the same algorithm. For
+    other tasks, a log-linear model over the :attr:`FEATURES` of the
+    training runs is used, which are set for suites created with
+    :func:`~prostlab.suites.discover_suite`. If neither is possible, no
+    prediction is made and the default limits of the experiment apply.
+
+    Predictions are multiplied by a safety factor and increased by a
+    margin. The limits of the experiment are never exceeded, so passing
+    a predictor to :class:`~prostlab.experiment.ProstExperiment` can
+    only tighten the limits of a run.
+
+    >>> predictor = RunPredictor.from_database("/path/to/results.db")
+    >>> exp = ProstExperiment(suites=suite, predictor=predictor)
+
+    """
+
+    # Instance features of the model. Can be overriden in subclasses.
+    FEATURES = [
+        "horizon",
+        "num_objects",
+        "num_state_fluents",
+        "num_action_fluents",
+        "num_non_fluents",
+    ]
+
+    def __init__(
+        self,
+        props,
+        time_factor=1.5,
+        time_margin=60,
+        memory_factor=1.5,
+        memory_margin=512,
+        min_memory_limit=2048,
+        min_samples=10,
+    ):
+        """
+        *props* are the properties of past runs (e.g., a
+        :class:`lab.tools.Properties` object).
+
+        The predicted overhead in seconds is multiplied with
+        *time_factor* and increased by *time_margin*. The predicted
+        memory in MiB is multiplied with *memory_factor* and increased
+        by *memory_margin*. Memory limits are never smaller than
+        *min_memory_limit* MiB, since the Java virtual machine of
+        rddlsim requires a certain amount of address space.
+
+        Models are only trained with at least *min_samples* runs.
+        """
+        self.time_factor = time_factor
+        self.time_margin = time_margin
+        self.memory_factor = memory_factor
+        self.memory_margin = memory_margin
+        self.min_memory_limit = min_memory_limit
+        self.min_samples = min_samples
+
+        # Map (domain, problem) to {algorithm: maximal value}.
+        self.overheads = defaultdict(dict)
+        self.memory = defaultdict(dict)
+        overhead_samples = []
+        memory_samples = []
+        for run in props.values():
+            task = (run.get("domain"), str(run.get("problem")))
+            algorithm = run.get("algorithm")
+            features = self._get_features(run)
+            overhead = self._get_overhead(run)
+            if overhead is not None:
+                old = self.overheads[task].get(algorithm, 0.0)
+                self.overheads[task][algorithm] = max(old, overhead)
+                if features is not None:
+                    overhead_samples.append((features, overhead))
+            if run.get("raw_memory") is not None:
+                memory = run["raw_memory"] / 1024
+                old = self.memory[task].get(algorithm, 0.0)
+                self.memory[task][algorithm] = max(old, memory)
+                if features is not None:
+                    memory_samples.append((features, memory))
+
+        self.overhead_model = self._train(overhead_samples)
+        self.memory_model = self._train(memory_samples)
+        logging.info(
+            "Trained run predictor on {} runs with overhead and {} runs with "
+            "memory.".format(len(overhead_samples), len(memory_samples))
+        )
+
+    @classmethod
+    def from_eval_dirs(cls, eval_dirs, **kwargs):
+        """Train a predictor on the runs in the evaluation directories
+        *eval_dirs*."""
+        props = tools.Properties()
+        for eval_dir in eval_dirs:
+            props.update(tools.Properties(os.path.join(eval_dir, "properties")))
+        return cls(props, **kwargs)
+
+    @classmethod
+    def from_database(cls, database, query=None, **kwargs):
+        """Train a predictor on the runs in the
+        :class:`~prostlab.database.ResultsDatabase` at *database* that
+        match *query*."""
+        return cls(ResultsDatabase(database).get_runs(query), **kwargs)
+
+    def _train(self, samples):
+        if len(samples) < self.min_samples:
+            return None
+        return _LogLinearModel(samples)
+
+    def _get_features(self, properties):
+        features = [properties.get(feature) for feature in self.FEATURES]
+        if any(value is None for value in features):
+            return None
+        return features
+
+    def _get_overhead(self, run):
+        """Return the time of *run* that was not spent searching."""
+        overhead = run.get("parser_time")
+        wall_time = run.get("planner_wall_clock_time")
+        search_time = run.get("search_time_budget")
+        if wall_time is not None and search_time is not None:
+            overhead = max(overhead or 0.0, wall_time - search_time)
+        return overhead
+
+    def _predict(self, values, model, algorithm, task):
+        observed = values.get((task.domain, str(task.problem)))
+        if observed:
+            if algorithm in observed:
+                return observed[algorithm]
+            return max(observed.values())
+        if model is None:
+            return None
+        properties = dict(task.properties, horizon=task.horizon)
+        features = self._get_features(properties)
+        if features is None:
+            return None
+        return model.predict(features)
+
+    def predict_overhead(self, algorithm, task):
+        """Return the predicted overhead in seconds of running *algorithm*
+        on *task* or None if no prediction is possible."""
+        return self._predict(self.overheads, self.overhead_model, algorithm, task)
+
+    def predict_memory(self, algorithm, task):
+        """Return the predicted peak memory in MiB of running *algorithm*
+        on *task* or None if no prediction is possible."""
+        return self._predict(self.memory, self.memory_model, algorithm, task)
+
+    def get_limits(self, algorithm, task, search_time, time_limit, memory_limit):
+        """Return the time and memory limit of running *algorithm* on
+        *task* with a search time of *search_time* seconds. The limits
+        are at most *time_limit* seconds and *memory_limit* MiB."""
+        overhead = self.predict_overhead(algorithm, task)
+        if overhead is not None:
+            predicted = search_time + overhead * self.time_factor + self.time_margin
+            time_limit = min(time_limit, int(math.ceil(predicted)))
+        memory = self.predict_memory(algorithm, task)
+        if memory is not None:
+            predicted = max(
+                self.min_memory_limit, memory * self.memory_factor + self.memory_margin
+            )
+            memory_limit = min(memory_limit, int(math.ceil(predicted)))
+        return time_limit, memory_limit
@@ -0,0 +1,113 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Race planner configurations against each other and stop running
+configurations that are significantly worse than the best one.
+"""
+
+import logging
+import random
+
+from prostlab.reports import aggregate_replicates, compute_ipc_scores
+from prostlab.stats import friedman_test
+
+
+class Race(object):
+    """Decide which configurations survive the waves of a race.
+
+    Like F-race (Birattari et al., 2002), the race evaluates all
+    surviving configurations on a new subset of the tasks in each wave.
+    After each wave, the configurations are compared on all tasks of the
+    finished waves with the Friedman test on their IPC scores. If the
+    test finds a difference with significance level *alpha*, all
+    configurations whose ranks differ significantly from the best
+    configuration in the post-hoc test are eliminated.
+
+    >>> race = Race(tasks_per_wave=10, alpha=0.05)
+    >>> exp.add_race_step(race)
+
+    """
+
+    def __init__(self, tasks_per_wave=10, alpha=0.05, min_tasks=5, min_configs=1, seed=0):
+        """
+        The suite is shuffled with *seed* and split into waves of
+        *tasks_per_wave* tasks. Configurations are only eliminated once
+        they have been evaluated on at least *min_tasks* tasks, and the
+        race stops eliminating configurations if only *min_configs*
+        remain.
+        """
+        self.tasks_per_wave = tasks_per_wave
+        self.alpha = alpha
+        self.min_tasks = min_tasks
+        self.min_configs = min_configs
+        self.seed = seed
+
+    def get_waves(self, suite):
+        """Return the tasks of *suite* split into waves."""
+        tasks = list(suite)
+        random.Random(self.seed).shuffle(tasks)
+        return [
+            tasks[start : start + self.tasks_per_wave]
+            for start in range(0, len(tasks), self.tasks_per_wave)
+        ]
+
+    def get_scores(self, props, configs):
+        """Return a list with the IPC scores of *configs* for each task on
+        which all of them were evaluated. Seed replicates are averaged."""
+        aggregate_replicates(props)
+        compute_ipc_scores(props)
+        scores = {}
+        for run in props.values():
+            task = (run["domain"], str(run["problem"]))
+            scores.setdefault(task, {})[run["algorithm"]] = run["ipc_score"]
+        return [
+            [scores[task][config] for config in configs]
+            for task in sorted(scores)
+            if all(config in scores[task] for config in configs)
+        ]
+
+    def eliminate(self, props, configs):
+        """Return the configurations among *configs* that are
+        significantly worse than the best one on the runs in *props* and
+        the results of the test."""
+        blocks = self.get_scores(props, configs)
+        result = {"num_tasks": len(blocks), "configs": list(configs)}
+        if len(configs) <= self.min_configs or len(blocks) < self.min_tasks:
+            return [], result
+        statistic, p_value, rank_sums, compare = friedman_test(blocks)
+        result.update(
+            statistic=statistic,
+            p_value=p_value,
+            rank_sums=dict(zip(configs, rank_sums)),
+        )
+        if p_value >= self.alpha:
+            return [], result
+        best = min(rank_sums)
+        eliminated = [
+            config
+            for config, rank_sum in zip(configs, rank_sums)
+            if rank_sum > best and compare(best, rank_sum) < self.alpha
+        ]
+        # Keep the best of the eliminated configurations if too few survive.
+        eliminated.sort(key=lambda config: result["rank_sums"][config])
+        while eliminated and len(configs) - len(eliminated) < self.min_configs:
+            eliminated.pop(0)
+        logging.info(
+            "Friedman test on {} tasks: statistic {:.2f}, p-value {:.4f}, "
+            "eliminated {}".format(len(blocks), statistic, p_value, eliminated)
+        )
+        return eliminated, result
@@ -17,13 +17,24 @@
 """Parse repeated patterns in logs and output files.
 
 A repeated pattern parser extends a lab parser with the functionality to
-parse a pattern that occurs repeatedly in a log or output file.
+parse a pattern that occurs repeatedly in a log or output file. It also
+reads logs that were compressed with gzip (see the *compress_logs*
+option of :class:`prostlab.experiment.ProstExperiment`): if a file is
+missing or empty, but a compressed version ``<file>.gz`` exists, the
+compressed file is decompressed while it is read. If the supervisor
+repeated the run (see :mod:`prostlab.supervisor`), only the output of
+the final attempt is parsed.
 
 """
 
+from collections import defaultdict
+import gzip
+import os
 import re
 
-from lab.parser import Parser
+from lab.parser import _FileParser, Parser
+
+from prostlab.supervisor import REPEATED_ATTEMPT_MARKER
 
 
 def _get_flags(flags_string):
@@ -33,7 +44,29 @@ def _get_flags(flags_string):
     return flags
 
 
+class _CompressedFileParser(_FileParser):
+    def load_file(self, filename):
+        compressed = filename + ".gz"
+        # While the run is executed, lab keeps an empty run.log open.
+        if not os.path.exists(compressed) or (
+            os.path.exists(filename) and os.path.getsize(filename) > 0
+        ):
+            _FileParser.load_file(self, filename)
+        else:
+            self.filename = filename
+            with gzip.open(compressed, "rt") as f:
+                self.content = f.read()
+        # Only parse the output of the final attempt of the run.
+        index = self.content.rfind(REPEATED_ATTEMPT_MARKER)
+        if index >= 0:
+            self.content = self.content[index + len(REPEATED_ATTEMPT_MARKER) :]
+
+
 class RepeatedPatternParser(Parser):
+    def __init__(self):
+        Parser.__init__(self)
+        self.file_parsers = defaultdict(_CompressedFileParser)
+
     def add_repeated_pattern(self, name, regex, file="run.log", type=int, flags="M"):
         """
         *regex* must contain at most one group.
@@ -18,13 +18,23 @@
 Module that permits generating Prost reports by reading properties files.
 """
 
+from array import array
+from bisect import bisect_right
 from collections import defaultdict
+from collections.abc import Mapping
+import cProfile
 from fnmatch import fnmatch
+import json
 import logging
+import os
+import statistics
 
 from lab import tools
 from lab.reports import arithmetic_mean, Attribute, CellFormatter, geometric_mean, markup, Report, Table
 
+from prostlab.database import INDEXED_ATTRIBUTES, ResultsDatabase
+from prostlab.reports.profiling import ReportProfiler
+
 
 def elementwise_func(cells, func):
     len_list = max([len(cell) for cell in cells])
@@ -96,6 +106,440 @@ def get_elementwise_min_max(items):
     return res
 
 
+# Number of characters read from properties files at once.
+READ_CHUNK_SIZE = 1 << 20
+
+
+def _skip_whitespace(text, index):
+    return json.decoder.WHITESPACE.match(text, index).end()
+
+
+class _ChunkedText(object):
+    """Text of the file *f* that is read in chunks while it is consumed.
+
+    Only the part of the file that has not been consumed yet and the
+    last chunk are held in memory.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.text = ""
+        self.index = 0
+        self.offset = 0
+
+    @property
+    def position(self):
+        return self.offset + self.index
+
+    def _read_chunk(self):
+        chunk = self.f.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return False
+        self.offset += self.index
+        self.text = self.text[self.index :] + chunk
+        self.index = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character ("" at the end)."""
+        while True:
+            self.index = _skip_whitespace(self.text, self.index)
+            if self.index < len(self.text) or not self._read_chunk():
+                return self.text[self.index : self.index + 1]
+
+    def decode(self, decoder):
+        """Decode and consume the JSON value at the current position."""
+        while True:
+            try:
+                value, self.index = decoder.raw_decode(self.text, self.index)
+                return value
+            except ValueError:
+                # The value may continue in the next chunk.
+                if not self._read_chunk():
+                    raise
+
+
+def read_properties(filename, keep_run=None, keep_attribute=None):
+    """Read the properties file *filename* run by run.
+
+    Runs for which *keep_run* returns False are discarded and only the
+    attributes for which *keep_attribute* returns True are kept. The
+    file is read in chunks and only one run is decoded at a time, so
+    neither the whole file nor discarded runs and attributes end up in
+    memory. Since each run is still decoded completely, the filters
+    reduce the memory usage, but not the time for reading the file.
+    """
+    decoder = json.JSONDecoder()
+    props = tools.Properties()
+
+    with open(filename) as f:
+        text = _ChunkedText(f)
+
+        def error(message):
+            logging.critical(
+                f"JSON parse error in file '{filename}' at position "
+                f"{text.position}: {message}"
+            )
+
+        if text.peek() != "{":
+            error("expected '{'")
+        text.index += 1
+        if text.peek() == "}":
+            return props
+        while True:
+            try:
+                run_id = text.decode(decoder)
+                if text.peek() != ":":
+                    error("expected ':'")
+                text.index += 1
+                text.peek()
+                run = text.decode(decoder)
+            except ValueError as err:
+                error(err)
+            if keep_run is None or keep_run(run):
+                if keep_attribute is not None:
+                    run = {attr: value for attr, value in run.items() if keep_attribute(attr)}
+                props[run_id] = run
+            delimiter = text.peek()
+            text.index += 1
+            if delimiter == "}":
+                return props
+            if delimiter != ",":
+                error("expected ',' or '}'")
+            text.peek()
+
+
+class RunIndex(object):
+    """Integer-indexed table of runs.
+
+    The runs are sorted by domain, task and the position of their
+    algorithm in *algorithms*. Domains and the tasks of each domain keep
+    the order in which they first appear. All runs of a task and all
+    tasks of a domain are stored consecutively: the runs of the task
+    ``tasks[i]`` are ``runs[task_starts[i]:task_starts[i + 1]]`` and the
+    tasks of the domain ``domains[i]`` are
+    ``tasks[domain_starts[i]:domain_starts[i + 1]]``. The array
+    *algorithm_ids* holds the position of the algorithm of each run in
+    *algorithms*. The dictionary *domain_algorithm_positions* maps each
+    pair of domain and algorithm ids to the positions of its runs in the
+    order in which the runs are given.
+
+    The views returned by the ``get_*`` methods compute their values
+    from the table when they are accessed, so that the runs are not
+    stored in several containers.
+    """
+
+    def __init__(self, runs, algorithms):
+        self.algorithms = list(algorithms)
+        self.algorithm_to_id = {algo: index for index, algo in enumerate(self.algorithms)}
+        self.domains = []
+        self.domain_to_id = {}
+        first_task_ids = {}
+
+        runs = list(runs)
+        keys = []
+        for run in runs:
+            domain = run["domain"]
+            task = (domain, run["problem"])
+            if domain not in self.domain_to_id:
+                self.domain_to_id[domain] = len(self.domains)
+                self.domains.append(domain)
+            if task not in first_task_ids:
+                first_task_ids[task] = len(first_task_ids)
+            keys.append(
+                (
+                    self.domain_to_id[domain],
+                    first_task_ids[task],
+                    self.algorithm_to_id[run["algorithm"]],
+                )
+            )
+        del first_task_ids
+
+        # Sorting is stable, so runs with the same key keep their order.
+        order = sorted(range(len(runs)), key=keys.__getitem__)
+        self.runs = [runs[index] for index in order]
+        self.algorithm_ids = array("l", (keys[index][2] for index in order))
+        self.tasks = []
+        self.task_to_id = {}
+        self.task_starts = array("l")
+        self.domain_starts = array("l")
+        previous_key = None
+        for position, index in enumerate(order):
+            domain_id, first_task_id, _ = keys[index]
+            if previous_key is None or domain_id != previous_key[0]:
+                self.domain_starts.append(len(self.tasks))
+            if (domain_id, first_task_id) != previous_key:
+                task = (self.domains[domain_id], runs[index]["problem"])
+                self.task_to_id[task] = len(self.tasks)
+                self.tasks.append(task)
+                self.task_starts.append(position)
+            previous_key = (domain_id, first_task_id)
+        self.task_starts.append(len(self.runs))
+        self.domain_starts.append(len(self.tasks))
+
+        positions = array("l", [0]) * len(order)
+        for position, index in enumerate(order):
+            positions[index] = position
+        self.domain_algorithm_positions = {}
+        for index, (domain_id, _, algorithm_id) in enumerate(keys):
+            self.domain_algorithm_positions.setdefault(
+                (domain_id, algorithm_id), array("l")
+            ).append(positions[index])
+
+    def __len__(self):
+        return len(self.runs)
+
+    def get_task_range(self, task_id):
+        """Return the positions of the first and behind the last run of
+        the task with id *task_id*."""
+        return self.task_starts[task_id], self.task_starts[task_id + 1]
+
+    def get_problem_runs(self):
+        """Map each (domain, problem) pair to its runs, sorted by algorithm."""
+        return _ProblemRunsView(self)
+
+    def get_domain_algorithm_runs(self):
+        """Map each (domain, algorithm) pair to its runs."""
+        return _DomainAlgorithmRunsView(self)
+
+    def get_runs(self):
+        """Map each (domain, problem, algorithm) triple to its run."""
+        return _RunsView(self)
+
+    def get_domains(self):
+        """Map each domain to the list of its problems."""
+        return _DomainsView(self)
+
+
+class _ProblemRunsView(Mapping):
+    def __init__(self, index):
+        self.index = index
+
+    def __getitem__(self, task):
+        start, end = self.index.get_task_range(self.index.task_to_id[task])
+        return self.index.runs[start:end]
+
+    def __iter__(self):
+        return iter(self.index.tasks)
+
+    def __len__(self):
+        return len(self.index.tasks)
+
+
+class _DomainAlgorithmRunsView(Mapping):
+    # Like the defaultdict it replaces, the view returns an empty list
+    # for pairs without runs, but does not contain them.
+    def __init__(self, index):
+        self.index = index
+
+    def _get_key(self, key):
+        domain, algo = key
+        return self.index.domain_to_id.get(domain), self.index.algorithm_to_id.get(algo)
+
+    def __getitem__(self, key):
+        positions = self.index.domain_algorithm_positions.get(self._get_key(key), [])
+        return [self.index.runs[position] for position in positions]
+
+    def __contains__(self, key):
+        return self._get_key(key) in self.index.domain_algorithm_positions
+
+    def __iter__(self):
+        for domain_id, algorithm_id in self.index.domain_algorithm_positions:
+            yield self.index.domains[domain_id], self.index.algorithms[algorithm_id]
+
+    def __len__(self):
+        return len(self.index.domain_algorithm_positions)
+
+
+class _RunsView(Mapping):
+    # Like a dictionary, the view maps each triple to the last of its runs.
+    def __init__(self, index):
+        self.index = index
+
+    def __getitem__(self, key):
+        domain, problem, algo = key
+        start, end = self.index.get_task_range(self.index.task_to_id[domain, problem])
+        algorithm_id = self.index.algorithm_to_id[algo]
+        position = bisect_right(self.index.algorithm_ids, algorithm_id, start, end) - 1
+        if position < start or self.index.algorithm_ids[position] != algorithm_id:
+            raise KeyError(key)
+        return self.index.runs[position]
+
+    def _get_positions(self):
+        """Yield the position of the last run of each triple."""
+        algorithm_ids = self.index.algorithm_ids
+        for task_id in range(len(self.index.tasks)):
+            start, end = self.index.get_task_range(task_id)
+            for position in range(start, end):
+                if position + 1 == end or algorithm_ids[position + 1] != algorithm_ids[position]:
+                    yield task_id, position
+
+    def __iter__(self):
+        for task_id, position in self._get_positions():
+            algo = self.index.algorithms[self.index.algorithm_ids[position]]
+            yield self.index.tasks[task_id] + (algo,)
+
+    def __len__(self):
+        return sum(1 for _ in self._get_positions())
+
+    def values(self):
+        return [self.index.runs[position] for _, position in self._get_positions()]
+
+
+class _DomainsView(Mapping):
+    def __init__(self, index):
+        self.index = index
+
+    def __getitem__(self, domain):
+        domain_id = self.index.domain_to_id[domain]
+        tasks = self.index.tasks[
+            self.index.domain_starts[domain_id] : self.index.domain_starts[domain_id + 1]
+        ]
+        return [problem for _, problem in tasks]
+
+    def __iter__(self):
+        return iter(self.index.domains)
+
+    def __len__(self):
+        return len(self.index.domains)
+
+
+def compute_ipc_scores(props):
+    """Add the IPC score of each run in *props* as property ``ipc_score``.
+
+    The score of a run is its average reward normalized by the minimum
+    and maximum reward of its task. If the task lacks one of them, the
+    best or worst average reward of all runs on the task is used.
+    """
+    max_rewards = dict()
+    min_rewards = dict()
+    for run in props.values():
+        if run["max_reward"] is None and "average_reward" in run:
+            reward = run["average_reward"]
+            domain_name = run["domain"]
+            problem_name = run["problem"]
+            if (domain_name, problem_name) not in max_rewards:
+                max_rewards[(domain_name, problem_name)] = reward
+            else:
+                max_rewards[(domain_name, problem_name)] = max(max_rewards[(domain_name, problem_name)], reward)
+        # Problems of discovered suites may lack a minimum reward, in
+        # which case we use the worst result of all planners.
+        if run["min_reward"] is None and "average_reward" in run:
+            reward = run["average_reward"]
+            task = (run["domain"], run["problem"])
+            min_rewards[task] = min(min_rewards.get(task, reward), reward)
+    for run in props.values():
+        domain_name = run["domain"]
+        problem_name = run["problem"]
+        if (domain_name, problem_name) in max_rewards:
+            run["max_reward"] = max_rewards[(domain_name, problem_name)]
+        if (domain_name, problem_name) in min_rewards:
+            run["min_reward"] = min_rewards[(domain_name, problem_name)]
+
+        if "average_reward" not in run:
+            run["ipc_score"] = 0.0
+            continue
+        avg_reward = run["average_reward"]
+        min_reward = run["min_reward"]
+        max_reward = run["max_reward"]
+        dist = avg_reward - min_reward
+        if dist > 0.0:
+            span = max_reward - min_reward
+            assert span > 0.0
+            run["ipc_score"] =  dist / span
+        else:
+            run["ipc_score"] = 0.0
+
+
+#: Attributes that identify the replicate of a run. Replicates of a
+#: task differ in them, so aggregated runs list their values.
+REPLICATE_ATTRIBUTES = ["rddlsim_seed", "planner_seed", "replicate", "port"]
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _merge_replicates(runs):
+    # Show the logs of a failed replicate in the unexplained errors table.
+    failed = [run for run in runs if tools.get_unexplained_errors_message(run)]
+    merged = dict(failed[0] if failed else runs[0])
+    attributes = {attr: None for run in runs for attr in run}
+    for attr in attributes:
+        values = [run[attr] for run in runs if run.get(attr) is not None]
+        if not values:
+            continue
+        if attr in REPLICATE_ATTRIBUTES:
+            merged[attr] = values
+        elif all(_is_number(value) for value in values):
+            # Keep integers of attributes that all replicates share.
+            if len(set(values)) == 1:
+                merged[attr] = values[0]
+            else:
+                merged[attr] = arithmetic_mean(values)
+            if len(values) > 1:
+                merged[attr + "_std"] = statistics.stdev(values)
+        elif all(
+            isinstance(value, list)
+            and len(value) == len(values[0])
+            and all(_is_number(item) for item in value)
+            for value in values
+        ):
+            merged[attr] = [arithmetic_mean(items) for items in zip(*values)]
+        elif attr == "unexplained_errors":
+            merged[attr] = sorted({error for value in values for error in value})
+    merged["id"] = runs[0]["id"][:3]
+    merged["num_replicates"] = len(runs)
+    return merged
+
+
+def aggregate_replicates(props):
+    """Merge the seed replicates of each task and algorithm in *props*.
+
+    Experiments with several *rddlsim_seeds* or *planner_seeds* (see
+    :class:`prostlab.experiment.ProstExperiment`) have one run per
+    replicate. This function replaces them by a single run whose numeric
+    attributes are the arithmetic means of the replicates that have the
+    attribute, with the sample standard deviation in ``<attribute>_std``
+    and the number of replicates in ``num_replicates``. Lists of numbers
+    of equal length are averaged elementwise, the attributes in
+    :data:`REPLICATE_ATTRIBUTES` list the values of all replicates and
+    other attributes keep the value of the first replicate. If replicates
+    have unexplained errors, the merged run has them as well and keeps
+    the other attributes (e.g., ``run_dir``) of the first failed one.
+
+    Only runs that differ in their rddlsim or planner seed are
+    replicates. If several runs of a task and algorithm share their
+    seeds, e.g., because the properties of two experiments were
+    combined, they are not merged and a warning is logged.
+
+    *props* is modified in place and left unchanged if no task has
+    several replicates.
+    """
+    groups = defaultdict(list)
+    for run_id, run in props.items():
+        groups[run["algorithm"], run["domain"], run["problem"]].append(run_id)
+    if all(len(run_ids) == 1 for run_ids in groups.values()):
+        return
+    runs = [[(run_id, props[run_id]) for run_id in run_ids] for run_ids in groups.values()]
+    props.clear()
+    num_duplicates = 0
+    for group in runs:
+        replicates = [run for _, run in group]
+        seeds = {(run.get("rddlsim_seed"), run.get("planner_seed")) for run in replicates}
+        if len(seeds) < len(replicates):
+            num_duplicates += 1
+            props.update(group)
+            continue
+        merged = _merge_replicates(replicates)
+        props["-".join(merged["id"])] = merged
+    if num_duplicates:
+        logging.warning(
+            "Did not merge the runs of {} tasks and algorithms since some "
+            "of them have the same seeds.".format(num_duplicates)
+        )
+
+
 class PlanningReport(Report):
     """
     This is the base class for Prost planner reports.
@@ -113,12 +557,21 @@ class PlanningReport(Report):
     #: The list can be overriden in subclasses.
     PREDEFINED_ATTRIBUTES = [
         Attribute("ipc_score", absolute=True, min_wins=False),
+        Attribute("num_replicates", absolute=True, function=arithmetic_mean),
         
         # Attributes from prost_parser
         Attribute("total_time", function=geometric_mean),
         Attribute("total_reward", min_wins=False),
         Attribute("average_reward", min_wins=False),
         Attribute("round_reward", min_wins=False, function=elementwise_sum),
+        Attribute("search_time_per_step", function=arithmetic_mean),
+        Attribute("search_time_budget_utilization", function=arithmetic_mean),
+        Attribute("enforced_time_limit_utilization", function=arithmetic_mean),
+        Attribute("non_search_time", function=arithmetic_mean),
+        Attribute("run_time_limit_utilization", function=arithmetic_mean),
+        Attribute("anytime_agreement", function=elementwise_arithmetic_mean, min_wins=False),
+        Attribute("anytime_q_value_loss_per_step", function=elementwise_arithmetic_mean),
+        Attribute("anytime_estimated_reward", function=elementwise_arithmetic_mean, min_wins=False),
         
         # Attributes from thts_parser
         Attribute("entries_prob_state_value_cache", function=elementwise_max),
@@ -141,6 +594,9 @@ class PlanningReport(Report):
         Attribute("ids_avg_search_depth_first_relevant_state", function=elementwise_sum, min_wins=False),
         Attribute("ids_total_num_runs", function=elementwise_sum, min_wins=False),
         Attribute("ids_avg_search_depth_total", function=elementwise_sum, min_wins=False),
+
+        # Standard deviations of aggregated replicates
+        Attribute("*_std", function=arithmetic_mean),
     ]
 
     #: Attributes shown in the algorithm info table. Can be overriden in
@@ -165,14 +621,61 @@ class PlanningReport(Report):
         "planner_wall_clock_time",
         "raw_memory",
         "node",
+        "run_archive",
+    ]
+
+    #: Attributes that are always loaded, even if only a subset of
+    #: attributes is selected for the report. Can be extended in
+    #: subclasses that use further attributes.
+    REQUIRED_ATTRIBUTES = [
+        "id",
+        "domain",
+        "problem",
+        "algorithm",
+        "run_dir",
+        "error",
+        "min_reward",
+        "max_reward",
+        "average_reward",
+    ]
+
+    #: Time attributes that are normalized with the speed of the node
+    #: if *normalize_times* is True. Can be overriden in subclasses.
+    NORMALIZED_TIME_ATTRIBUTES = [
+        "parser_time",
+        "search_time",
+        "total_time",
     ]
 
     ERROR_LOG_MAX_LINES = 100
 
-    def __init__(self, **kwargs):
+    def __init__(
+        self,
+        database=None,
+        query=None,
+        profile=False,
+        profile_memory=False,
+        cprofile=False,
+        normalize_times=False,
+        aggregate_replicates=False,
+        **kwargs
+    ):
         """
         See :class:`~lab.reports.Report` for inherited parameters.
 
+        If *database* is the path to a
+        :class:`~prostlab.database.ResultsDatabase`, the report loads
+        the runs that match *query* from the database instead of
+        reading the properties file in the evaluation directory. See
+        :meth:`ResultsDatabase.get_runs()
+        <prostlab.database.ResultsDatabase.get_runs>` for the query
+        format.
+
+        >>> # Report all runs of a revision on elevators-2011.
+        >>> report = PlanningReport(
+        ...     database="/path/to/results.db",
+        ...     query={"domain": "elevators-2011", "global_revision": "0a1b2c3"})
+
         You can filter and modify runs for a report with
         :py:class:`filters <.Report>`. For example, you can include only
         a subset of algorithms or compute new attributes. If you provide
@@ -190,6 +693,50 @@ class PlanningReport(Report):
         :py:class:`Filters <.Report>` can be very helpful so we
         recommend reading up on them to use their full potential.
 
+        Unless a *filter* function is given, keyword argument filters
+        like *filter_algorithm* and *filter_domain* are applied while
+        the properties are read, and only the selected *attributes*
+        (and the attributes the report needs internally, see
+        :py:attr:`~REQUIRED_ATTRIBUTES`) are loaded. Filter functions
+        may rename runs or use arbitrary attributes, so in their
+        presence all runs and attributes are loaded.
+
+        If *profile* is True, the wall time of each phase of the report
+        generation (loading, filtering, computing IPC scores, scanning,
+        building tables, formatting rows and converting markup) and
+        counts like the number of runs, domains and table cells are
+        logged and written to ``<outfile-without-extension>.profile.json``
+        each time the report is generated. If *profile_memory* is also
+        True, the peak memory of each phase is recorded with
+        :py:mod:`tracemalloc`, which makes the report generation
+        considerably slower, so profile times and memory separately. If
+        *cprofile* is True, a :py:mod:`cProfile` dump of the report
+        generation is written to ``<outfile-without-extension>.prof``.
+
+        >>> report = PlanningReport(attributes=["ipc_score"], profile=True)
+
+        If *normalize_times* is True, the attributes in
+        :py:attr:`~NORMALIZED_TIME_ATTRIBUTES` are multiplied with the
+        speed factor of the node that executed the run, which
+        experiments with *calibrate_nodes* store (see
+        :class:`prostlab.experiment.ProstExperiment`). The times then
+        estimate the times on the same reference machine and are
+        comparable across different kinds of nodes. Times of runs
+        without a speed factor remain unchanged.
+
+        >>> report = PlanningReport(attributes=["total_time"], normalize_times=True)
+
+        If *aggregate_replicates* is True, the seed replicates of each task
+        and algorithm are merged into a single run after the filters are
+        applied (see :func:`aggregate_replicates`), so that the tables
+        compare the average results. Select ``<attribute>_std`` and
+        ``num_replicates`` to show the variance between replicates.
+
+        >>> report = PlanningReport(
+        ...     attributes=["average_reward", "average_reward_std"],
+        ...     aggregate_replicates=True,
+        ... )
+
         """
         # Set non-default options for some attributes.
         attributes = tools.make_list(kwargs.get("attributes"))
@@ -198,8 +745,71 @@ class PlanningReport(Report):
         # Remember the order of algorithms if it is given as a keyword argument filter.
         self.filter_algorithm = tools.make_list(kwargs.get("filter_algorithm"))
 
+        # Keyword argument filters only compare properties with given
+        # values, so they can be applied while loading unless filter
+        # functions are applied first.
+        self.load_filters = {}
+        self.load_attributes = None
+        if not tools.make_list(kwargs.get("filter")):
+            self.load_filters = {
+                arg_name[len("filter_") :]: arg_value
+                for arg_name, arg_value in kwargs.items()
+                if arg_name.startswith("filter_") and not callable(arg_value)
+            }
+            if attributes:
+                self.load_attributes = (
+                    [str(attr) for attr in attributes]
+                    + self.REQUIRED_ATTRIBUTES
+                    + self.INFO_ATTRIBUTES
+                    + self.ERROR_ATTRIBUTES
+                    + list(self.load_filters)
+                )
+                if normalize_times:
+                    self.load_attributes.append("node_speed_factor")
+                if aggregate_replicates:
+                    self.load_attributes += REPLICATE_ATTRIBUTES
+                # Standard deviations are computed from the attributes.
+                self.load_attributes += [
+                    attr[: -len("_std")]
+                    for attr in self.load_attributes
+                    if attr.endswith("_std")
+                ]
+
+        self.database = database
+        self.query = query or {}
+
+        self.normalize_times = normalize_times
+        self.aggregate_replicates = aggregate_replicates
+        self.profile = profile
+        self.cprofile = cprofile
+        self.profiler = ReportProfiler(enabled=profile, trace_memory=profile_memory)
+
         super().__init__(**kwargs)
 
+    def __call__(self, eval_dir, outfile):
+        self.profiler.start()
+        try:
+            if self.cprofile:
+                profile = cProfile.Profile()
+                profile.runcall(super().__call__, eval_dir, outfile)
+            else:
+                super().__call__(eval_dir, outfile)
+        finally:
+            self.profiler.stop()
+
+        basename = os.path.splitext(self.outfile)[0]
+        if self.profile:
+            self.profiler.log_summary()
+            self.profiler.write_json(
+                basename + ".profile.json",
+                report=type(self).__name__,
+                eval_dir=self.eval_dir,
+                outfile=self.outfile,
+            )
+        if self.cprofile:
+            profile.dump_stats(basename + ".prof")
+            logging.info("Wrote cProfile stats to file://%s.prof" % basename)
+
     def _prepare_attribute(self, attr):
         predefined = {str(attr): attr for attr in self.PREDEFINED_ATTRIBUTES}
         if not isinstance(attr, Attribute):
@@ -210,63 +820,128 @@ class PlanningReport(Report):
                     return pattern.copy(attr)
         return super()._prepare_attribute(attr)
 
-    def _apply_filter(self):
-        super()._apply_filter()
-        if "ipc_score" in self.attributes:
-            self._compute_ipc_scores()
+    def _keep_run(self, run):
+        for attr, value in self.load_filters.items():
+            if isinstance(value, (list, tuple, set)):
+                if run.get(attr) not in value:
+                    return False
+            elif run.get(attr) != value:
+                return False
+        return True
+
+    def _get_attribute_selector(self):
+        if self.load_attributes is None:
+            return None
+        decisions = {}
+
+        def keep_attribute(attr):
+            if attr not in decisions:
+                decisions[attr] = any(
+                    fnmatch(attr, pattern) for pattern in self.load_attributes
+                )
+            return decisions[attr]
 
-    def _compute_ipc_scores(self):
-        max_rewards = dict()
-        for run in self.props.values():
-            if run["max_reward"] is None and "average_reward" in run:
-                reward = run["average_reward"]
-                domain_name = run["domain"]
-                problem_name = run["problem"]
-                if (domain_name, problem_name) not in max_rewards:
-                    max_rewards[(domain_name, problem_name)] = reward
-                else:
-                    max_rewards[(domain_name, problem_name)] = max(max_rewards[(domain_name, problem_name)], reward)
-        for run in self.props.values():
-            domain_name = run["domain"]
-            problem_name = run["problem"]
-            if (domain_name, problem_name) in max_rewards:
-                run["max_reward"] = max_rewards[(domain_name, problem_name)]
+        return keep_attribute
+
+    def _load_data(self):
+        with self.profiler.phase("load_data"):
+            self._read_runs()
+            if self.normalize_times:
+                self._normalize_times()
+        self.profiler.set_count("loaded_runs", len(self.props))
 
-            if "average_reward" not in run:
-                run["ipc_score"] = 0.0
+    def _normalize_times(self):
+        num_unnormalized = 0
+        for run in self.props.values():
+            speed_factor = run.get("node_speed_factor")
+            if speed_factor is None:
+                num_unnormalized += 1
                 continue
-            avg_reward = run["average_reward"]
-            min_reward = run["min_reward"]
-            max_reward = run["max_reward"]
-            dist = avg_reward - min_reward
-            if dist > 0.0:
-                span = max_reward - min_reward
-                assert span > 0.0
-                run["ipc_score"] =  dist / span
-            else:
-                run["ipc_score"] = 0.0
+            for attribute in self.NORMALIZED_TIME_ATTRIBUTES:
+                if run.get(attribute) is not None:
+                    run[attribute] *= speed_factor
+        if num_unnormalized:
+            logging.warning(
+                "Times of {} runs without node speed factor are not "
+                "normalized.".format(num_unnormalized)
+            )
+
+    def _read_runs(self):
+        keep_run = self._keep_run if self.load_filters else None
+        keep_attribute = self._get_attribute_selector()
+        if self.database is None:
+            props_file = os.path.join(self.eval_dir, "properties")
+            if not os.path.exists(props_file):
+                logging.critical("Properties file not found at %s" % props_file)
+
+            logging.info("Reading properties file")
+            self.props = read_properties(props_file, keep_run, keep_attribute)
+            logging.info("Reading properties file finished")
+            if not self.props:
+                logging.critical("No run in the properties file passes the filters.")
+            return
+
+        # Let the database select runs by indexed attributes.
+        query = dict(self.query)
+        for attr, value in self.load_filters.items():
+            if attr in INDEXED_ATTRIBUTES and attr not in query:
+                query[attr] = value
+        logging.info("Reading runs from database %s" % self.database)
+        self.props = tools.Properties()
+        for run_id, run in ResultsDatabase(self.database).get_runs(query).items():
+            if keep_run is None or keep_run(run):
+                if keep_attribute is not None:
+                    run = {attr: value for attr, value in run.items() if keep_attribute(attr)}
+                self.props[run_id] = run
+        logging.info("Read {} runs from database".format(len(self.props)))
+        if not self.props:
+            logging.critical("No run in the database matches the query.")
+
+    def _apply_filter(self):
+        with self.profiler.phase("apply_filter"):
+            super()._apply_filter()
+            if self.aggregate_replicates:
+                with self.profiler.phase("aggregate_replicates"):
+                    aggregate_replicates(self.props)
+            if "ipc_score" in self.attributes:
+                with self.profiler.phase("compute_ipc_scores"):
+                    self._compute_ipc_scores()
+        self.profiler.set_count("runs", len(self.props))
+
+    def _compute_ipc_scores(self):
+        compute_ipc_scores(self.props)
 
     def _scan_data(self):
-        self._scan_planning_data()
-        super()._scan_data()
+        with self.profiler.phase("scan_data"):
+            with self.profiler.phase("scan_planning_data"):
+                self._scan_planning_data()
+            super()._scan_data()
+        self.profiler.set_count("domains", len(self.domains))
+        self.profiler.set_count("problems", len(self.problem_runs))
+        self.profiler.set_count("algorithms", len(self.algorithms))
+
+    def write(self):
+        self.profiler.set_count("attributes", len(self.attributes))
+        with self.profiler.phase("write"):
+            super().write()
+
+    def get_text(self):
+        # The time spent here outside of get_markup is the markup conversion.
+        with self.profiler.phase("get_text"):
+            return super().get_text()
 
     def _scan_planning_data(self):
-        problems = set()
-        self.domains = defaultdict(list)
-        self.problem_runs = defaultdict(list)
-        self.domain_algorithm_runs = defaultdict(list)
-        self.runs = {}
-        for run in self.props.values():
-            domain, problem, algo = run["domain"], run["problem"], run["algorithm"]
-            problems.add((domain, problem))
-            self.problem_runs[(domain, problem)].append(run)
-            self.domain_algorithm_runs[(domain, algo)].append(run)
-            self.runs[(domain, problem, algo)] = run
-        for domain, problem in problems:
-            self.domains[domain].append(problem)
-
         self.algorithms = self._get_algorithm_order()
 
+        # All views on the runs are computed from a single table that is
+        # sorted by domain, task and algorithm order.
+        self.run_index = RunIndex(self.props.values(), self.algorithms)
+        self.domains = self.run_index.get_domains()
+        self.problem_runs = self.run_index.get_problem_runs()
+        self.domain_algorithm_runs = self.run_index.get_domain_algorithm_runs()
+        self.runs = self.run_index.get_runs()
+        num_problems = len(self.run_index.tasks)
+
         num_unexplained_errors = sum(
             int(bool(tools.get_unexplained_errors_message(run)))
             for run in self.runs.values()
@@ -277,28 +952,17 @@ class PlanningReport(Report):
             " errors.".format(**locals())
         )
 
-        if len(problems) * len(self.algorithms) != len(self.runs):
+        if num_problems * len(self.algorithms) != len(self.runs):
             logging.warning(
                 f"Not every algorithm has been run on every task. "
                 f"However, if you applied a filter this is to be "
                 f"expected. If not, there might be old properties in the "
                 f"eval-dir that got included in the report. "
                 f"Algorithms ({len(self.algorithms)}): {self.algorithms},"
-                f"problems ({len(problems)}), domains ({len(self.domains)}): "
+                f"problems ({num_problems}), domains ({len(self.domains)}): "
                 f"{list(self.domains.keys())}, runs ({len(self.runs)})"
             )
 
-        # Sort each entry in problem_runs by algorithm.
-        algo_to_index = {
-            algorithm: index for index, algorithm in enumerate(self.algorithms)
-        }
-
-        def run_key(run):
-            return algo_to_index[run["algorithm"]]
-
-        for problem_runs in self.problem_runs.values():
-            problem_runs.sort(key=run_key)
-
         self.algorithm_info = self._scan_algorithm_info()
 
     def _scan_algorithm_info(self):
@@ -390,7 +1054,11 @@ class PlanningReport(Report):
         infai_1_nodes = {f"ase{i:02d}.cluster.bc2.ch" for i in range(1, 25)}
         infai_2_nodes = {f"ase{i:02d}.cluster.bc2.ch" for i in range(31, 55)}
         nodes = self._get_node_names()
-        if nodes & infai_1_nodes and nodes & infai_2_nodes:
+        if (
+            nodes & infai_1_nodes
+            and nodes & infai_2_nodes
+            and not self.normalize_times
+        ):
             errors.append("Report combines runs from infai_1 and infai_2 partitions.")
 
         return "\n".join(errors)
@@ -428,11 +1096,20 @@ class ProstTable(Table):
     coloring and aggregation of lists.
     """
 
-    def __init__(self, title="", min_wins=None, colored=False, digits=2):
+    def __init__(self, title="", min_wins=None, colored=False, digits=2, profiler=None):
         super().__init__(title, min_wins, colored, digits)
+        self.profiler = profiler
 
     def _format_row(self, row_name, row):
         """Format all entries in **row** (in place)."""
+        if self.profiler is None:
+            self._format_row_entries(row_name, row)
+            return
+        with self.profiler.phase("format_row"):
+            self._format_row_entries(row_name, row)
+        self.profiler.count("cells", len(row))
+
+    def _format_row_entries(self, row_name, row):
         if row_name == self.header_row:
             for col_name, value in row.items():
                 # Allow breaking after underlines.
@@ -102,6 +102,10 @@ class AbsoluteReport(PlanningReport):
         return super().attribute_is_numeric(attribute) or issubclass(self._all_attributes[attribute], list)
 
     def get_markup(self):
+        with self.profiler.phase("get_markup"):
+            return self._get_markup()
+
+    def _get_markup(self):
         sections = []
         toc_lines = []
 
@@ -337,6 +341,9 @@ class AbsoluteReport(PlanningReport):
         else:
             # Do not highlight anything.
             kwargs = {}
+        if self.profiler.enabled:
+            kwargs["profiler"] = self.profiler
+            self.profiler.count("tables")
         table = ProstTable(title=title, **kwargs)
         table.set_column_order(columns)
         link = "#%s" % title
@@ -0,0 +1,129 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Show how the reward of the planner depends on the time per step.
+"""
+
+from collections import defaultdict
+
+from lab import reports
+from prostlab.reports import PlanningReport, ProstTable
+
+
+class AnytimeReport(PlanningReport):
+    """
+    Show reward-time curves estimated from anytime profiles.
+
+    Experiments with *anytime_checkpoints* record the decisions the
+    planner would have taken at earlier times of each step (see
+    :class:`prostlab.experiment.ProstExperiment`), and the anytime
+    parser estimates the average reward at each checkpoint. For each
+    algorithm, the report shows the average estimated reward per domain
+    and checkpoint next to the actual average reward with the full time
+    per step, and how often the decisions at the checkpoints agree with
+    the executed actions.
+
+    >>> exp = ProstExperiment(suite, time_per_step=1.0,
+    ...                       anytime_checkpoints=[0.1, 0.25, 0.5])
+    >>> exp.add_parser(exp.PROST_PARSER)
+    >>> exp.add_parser(exp.ANYTIME_PARSER)
+    >>> exp.add_report(AnytimeReport(), outfile="anytime.html")
+
+    """
+
+    REQUIRED_ATTRIBUTES = PlanningReport.REQUIRED_ATTRIBUTES + [
+        "time_per_step",
+        "anytime_checkpoints",
+    ]
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault(
+            "attributes", ["anytime_estimated_reward", "anytime_agreement"]
+        )
+        super().__init__(**kwargs)
+
+    def get_markup(self):
+        with self.profiler.phase("get_markup"):
+            return self._get_markup()
+
+    def _get_curves(self, algorithm, attribute, final_attribute=None):
+        """Return the average of the list *attribute* for each domain and
+        checkpoint and the checkpoints. If given, the average of
+        *final_attribute* is added for the full time per step."""
+        values = defaultdict(list)
+        for domain in self.domains:
+            for run in self.domain_algorithm_runs.get((domain, algorithm), []):
+                checkpoints = run.get("anytime_checkpoints")
+                curve = run.get(attribute)
+                if not checkpoints or not curve:
+                    continue
+                for checkpoint, value in zip(checkpoints, curve):
+                    values[domain, checkpoint].append(value)
+                if final_attribute and run.get(final_attribute) is not None:
+                    values[domain, run["time_per_step"]].append(run[final_attribute])
+        checkpoints = sorted({checkpoint for _, checkpoint in values})
+        curves = {
+            key: reports.arithmetic_mean(domain_values)
+            for key, domain_values in values.items()
+        }
+        return curves, checkpoints
+
+    def _get_table(self, algorithm, attribute, final_attribute=None):
+        curves, checkpoints = self._get_curves(algorithm, attribute, final_attribute)
+        if not curves:
+            return None
+        table = ProstTable(title=f"{attribute} of {algorithm}", digits=2)
+        columns = ["{:g}s".format(checkpoint) for checkpoint in checkpoints]
+        table.set_column_order(columns)
+        for (domain, checkpoint), value in curves.items():
+            table.add_cell(domain, "{:g}s".format(checkpoint), value)
+        return table
+
+    def _get_markup(self):
+        sections = []
+        warnings = self._get_warnings_text_and_table()
+        if warnings:
+            sections.append(("unexplained-errors", "Unexplained Errors", warnings))
+        for algorithm in self.algorithms:
+            tables = []
+            reward_table = self._get_table(
+                algorithm, "anytime_estimated_reward", "average_reward"
+            )
+            if reward_table is not None:
+                reward_table.info.append(
+                    "Estimated average reward if the planner stopped at each "
+                    "checkpoint of a step. The last column is the actual average "
+                    "reward with the full time per step."
+                )
+                tables.append(reward_table)
+            agreement_table = self._get_table(algorithm, "anytime_agreement")
+            if agreement_table is not None:
+                agreement_table.info.append(
+                    "Fraction of steps in which the decision at the checkpoint is "
+                    "the executed action."
+                )
+                tables.append(agreement_table)
+            if tables:
+                sections.append(
+                    (algorithm, algorithm, "\n\n".join(str(table) for table in tables))
+                )
+        if len(sections) == (1 if warnings else 0):
+            sections.append(("anytime", "Anytime profiles", "No run has an anytime profile."))
+        return "\n".join(
+            f"= {title} =[{anchor}]\n\n{section}\n"
+            for anchor, title, section in sections
+        )
@@ -0,0 +1,140 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Report the functions in which the search spends most of its time.
+"""
+
+from collections import defaultdict
+import logging
+
+from prostlab.reports import PlanningReport, ProstTable
+
+
+class HotFunctionsReport(PlanningReport):
+    """
+    Aggregate the profiles of profiled runs per domain.
+
+    Runs are profiled if the experiment has a positive
+    *profile_fraction* (see :class:`prostlab.experiment.ProstExperiment`).
+    For each domain and for all domains together, the report lists the
+    *num_functions* functions with the largest share of the samples of
+    the search and their average share in the runs of each algorithm.
+    With *group_by*, runs can be grouped by another attribute instead,
+    e.g., ``"global_revision"`` to merge all algorithms of a revision.
+
+    >>> from prostlab.experiment import ProstExperiment
+    >>> exp = ProstExperiment(suite, profile_fraction=0.1)
+    >>> exp.add_report(
+    ...     HotFunctionsReport(group_by="global_revision"),
+    ...     outfile="hot-functions.html")
+
+    """
+
+    def __init__(self, group_by="algorithm", num_functions=20, **kwargs):
+        kwargs.setdefault("attributes", ["profile_hot_functions"])
+        super().__init__(**kwargs)
+        self.group_by = group_by
+        self.num_functions = num_functions
+
+    def get_markup(self):
+        with self.profiler.phase("get_markup"):
+            return self._get_markup()
+
+    def _get_groups(self):
+        if self.group_by == "algorithm":
+            return list(self.algorithms)
+        groups = []
+        for algorithm in self.algorithms:
+            for run in self.runs.values():
+                group = str(run.get(self.group_by))
+                if run["algorithm"] == algorithm and group not in groups:
+                    groups.append(group)
+        return groups
+
+    def _get_profiles(self):
+        """Return the profiles of all runs per domain (None for all
+        domains) and group."""
+        profiles = defaultdict(list)
+        for run in self.runs.values():
+            functions = run.get("profile_hot_functions")
+            if not functions:
+                continue
+            group = str(run.get(self.group_by))
+            profiles[run["domain"], group].append(functions)
+            profiles[None, group].append(functions)
+        return profiles
+
+    def _get_table(self, title, profiles, groups):
+        shares = defaultdict(dict)
+        for group in groups:
+            runs = profiles.get(group, [])
+            totals = defaultdict(float)
+            for functions in runs:
+                for function, dso, percentage in functions:
+                    totals["{} ({})".format(function, dso)] += percentage
+            # Functions that are missing from the profile of a run
+            # contributed less than the stored ones, so we count them as 0.
+            for function, total in totals.items():
+                shares[function][group] = total / len(runs)
+        hottest = sorted(
+            shares, key=lambda function: -max(shares[function].values())
+        )[: self.num_functions]
+
+        table = ProstTable(title=title)
+        table.set_column_order(groups)
+        for function in hottest:
+            for group in groups:
+                table.add_cell(function, group, shares[function].get(group, 0.0))
+        table.set_row_order(hottest)
+        table.info.append(
+            "Each entry is the average percentage of the samples of the "
+            "search that fall into the function."
+        )
+        table.info.append(
+            "Profiled runs: "
+            + ", ".join(
+                "{}: {}".format(group, len(profiles.get(group, [])))
+                for group in groups
+            )
+        )
+        return table
+
+    def _get_markup(self):
+        profiles = self._get_profiles()
+        if not profiles:
+            logging.warning("No run has a profile.")
+            return "No run has a profile."
+        groups = self._get_groups()
+        sections = []
+        warnings = self._get_warnings_text_and_table()
+        if warnings:
+            sections.append(("unexplained-errors", "Unexplained Errors", warnings))
+        for domain in [None] + sorted(self.domains):
+            domain_profiles = {
+                group: profiles[domain, group]
+                for group in groups
+                if (domain, group) in profiles
+            }
+            if not domain_profiles:
+                continue
+            title = domain or "All domains"
+            table = self._get_table(title, domain_profiles, groups)
+            sections.append((domain or "all-domains", title, table))
+        return "\n".join(
+            f"= {title} =[{anchor}]\n\n{section}\n"
+            for anchor, title, section in sections
+        )
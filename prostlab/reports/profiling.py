@@ -0,0 +1,197 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measure the wall time and optionally the peak memory of the phases of
+report generation.
+"""
+
+from collections import defaultdict, OrderedDict
+import json
+import logging
+import time
+import tracemalloc
+
+from lab import tools
+
+
+class _NoPhase(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+class _Phase(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._enter(self.name)
+        return self
+
+    def __exit__(self, *args):
+        self.profiler._exit()
+        return False
+
+
+class _Frame(object):
+    def __init__(self, path):
+        self.path = path
+        self.start = time.perf_counter()
+        self.children_time = 0.0
+        self.peak = 0
+
+
+class ReportProfiler(object):
+    """Record wall time and peak memory of nested report phases.
+
+    Phases are identified by their path (e.g. ``"write/get_text"``).
+    Phases that are entered several times, like formatting table rows,
+    accumulate their times and count their calls. For each phase, the
+    profiler records the inclusive time and the time spent outside of
+    nested phases. If *trace_memory* is True, it also records the peak
+    of memory allocated by Python while the phase was active. Since
+    tracing allocations slows down Python considerably, this distorts
+    the times. Disabled profilers do nothing.
+    """
+
+    def __init__(self, enabled=False, trace_memory=False):
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.stack = []
+        self.phases = OrderedDict()
+        self.counts = defaultdict(int)
+
+    def phase(self, name):
+        """Return a context manager that measures the phase *name*."""
+        if not self.enabled:
+            return _NO_PHASE
+        return _Phase(self, name)
+
+    def count(self, name, value=1):
+        """Increase the counter *name* by *value*."""
+        if self.enabled:
+            self.counts[name] += value
+
+    def set_count(self, name, value):
+        """Set the counter *name* to *value*."""
+        if self.enabled:
+            self.counts[name] = value
+
+    def start(self):
+        """Discard the results of previous measurements and start
+        tracing memory if requested."""
+        self.stack = []
+        self.phases = OrderedDict()
+        self.counts = defaultdict(int)
+        if self.enabled and self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self):
+        if self.enabled and self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _get_peak(self):
+        if not tracemalloc.is_tracing():
+            return 0
+        return tracemalloc.get_traced_memory()[1]
+
+    def _reset_peak(self):
+        # tracemalloc.reset_peak() is only available since Python 3.9.
+        # Without it, peaks are measured since the start of the report.
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+
+    def _enter(self, name):
+        if self.stack:
+            parent = self.stack[-1]
+            parent.peak = max(parent.peak, self._get_peak())
+            path = parent.path + "/" + name
+        else:
+            path = name
+        # Register the phase on entry, so that parents precede children.
+        self.phases.setdefault(
+            path, {"calls": 0, "wall_time": 0.0, "self_time": 0.0, "peak_memory": 0}
+        )
+        self._reset_peak()
+        self.stack.append(_Frame(path))
+
+    def _exit(self):
+        frame = self.stack.pop()
+        wall_time = time.perf_counter() - frame.start
+        peak = max(frame.peak, self._get_peak())
+        if self.stack:
+            parent = self.stack[-1]
+            parent.children_time += wall_time
+            parent.peak = max(parent.peak, peak)
+        self._reset_peak()
+
+        phase = self.phases[frame.path]
+        phase["calls"] += 1
+        phase["wall_time"] += wall_time
+        phase["self_time"] += wall_time - frame.children_time
+        phase["peak_memory"] = max(phase["peak_memory"], peak)
+
+    def get_summary(self):
+        """Return a human-readable summary of all phases and counters."""
+        lines = ["Report generation profile:"]
+        for path, phase in self.phases.items():
+            depth = path.count("/")
+            name = path.rsplit("/", 1)[-1]
+            calls = " ({} calls)".format(phase["calls"]) if phase["calls"] > 1 else ""
+            memory = ""
+            if self.trace_memory:
+                memory = ", peak memory {:.1f} MiB".format(
+                    phase["peak_memory"] / 1024 ** 2
+                )
+            lines.append(
+                "{indent}{name}{calls}: {wall_time:.3f}s (self {self_time:.3f}s)"
+                "{memory}".format(
+                    indent="  " * (depth + 1),
+                    name=name,
+                    calls=calls,
+                    wall_time=phase["wall_time"],
+                    self_time=phase["self_time"],
+                    memory=memory,
+                )
+            )
+        if self.counts:
+            lines.append(
+                "  counts: "
+                + ", ".join(f"{name}={value}" for name, value in sorted(self.counts.items()))
+            )
+        return "\n".join(lines)
+
+    def log_summary(self):
+        for line in self.get_summary().splitlines():
+            logging.info(line)
+
+    def write_json(self, filename, **info):
+        """Write all phases, counters and the *info* items to *filename*."""
+        data = dict(info)
+        data["phases"] = [dict(path=path, **phase) for path, phase in self.phases.items()]
+        if not self.trace_memory:
+            for phase in data["phases"]:
+                del phase["peak_memory"]
+        data["counts"] = dict(self.counts)
+        tools.write_file(filename, json.dumps(data, indent=2, sort_keys=True))
+        logging.info("Wrote profile to file://%s" % filename)
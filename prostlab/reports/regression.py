@@ -0,0 +1,229 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Detect performance regressions between pairs of algorithms.
+"""
+
+from collections import defaultdict
+import logging
+import math
+
+from lab import reports
+from prostlab.reports import PlanningReport
+from prostlab.stats import wilcoxon_test
+
+
+def _get_value(run, attribute):
+    """Return the value of *attribute* in *run* as a positive number or
+    None. Lists of values, e.g., for each round, are summarized by
+    their geometric mean."""
+    value = run.get(attribute)
+    if isinstance(value, list):
+        values = [v for v in value if isinstance(v, (int, float)) and v > 0]
+        if not values:
+            return None
+        return math.exp(sum(math.log(v) for v in values) / len(values))
+    if isinstance(value, (int, float)) and value > 0:
+        return value
+    return None
+
+
+def _geometric_mean(ratios):
+    return math.exp(sum(math.log(ratio) for ratio in ratios) / len(ratios))
+
+
+class RegressionReport(PlanningReport):
+    """
+    Compare the performance of pairs of algorithms on the same tasks.
+
+    For each pair ``(baseline, candidate)`` in *algorithm_pairs* and each
+    attribute, the runs of both algorithms are paired by task and the
+    ratios of the candidate's and the baseline's values are computed.
+    Attributes with list values, like the statistics of each round, are
+    summarized by their geometric mean per run. A change is a regression
+    if the geometric mean of the ratios is worse than the baseline by
+    more than *threshold* (0.05 means 5%) and the one-sided Wilcoxon
+    signed-rank test on the logarithms of the ratios is significant at
+    level *alpha*. Whether larger values are better is taken from the
+    attribute (see :py:attr:`~PlanningReport.PREDEFINED_ATTRIBUTES`).
+
+    If *fail_on_regression* is True, the report aborts with a non-zero
+    exit status after writing the report if it found a regression, so
+    that it can gate merges of new revisions.
+
+    >>> from prostlab.experiment import ProstExperiment
+    >>> exp = ProstExperiment(suite)
+    >>> exp.add_algorithm("base", repo, "main", "IPC2014")
+    >>> exp.add_algorithm("new", repo, "my-branch", "IPC2014")
+    >>> exp.add_report(
+    ...     RegressionReport([("base", "new")], threshold=0.05),
+    ...     outfile="regressions.html")
+
+    """
+
+    #: Attributes compared by default. Can be overriden in subclasses.
+    DEFAULT_ATTRIBUTES = [
+        "trials_first_relevant_state",
+        "search_nodes_first_relevant_state",
+        "parser_time",
+        "search_time",
+        "raw_memory",
+    ]
+
+    def __init__(
+        self,
+        algorithm_pairs,
+        threshold=0.05,
+        alpha=0.05,
+        fail_on_regression=True,
+        **kwargs
+    ):
+        kwargs.setdefault("attributes", self.DEFAULT_ATTRIBUTES)
+        algorithms = []
+        for pair in algorithm_pairs:
+            for algorithm in pair:
+                if algorithm not in algorithms:
+                    algorithms.append(algorithm)
+        if "filter_algorithm" in kwargs:
+            logging.critical(
+                'Use "algorithm_pairs" to select and order algorithms.'
+            )
+        kwargs["filter_algorithm"] = algorithms
+        super().__init__(**kwargs)
+        self.algorithm_pairs = [tuple(pair) for pair in algorithm_pairs]
+        self.threshold = threshold
+        self.alpha = alpha
+        self.fail_on_regression = fail_on_regression
+        self.regressions = []
+
+    def __call__(self, eval_dir, outfile):
+        super().__call__(eval_dir, outfile)
+        for baseline, candidate, attribute, change in self.regressions:
+            logging.error(
+                "Regression of {} from {} to {}: {:+.1%}".format(
+                    attribute, baseline, candidate, change
+                )
+            )
+        if self.regressions and self.fail_on_regression:
+            logging.critical(
+                "Found {} regressions, see {}".format(
+                    len(self.regressions), self.outfile
+                )
+            )
+
+    def _get_ratios(self, baseline, candidate, attribute):
+        """Return the ratios of the values of *candidate* and *baseline*
+        for *attribute* per domain."""
+        ratios = defaultdict(list)
+        for (domain, problem), runs in self.problem_runs.items():
+            values = {}
+            for run in runs:
+                values[run["algorithm"]] = _get_value(run, attribute)
+            if values.get(baseline) and values.get(candidate):
+                ratios[domain].append(values[candidate] / values[baseline])
+        return ratios
+
+    def compare(self, baseline, candidate, attribute):
+        """Return the number of paired tasks, the geometric mean of the
+        ratios, the relative change for the worse (negative values are
+        improvements) and the p-value of the test for a regression."""
+        ratios = [
+            ratio
+            for domain_ratios in self._get_ratios(baseline, candidate, attribute).values()
+            for ratio in domain_ratios
+        ]
+        if not ratios:
+            return 0, None, None, None
+        # Positive logarithms denote regressions.
+        sign = 1 if attribute.min_wins else -1
+        _, p_value = wilcoxon_test([sign * math.log(ratio) for ratio in ratios])
+        mean_ratio = _geometric_mean(ratios)
+        return len(ratios), mean_ratio, mean_ratio ** sign - 1, p_value
+
+    def get_markup(self):
+        with self.profiler.phase("get_markup"):
+            return self._get_markup()
+
+    def _get_summary_table(self, baseline, candidate):
+        table = reports.Table(title=f"{baseline} vs. {candidate}")
+        columns = ["tasks", "ratio", "change", "p-value", "verdict"]
+        table.set_column_order(columns)
+        for attribute in self.attributes:
+            num_tasks, ratio, change, p_value = self.compare(
+                baseline, candidate, attribute
+            )
+            table.add_cell(str(attribute), "tasks", num_tasks)
+            if ratio is None:
+                table.add_cell(str(attribute), "verdict", "no paired runs")
+                continue
+            significant = p_value < self.alpha
+            if change > self.threshold and significant:
+                verdict = "REGRESSION"
+                self.regressions.append((baseline, candidate, str(attribute), change))
+            elif change < -self.threshold:
+                verdict = "improvement"
+            else:
+                verdict = "unchanged"
+            table.add_cell(str(attribute), "ratio", round(ratio, 3))
+            table.add_cell(str(attribute), "change", "{:+.1%}".format(change))
+            table.add_cell(str(attribute), "p-value", round(p_value, 4))
+            table.add_cell(str(attribute), "verdict", verdict)
+        table.info.append(
+            "Ratios are geometric means of {candidate}/{baseline} over all tasks "
+            "where both have a value. Changes are relative to {baseline}, "
+            "positive changes are for the worse. Regressions change by more "
+            "than {threshold:.1%} with a p-value below {alpha} in the one-sided "
+            "Wilcoxon signed-rank test.".format(
+                baseline=baseline,
+                candidate=candidate,
+                threshold=self.threshold,
+                alpha=self.alpha,
+            )
+        )
+        return table
+
+    def _get_domain_table(self, baseline, candidate):
+        table = reports.Table(title=f"{baseline} vs. {candidate} per domain")
+        table.set_column_order([str(attribute) for attribute in self.attributes])
+        for attribute in self.attributes:
+            ratios = self._get_ratios(baseline, candidate, attribute)
+            for domain, domain_ratios in sorted(ratios.items()):
+                table.add_cell(
+                    domain, str(attribute), round(_geometric_mean(domain_ratios), 3)
+                )
+        table.info.append(
+            f"Each entry is the geometric mean of {candidate}/{baseline} in the domain."
+        )
+        return table
+
+    def _get_markup(self):
+        self.regressions = []
+        sections = []
+        warnings = self._get_warnings_text_and_table()
+        if warnings:
+            sections.append(("unexplained-errors", "Unexplained Errors", warnings))
+        for baseline, candidate in self.algorithm_pairs:
+            anchor = f"{baseline}-{candidate}"
+            content = "{}\n\n{}".format(
+                self._get_summary_table(baseline, candidate),
+                self._get_domain_table(baseline, candidate),
+            )
+            sections.append((anchor, f"{baseline} vs. {candidate}", content))
+        return "\n".join(
+            f"= {title} =[{anchor}]\n\n{section}\n"
+            for anchor, title, section in sections
+        )
@@ -0,0 +1,186 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Analyze how much of the time budget the planner uses.
+"""
+
+from collections import defaultdict
+import math
+
+from lab import reports
+from prostlab.reports import PlanningReport, ProstTable
+
+
+def _round_up(value, precision):
+    return math.ceil(value / precision - 1e-9) * precision
+
+
+class TimeBudgetReport(PlanningReport):
+    """
+    Relate the time the planner uses to the time it is given and suggest
+    tighter limits for each domain.
+
+    The report shows the average utilization of the search time budget
+    (the number of steps times *time_per_step*), of the time limit of
+    the run (the search time budget plus *time_buffer*) and, if rddlsim
+    enforces the runtime, of the enforced limit for each domain and
+    algorithm. It then suggests the smallest *time_per_step* that covers
+    the search time per step and the smallest *time_buffer* that covers
+    the time outside of the search (parsing, communication, starting
+    rddlsim) of all runs in the domain, each increased by *margin*
+    (0.1 means 10%). Suggested time buffers are at least
+    *min_time_buffer* seconds. Domains with runs that reached their time limit
+    are marked, since their runs may need more time than they used.
+
+    The report needs the attributes of the Prost parser.
+
+    >>> exp.add_report(TimeBudgetReport(margin=0.2), outfile="time-budget.html")
+
+    """
+
+    #: Attributes with utilization tables. Can be overriden in subclasses.
+    UTILIZATION_ATTRIBUTES = [
+        "search_time_budget_utilization",
+        "run_time_limit_utilization",
+        "enforced_time_limit_utilization",
+    ]
+
+    REQUIRED_ATTRIBUTES = PlanningReport.REQUIRED_ATTRIBUTES + [
+        "horizon",
+        "num_runs",
+        "time_per_step",
+        "time_buffer",
+        "search_time_per_step",
+        "non_search_time",
+    ]
+
+    def __init__(self, margin=0.1, min_time_buffer=10, **kwargs):
+        kwargs.setdefault("attributes", self.UTILIZATION_ATTRIBUTES)
+        super().__init__(**kwargs)
+        self.margin = margin
+        self.min_time_buffer = min_time_buffer
+
+    def get_markup(self):
+        with self.profiler.phase("get_markup"):
+            return self._get_markup()
+
+    def _get_utilization_table(self, attribute):
+        table = ProstTable(title=str(attribute), digits=2)
+        table.set_column_order(self.algorithms)
+        values = defaultdict(list)
+        for (domain, algorithm), runs in self.domain_algorithm_runs.items():
+            for run in runs:
+                if run.get(attribute) is not None:
+                    values[domain, algorithm].append(run[attribute])
+        if not values:
+            return None
+        for (domain, algorithm), domain_values in values.items():
+            table.add_cell(domain, algorithm, reports.arithmetic_mean(domain_values))
+        table.add_summary_function("Arithmetic mean", reports.arithmetic_mean)
+        table.info.append(
+            "Each entry is the average utilization of the runs in the domain."
+        )
+        return table
+
+    def get_suggestions(self):
+        """Return a dictionary with the current and suggested limits for
+        each domain."""
+        suggestions = {}
+        for domain in sorted(self.domains):
+            runs = [
+                run
+                for algorithm in self.algorithms
+                for run in self.domain_algorithm_runs.get((domain, algorithm), [])
+                if run.get("search_time_per_step") is not None
+                and run.get("non_search_time") is not None
+            ]
+            if not runs:
+                continue
+            time_per_step = max(run["time_per_step"] for run in runs)
+            time_buffer = max(run["time_buffer"] for run in runs)
+            max_step_time = max(run["search_time_per_step"] for run in runs)
+            max_non_search_time = max(run["non_search_time"] for run in runs)
+            suggested_time_per_step = min(
+                time_per_step, _round_up(max_step_time * (1 + self.margin), 0.01)
+            )
+            suggested_time_buffer = min(
+                time_buffer,
+                max(
+                    self.min_time_buffer,
+                    _round_up(max_non_search_time * (1 + self.margin), 1),
+                ),
+            )
+            old_limit = new_limit = 0
+            for run in runs:
+                steps = run["horizon"] * run["num_runs"]
+                old_limit += int(steps * time_per_step) + time_buffer
+                new_limit += int(steps * suggested_time_per_step) + suggested_time_buffer
+            suggestions[domain] = {
+                "time_per_step": time_per_step,
+                "max_search_time_per_step": max_step_time,
+                "suggested_time_per_step": suggested_time_per_step,
+                "time_buffer": time_buffer,
+                "max_non_search_time": max_non_search_time,
+                "suggested_time_buffer": suggested_time_buffer,
+                "saved_time": 1 - new_limit / old_limit if old_limit else 0.0,
+                "runs_at_time_limit": sum(
+                    run.get("run_time_limit_utilization", 0) >= 1 for run in runs
+                ),
+            }
+        return suggestions
+
+    def _get_suggestions_table(self):
+        table = reports.Table(title="Suggested limits")
+        columns = [
+            "time_per_step",
+            "max_search_time_per_step",
+            "suggested_time_per_step",
+            "time_buffer",
+            "max_non_search_time",
+            "suggested_time_buffer",
+            "saved_time",
+            "runs_at_time_limit",
+        ]
+        table.set_column_order(columns)
+        for domain, suggestion in self.get_suggestions().items():
+            for column in columns:
+                table.add_cell(domain, column, suggestion[column])
+        table.info.append(
+            "Suggestions cover the maximum time of all runs in the domain plus "
+            "{:.0%}. Saved time is the fraction of the time limits of all runs "
+            "that the suggestions save.".format(self.margin)
+        )
+        table.info.append(
+            "Runs at the time limit may need more time, so the suggestions "
+            "for their domains are too tight."
+        )
+        return table
+
+    def _get_markup(self):
+        sections = []
+        warnings = self._get_warnings_text_and_table()
+        if warnings:
+            sections.append(("unexplained-errors", "Unexplained Errors", warnings))
+        sections.append(("suggestions", "Suggested limits", self._get_suggestions_table()))
+        for attribute in self.attributes:
+            table = self._get_utilization_table(attribute)
+            if table is not None:
+                sections.append((str(attribute), str(attribute), table))
+        return "\n".join(
+            f"= {title} =[{anchor}]\n\n{section}\n"
+            for anchor, title, section in sections
+        )
@@ -0,0 +1,241 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Find runs that failed because of the infrastructure and execute them
+again.
+"""
+
+import copy
+import glob
+import json
+import logging
+import os
+import re
+import time
+
+from lab import tools
+from lab.environments import GridEnvironment
+from lab.experiment import Experiment
+
+from prostlab.supervisor import (
+    COMPRESSED_SUFFIX,
+    INFRASTRUCTURE_FAILURES,
+    PROFILE_DATA,
+    SERVER_LOGS,
+)
+
+
+#: The node died or the job was killed before the run finished.
+NODE_FAILURE = "node_failure"
+
+# Files that are moved away before a run is executed again.
+RUN_FILES = [
+    "run.log",
+    "run.err",
+    "driver.log",
+    "driver.err",
+    "properties",
+    "supervisor.log",
+] + SERVER_LOGS + [
+    "run.log" + COMPRESSED_SUFFIX,
+    "server.log" + COMPRESSED_SUFFIX,
+    PROFILE_DATA,
+    PROFILE_DATA + COMPRESSED_SUFFIX,
+]
+
+# Execute the run script of a run directory like the jobs of lab's
+# environments do, which write its output to the driver logs and
+# delete them if they stay empty.
+RUN_SCRIPT_COMMAND = (
+    '"$0" run > driver.log 2> driver.err; code=$?; '
+    'for f in driver.log driver.err; do [ -s "$f" ] || rm -f "$f"; done; '
+    "exit $code"
+)
+
+
+def _read_file(filename):
+    if not os.path.exists(filename):
+        return ""
+    with open(filename, errors="replace") as f:
+        return f.read()
+
+
+def _load_properties(run_dir):
+    filename = os.path.join(run_dir, "properties")
+    if not os.path.exists(filename):
+        return {}
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except ValueError:
+        # The node died while the properties were written.
+        return {}
+
+
+def classify_run(run_dir):
+    """Return the infrastructure failure of the run in *run_dir* or None
+    if the run succeeded or failed because of the planner."""
+    if "planner wall-clock time" not in _read_file(os.path.join(run_dir, "driver.log")):
+        return NODE_FAILURE
+    attempts = _load_properties(run_dir).get("attempts")
+    if not attempts:
+        return NODE_FAILURE
+    failure = attempts[-1]["failure"]
+    if failure in INFRASTRUCTURE_FAILURES:
+        return failure
+    return None
+
+
+def create_experiment(cls, *args, **kwargs):
+    """Return the experiment ``cls(*args, **kwargs)``.
+
+    Creating an experiment configures logging again, which leaves some
+    of the previous handlers in place. This function keeps the current
+    ones.
+    """
+    root_logger = logging.getLogger()
+    handlers = list(root_logger.handlers)
+    exp = cls(*args, **kwargs)
+    root_logger.handlers = handlers
+    return exp
+
+
+def check_login_node(environment, step_name):
+    """Abort if the step *step_name* runs in a job of the grid
+    *environment*, from which no further jobs can be submitted."""
+    if isinstance(environment, GridEnvironment) and "SLURM_JOB_ID" in os.environ:
+        logging.critical(
+            "Cannot submit the runs of step {} from a grid job. Run the step "
+            "on its own on the login node.".format(step_name)
+        )
+
+
+def execute_runs(exp, step_name):
+    """Execute the runs of the built experiment *exp* in its environment.
+
+    The runs are started by a new step *step_name* of *exp*, which is
+    passed to the environment like the steps selected on the command
+    line. Local environments execute the runs and return when all of
+    them are done. Grid environments submit a job for the runs and
+    return right away. Since jobs cannot be submitted from the grid,
+    this function must not be called by a step that runs in a job (see
+    :func:`check_login_node`).
+    """
+    check_login_node(exp.environment, step_name)
+    exp.add_step(step_name, exp.start_runs)
+    exp.environment.run_steps([exp.steps[-1]])
+
+
+def get_rerun_experiment(exp, run_dirs, name):
+    """Return a built experiment whose runs execute the runs in the run
+    directories *run_dirs* of *exp* again.
+
+    Each run of the returned experiment calls the run script in one of
+    the *run_dirs* and writes its output to the ``driver.log`` and
+    ``driver.err`` files there, like the experiment step of *exp*. The
+    experiment uses the environment of *exp*, so that the timings of
+    the runs are comparable to the other runs, and is stored next to
+    *exp* in the first free directory ``<exp.path>-<name>-<n>``.
+    """
+    index = 1
+    while os.path.exists("{}-{}-{}".format(exp.path, name, index)):
+        index += 1
+    rerun_exp = create_experiment(
+        Experiment,
+        path="{}-{}-{}".format(exp.path, name, index),
+        environment=copy.copy(exp.environment),
+    )
+    for run_dir in run_dirs:
+        run = rerun_exp.add_run()
+        run.add_command(
+            "run",
+            ["sh", "-c", RUN_SCRIPT_COMMAND, tools.get_python_executable()],
+            cwd=run_dir,
+        )
+        run.set_property("id", [os.path.relpath(run_dir, exp.path)])
+    rerun_exp.build()
+    return rerun_exp
+
+
+class RunRetrier(object):
+    """Execute runs again that failed because of the infrastructure.
+
+    A run failed because of the infrastructure if its node died before
+    the run finished, or if the supervisor gave up on a failure in
+    :data:`~prostlab.supervisor.INFRASTRUCTURE_FAILURES`, e.g., because
+    rddlsim could not bind its port. Runs that failed because of the
+    planner are never repeated.
+
+    The files of a failed run are moved to a subdirectory
+    ``retry-<n>`` of the run directory, and the failure is appended to
+    the ``retries`` property of the run before it is executed again.
+    The runs are executed by a separate experiment in the environment of
+    the experiment (see :func:`get_rerun_experiment`), so that their
+    timings are comparable to the other runs.
+    """
+
+    def __call__(self, exp, max_retries=2, step_name="retry"):
+        """Execute all runs of *exp* that failed because of the
+        infrastructure and have been repeated less than *max_retries*
+        times. *step_name* is the name of the step that calls the
+        retrier."""
+        check_login_node(exp.environment, step_name)
+        run_dirs = sorted(glob.glob(os.path.join(exp.path, "runs-*-*", "*")))
+        failed = []
+        for run_dir in run_dirs:
+            failure = classify_run(run_dir)
+            if failure is None:
+                continue
+            retries = _load_properties(run_dir).get("retries", [])
+            if len(retries) >= max_retries:
+                logging.warning(
+                    "{} failed ({}) after {} retries".format(run_dir, failure, len(retries))
+                )
+                continue
+            self._prepare_retry(run_dir, failure, retries)
+            failed.append(run_dir)
+        logging.info(
+            "Retrying {} of {} runs that failed because of the "
+            "infrastructure".format(len(failed), len(run_dirs))
+        )
+        if failed:
+            execute_runs(get_rerun_experiment(exp, failed, step_name), step_name)
+
+    def _prepare_retry(self, run_dir, failure, retries):
+        match = re.search(
+            r"node: (.+)\n", _read_file(os.path.join(run_dir, "driver.log"))
+        )
+        retries = retries + [
+            {
+                "failure": failure,
+                "node": match.group(1) if match else None,
+                "time": time.time(),
+            }
+        ]
+        retry_dir = os.path.join(run_dir, "retry-{}".format(len(retries)))
+        tools.makedirs(retry_dir)
+        for filename in RUN_FILES + [
+            os.path.basename(path)
+            for path in glob.glob(os.path.join(run_dir, "run-attempt*"))
+        ]:
+            path = os.path.join(run_dir, filename)
+            if os.path.exists(path):
+                os.rename(path, os.path.join(retry_dir, filename))
+        # Keep the history in the properties that the new attempt extends.
+        with open(os.path.join(run_dir, "properties"), "w") as f:
+            json.dump({"retries": retries}, f, indent=2, sort_keys=True)
+        logging.info("Retrying {} after {}".format(run_dir, failure))
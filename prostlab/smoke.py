@@ -0,0 +1,300 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A quick smoke benchmark for checking the performance of Prost revisions.
+"""
+
+from collections import defaultdict
+import json
+import logging
+import os.path
+
+from lab import tools
+from lab.environments import LocalEnvironment
+from lab.experiment import get_default_data_dir
+from lab.reports import geometric_mean
+
+from prostlab.experiment import ProstExperiment
+from prostlab.reports import aggregate_replicates, PlanningReport
+from prostlab.suites import discover_suite
+
+
+#: Domains of the smoke benchmark. They cover all competitions and
+#: domains with different characteristics, e.g., dead ends
+#: (crossing-traffic, triangle-tireworld), large action spaces
+#: (sysadmin, academic-advising) and large state spaces (wildfire).
+SMOKE_DOMAINS = [
+    "elevators-2011",
+    "sysadmin-2011",
+    "crossing-traffic-2011",
+    "academic-advising-2014",
+    "triangle-tireworld-2014",
+    "wildfire-2014",
+    "push-your-luck-2018",
+    "earth-observation-2018",
+]
+
+#: Instance numbers of the smoke benchmark in each domain.
+SMOKE_PROBLEMS = [1, 5, 10]
+
+#: Attributes compared to the references and the relative deviation
+#: for the worse over the whole suite that is tolerated.
+DEFAULT_TOLERANCES = {
+    "average_reward": 0.1,
+    "total_time": 0.25,
+}
+
+#: Smaller values are raised to this value before geometric means are
+#: computed, so that tasks with tiny values do not dominate the ratios.
+GEOMETRIC_MEAN_MIN_VALUE = 0.1
+
+
+def get_smoke_suite(benchmarks_dir=None, manifest=None):
+    """Return the problems of the smoke benchmark in *benchmarks_dir*.
+
+    See :func:`prostlab.suites.discover_suite` for the parameters.
+    """
+    suite = [
+        task
+        for task in discover_suite(benchmarks_dir, domains=SMOKE_DOMAINS, manifest=manifest)
+        if int(task.problem[len("inst-") :]) in SMOKE_PROBLEMS
+    ]
+    missing = sorted(set(SMOKE_DOMAINS) - {task.domain for task in suite})
+    if missing:
+        logging.warning("Smoke benchmark domains not found: {}".format(missing))
+    return suite
+
+
+class SmokeExperiment(ProstExperiment):
+    """Run a small, fixed set of tasks locally and compare the results to
+    stored references.
+
+    The experiment runs the tasks of :func:`get_smoke_suite` with few
+    rounds and little time per step on all cores of the local machine,
+    so that checking a revision takes a few minutes. Like all Prost
+    experiments, it builds revisions in the shared revision cache and
+    loads the suite from the cached benchmark manifest.
+
+    The experiment comes with the steps ``build``, ``start``, ``fetch``
+    and ``check``. The ``check`` step compares the runs of each
+    algorithm to the references for the algorithm with the same name
+    in the JSON file *references* (by default
+    ``<scriptdir>/data/smoke-references.json``). Since single runs are
+    noisy, the attributes in *tolerances* are aggregated over all tasks
+    of an algorithm before they are compared (see
+    :meth:`_get_deviation`). An algorithm deviates if an aggregated
+    attribute is worse than the aggregated reference by more than the
+    given fraction. The step aborts with a non-zero exit status if
+    algorithms deviate or runs are missing or have unexplained errors,
+    and stores the results of algorithms without references as their
+    references. Pass *planner_seeds* to run seed replicates, which are
+    averaged before the comparison.
+
+    >>> exp = SmokeExperiment()
+    >>> exp.add_algorithm("ipc2014", repo, "my-branch", "IPC2014")
+    >>> exp.run_steps()
+
+    Since timings depend on the machine, references should be recorded
+    on the machine that runs the checks. Add a step to refresh them::
+
+        exp.add_step("update-references", exp.update_references)
+
+    """
+
+    def __init__(
+        self,
+        benchmarks_dir=None,
+        references=None,
+        tolerances=None,
+        num_runs=3,
+        time_per_step=0.1,
+        time_buffer=60,
+        path=None,
+        environment=None,
+        **kwargs
+    ):
+        """
+        See :class:`prostlab.experiment.ProstExperiment` for the other
+        parameters. *environment* defaults to a
+        :class:`lab.environments.LocalEnvironment` that uses all cores.
+        """
+        ProstExperiment.__init__(
+            self,
+            get_smoke_suite(benchmarks_dir),
+            num_runs=num_runs,
+            time_per_step=time_per_step,
+            time_buffer=time_buffer,
+            path=path,
+            environment=environment or LocalEnvironment(),
+            **kwargs
+        )
+        self.references = references or os.path.join(
+            get_default_data_dir(), "smoke-references.json"
+        )
+        self.tolerances = tolerances or dict(DEFAULT_TOLERANCES)
+
+        self.add_parser(self.PROST_PARSER)
+        self.add_step("build", self.build)
+        self.add_step("start", self.start_runs)
+        self.add_fetcher(name="fetch")
+        self.add_step("check", self.check_references)
+
+    def _get_settings(self):
+        return {
+            "num_runs": self.num_runs,
+            "time_per_step": self.time_per_step,
+            "rddlsim_seeds": self.rddlsim_seeds,
+            "planner_seeds": self.planner_seeds,
+        }
+
+    def _load_references(self):
+        if not os.path.exists(self.references):
+            return {}
+        with open(self.references) as f:
+            return json.load(f)
+
+    def _load_results(self):
+        """Return the runs of the evaluation directory per algorithm and
+        task. Seed replicates are averaged."""
+        props_file = os.path.join(self.eval_dir, "properties")
+        if not os.path.exists(props_file):
+            logging.critical("Properties file not found at {}".format(props_file))
+        props = tools.Properties(filename=props_file)
+        aggregate_replicates(props)
+        results = {}
+        for run in props.values():
+            task = "{}:{}".format(run["domain"], run["problem"])
+            results.setdefault(run["algorithm"], {})[task] = run
+        return results
+
+    def _get_reference(self, runs):
+        return {
+            "global_revision": next(iter(runs.values())).get("global_revision"),
+            "settings": self._get_settings(),
+            "tasks": {
+                task: {attribute: run.get(attribute) for attribute in self.tolerances}
+                for task, run in sorted(runs.items())
+            },
+        }
+
+    def _write_references(self, references):
+        tools.makedirs(os.path.dirname(self.references))
+        tools.write_file(
+            self.references, json.dumps(references, indent=2, sort_keys=True)
+        )
+        logging.info("Wrote references to {}".format(self.references))
+
+    def update_references(self):
+        """Store the results of all algorithms as their references."""
+        references = self._load_references()
+        for algorithm, runs in self._load_results().items():
+            references[algorithm] = self._get_reference(runs)
+        self._write_references(references)
+
+    def _get_deviation(self, attribute, values, references):
+        """Return by which fraction the *values* of *attribute* on all
+        tasks are worse than the *references* on the same tasks.
+
+        Attributes for which smaller values are better, like times, are
+        compared by the geometric mean of the ratios between values and
+        references. Other attributes, like rewards, which may be
+        negative, are compared by the sum of the differences relative to
+        the sum of the absolute references.
+        """
+        predefined = {str(attr): attr for attr in PlanningReport.PREDEFINED_ATTRIBUTES}
+        min_wins = attribute not in predefined or predefined[attribute].min_wins
+        if min_wins:
+            ratios = [
+                max(value, GEOMETRIC_MEAN_MIN_VALUE)
+                / max(reference, GEOMETRIC_MEAN_MIN_VALUE)
+                for value, reference in zip(values, references)
+            ]
+            return geometric_mean(ratios) - 1
+        difference = sum(references) - sum(values)
+        scale = sum(abs(reference) for reference in references)
+        return difference / scale if scale else difference
+
+    def check_references(self):
+        """Compare the results to the references and abort if they
+        deviate."""
+        references = self._load_references()
+        failures = []
+        deviations = {}
+        num_new = 0
+        for algorithm, runs in self._load_results().items():
+            if algorithm not in references:
+                logging.info("No references for {}, storing them".format(algorithm))
+                references[algorithm] = self._get_reference(runs)
+                num_new += 1
+                continue
+            reference = references[algorithm]
+            if reference["settings"] != self._get_settings():
+                logging.warning(
+                    "References for {} were recorded with {}".format(
+                        algorithm, reference["settings"]
+                    )
+                )
+            values = defaultdict(list)
+            ref_values = defaultdict(list)
+            for task, reference_values in sorted(reference["tasks"].items()):
+                run = runs.get(task)
+                if run is None:
+                    failures.append(f"{algorithm} {task}: run is missing")
+                    continue
+                if run.get("unexplained_errors"):
+                    failures.append(
+                        f"{algorithm} {task}: {run['unexplained_errors']}"
+                    )
+                for attribute in self.tolerances:
+                    value = run.get(attribute)
+                    ref_value = reference_values.get(attribute)
+                    if ref_value is None:
+                        continue
+                    if value is None:
+                        failures.append(f"{algorithm} {task}: {attribute} is missing")
+                        continue
+                    values[attribute].append(value)
+                    ref_values[attribute].append(ref_value)
+            for attribute, tolerance in sorted(self.tolerances.items()):
+                if not values[attribute]:
+                    continue
+                deviation = self._get_deviation(
+                    attribute, values[attribute], ref_values[attribute]
+                )
+                deviations.setdefault(algorithm, {})[attribute] = deviation
+                if deviation > tolerance:
+                    failures.append(
+                        "{}: {} over {} tasks is {:+.0%} worse than the "
+                        "references".format(
+                            algorithm, attribute, len(values[attribute]), deviation
+                        )
+                    )
+        if num_new:
+            self._write_references(references)
+        tools.write_file(
+            os.path.join(self.eval_dir, "smoke-check.json"),
+            json.dumps({"failures": failures, "deviations": deviations}, indent=2),
+        )
+        for failure in failures:
+            logging.error(failure)
+        if failures:
+            logging.critical(
+                "Smoke benchmark found {} deviations from the references".format(
+                    len(failures)
+                )
+            )
+        logging.info("No deviations from the references")
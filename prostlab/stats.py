@@ -0,0 +1,227 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Statistical tests for comparing planner configurations.
+
+The functions only use the standard library, so that Prost Lab does not
+depend on SciPy.
+"""
+
+import math
+
+
+def rank(values):
+    """Return the ranks of *values*, starting at 1 for the smallest
+    value. Tied values get the average of their ranks."""
+    order = sorted(range(len(values)), key=lambda index: values[index])
+    ranks = [0.0] * len(values)
+    start = 0
+    while start < len(order):
+        end = start
+        while end + 1 < len(order) and values[order[end + 1]] == values[order[start]]:
+            end += 1
+        for index in order[start : end + 1]:
+            ranks[index] = (start + end) / 2 + 1
+        start = end + 1
+    return ranks
+
+
+def _gamma_series(a, x):
+    total = term = 1.0 / a
+    for n in range(1, 1000):
+        term *= x / (a + n)
+        total += term
+        if abs(term) < abs(total) * 1e-15:
+            break
+    return total * math.exp(-x + a * math.log(x) - math.lgamma(a))
+
+
+def _gamma_continued_fraction(a, x):
+    # Modified Lentz's method.
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for n in range(1, 1000):
+        an = -n * (n - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return math.exp(-x + a * math.log(x) - math.lgamma(a)) * h
+
+
+def chi2_sf(x, df):
+    """Return P(X >= *x*) for a chi-squared distribution with *df*
+    degrees of freedom."""
+    if x <= 0:
+        return 1.0
+    a = df / 2
+    x = x / 2
+    if x < a + 1:
+        return 1 - _gamma_series(a, x)
+    return _gamma_continued_fraction(a, x)
+
+
+def _beta_continued_fraction(a, b, x):
+    tiny = 1e-300
+    c = 1.0
+    d = 1 - (a + b) * x / (a + 1)
+    d = tiny if abs(d) < tiny else d
+    d = 1 / d
+    h = d
+    for m in range(1, 1000):
+        for numerator in [
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1)),
+        ]:
+            d = 1 + numerator * d
+            d = tiny if abs(d) < tiny else d
+            c = 1 + numerator / c
+            c = tiny if abs(c) < tiny else c
+            d = 1 / d
+            h *= d * c
+        if abs(d * c - 1) < 1e-15:
+            break
+    return h
+
+
+def _betainc(a, b, x):
+    """Return the regularized incomplete beta function I_x(a, b)."""
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    front = math.exp(
+        math.lgamma(a + b)
+        - math.lgamma(a)
+        - math.lgamma(b)
+        + a * math.log(x)
+        + b * math.log(1 - x)
+    )
+    if x < (a + 1) / (a + b + 2):
+        return front * _beta_continued_fraction(a, b, x) / a
+    return 1 - front * _beta_continued_fraction(b, a, 1 - x) / b
+
+
+def t_sf(t, df):
+    """Return P(T >= *t*) for Student's t-distribution with *df* degrees
+    of freedom."""
+    tail = 0.5 * _betainc(df / 2, 0.5, df / (df + t * t))
+    return tail if t >= 0 else 1 - tail
+
+
+def t_quantile(p, df):
+    """Return the *p*-quantile of Student's t-distribution with *df*
+    degrees of freedom."""
+    low, high = -1e3, 1e3
+    for _ in range(200):
+        mid = (low + high) / 2
+        if 1 - t_sf(mid, df) < p:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def friedman_test(blocks):
+    """Compare k treatments that were observed in each of the given
+    *blocks* (lists of k values, larger values are better).
+
+    Return the Friedman statistic, its p-value, the sums of the ranks of
+    the treatments (the best treatment of a block gets rank 1) and a
+    function that returns the p-value of the post-hoc test whether two
+    treatments with the given rank sums differ (Conover, 1999). This is
+    the test used by F-race (Birattari et al., 2002).
+    """
+    num_blocks = len(blocks)
+    num_treatments = len(blocks[0])
+    ranks = [rank([-value for value in block]) for block in blocks]
+    rank_sums = [sum(block[j] for block in ranks) for j in range(num_treatments)]
+    sum_squares = sum(r * r for block in ranks for r in block)
+    correction = num_blocks * num_treatments * (num_treatments + 1) ** 2 / 4
+    denominator = sum_squares - correction
+    expected = num_blocks * (num_treatments + 1) / 2
+    if denominator <= 0 or num_blocks < 2:
+        # All treatments performed equally in all blocks.
+        return 0.0, 1.0, rank_sums, lambda first, second: 1.0
+    statistic = (
+        (num_treatments - 1)
+        * sum((rank_sum - expected) ** 2 for rank_sum in rank_sums)
+        / denominator
+    )
+    p_value = chi2_sf(statistic, num_treatments - 1)
+    df = (num_blocks - 1) * (num_treatments - 1)
+    scale = math.sqrt(
+        max(
+            0.0,
+            2
+            * num_blocks
+            * (1 - statistic / (num_blocks * (num_treatments - 1)))
+            * denominator
+            / df,
+        )
+    )
+
+    def compare(first, second):
+        if scale == 0:
+            return 0.0 if first != second else 1.0
+        return 2 * t_sf(abs(first - second) / scale, df)
+
+    return statistic, p_value, rank_sums, compare
+
+
+def normal_sf(z):
+    """Return P(Z >= *z*) for the standard normal distribution."""
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def wilcoxon_test(differences):
+    """Test whether the paired *differences* are centered above zero
+    with the one-sided Wilcoxon signed-rank test.
+
+    Zero differences are dropped. Return the sum of the ranks of the
+    positive differences and its p-value. The p-value is exact if
+    there are no ties and at most 50 differences, and otherwise uses
+    the normal approximation with tie and continuity corrections.
+    """
+    differences = [diff for diff in differences if diff != 0]
+    n = len(differences)
+    if n == 0:
+        return 0.0, 1.0
+    ranks = rank([abs(diff) for diff in differences])
+    statistic = sum(r for r, diff in zip(ranks, differences) if diff > 0)
+    if n <= 50 and all(r == int(r) for r in ranks):
+        # Count the subsets of the ranks 1..n by their sums.
+        counts = [1] + [0] * (n * (n + 1) // 2)
+        for r in range(1, n + 1):
+            for total in range(len(counts) - 1, r - 1, -1):
+                counts[total] += counts[total - r]
+        return statistic, sum(counts[int(statistic) :]) / 2 ** n
+    mean = n * (n + 1) / 4
+    variance = sum(r * r for r in ranks) / 4
+    if variance == 0:
+        return statistic, 1.0
+    z = (statistic - mean - 0.5) / math.sqrt(variance)
+    return statistic, normal_sf(z)
@@ -14,9 +14,38 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import logging
 import os
 import re
 
+from prostlab.manifest import BenchmarkManifest, read_horizon
+
+
+def _get_file_prefix(domain):
+    if domain.endswith("-2018"):
+        return domain[:-5]
+    return domain[:-5].replace("-", "_")
+
+
+def get_domain_file_name(domain):
+    """Return the name of the domain file of *domain* (e.g.
+    ``"elevators_mdp.rddl"`` for ``"elevators-2011"``)."""
+    return "{}_mdp.rddl".format(_get_file_prefix(domain))
+
+
+def get_problem_file_name(domain, problem):
+    """Return the name of the file of instance number *problem* of *domain*."""
+    if domain.endswith("-2018"):
+        return "{}_inst_mdp__{:02d}.rddl".format(_get_file_prefix(domain), problem)
+    return "{}_inst_mdp__{}.rddl".format(_get_file_prefix(domain), problem)
+
+
+def _get_problem_file_regex(domain):
+    return re.compile(
+        r"^{}_inst_mdp__(\d+)\.rddl$".format(re.escape(_get_file_prefix(domain)))
+    )
+
+
 class Problem(object):
     def __init__(
         self,
@@ -29,6 +58,7 @@ class Problem(object):
         problem_file=None,
         max_reward=None,
         properties=dict(),
+        manifest=None,
     ):
         """
         *domain* and *problem* are the display names of the domain and
@@ -41,7 +71,12 @@ class Problem(object):
         used instead. 
 
         *properties* may be a dictionary of entries that should be added
-        to the properties file of each run that uses this problem. ::
+        to the properties file of each run that uses this problem.
+
+        If *manifest* is a :class:`~prostlab.manifest.BenchmarkManifest`
+        that contains the domain and problem files, the horizon and the
+        existence of the files are looked up in the manifest instead of
+        reading the files. ::
 
             suite = [
                 Problem('elevators-2011', 1, -65.2,
@@ -58,19 +93,15 @@ class Problem(object):
         self.problem = problem
         self.domain_file = domain_file
         if self.domain_file is None:
-            if self.domain.endswith("-2018"):
-                domain_file_name = "{}_mdp.rddl".format(self.domain[:-5])
-            else:
-                domain_file_name = "{}_mdp.rddl".format(self.domain[:-5].replace("-","_"))
-            self.domain_file = os.path.join(benchmarks_dir, domain_file_name)
+            self.domain_file = os.path.join(
+                benchmarks_dir, get_domain_file_name(self.domain)
+            )
                 
         self.problem_file = problem_file
         if self.problem_file is None:
-            if self.domain.endswith("-2018"):
-                problem_file_name = "{}_inst_mdp__{:02d}.rddl".format(self.domain[:-5], self.problem)
-            else:
-                problem_file_name = "{}_inst_mdp__{}.rddl".format(self.domain[:-5].replace("-","_"), self.problem)
-            self.problem_file = os.path.join(benchmarks_dir, problem_file_name)
+            self.problem_file = os.path.join(
+                benchmarks_dir, get_problem_file_name(self.domain, self.problem)
+            )
 
         self.problem = "inst-{:02d}".format(self.problem)
         self.problem_name = os.path.split(self.problem_file)[-1][:-5]
@@ -79,17 +110,20 @@ class Problem(object):
         self.max_reward = max_reward
 
         self.horizon = horizon
-        if self.horizon is None:
-            with open(self.problem_file) as f:
-                horizon_re = re.compile(r"horizon\s*=\s*(.+)\s*;\s*\n")
-                for line in f:
-                    match = horizon_re.search(line)
-                    if match:
-                        self.horizon = int(match.group(1))
-                        break
-
         self.properties = properties
 
+        if manifest is not None:
+            domain_entry = manifest.get(self.domain_file)
+            problem_entry = manifest.get(self.problem_file)
+            if domain_entry is not None and problem_entry is not None:
+                if self.horizon is None:
+                    self.horizon = problem_entry["horizon"]
+                assert(self.horizon)
+                return
+
+        if self.horizon is None:
+            self.horizon = read_horizon(self.problem_file)
+
         assert(self.horizon)
         assert(os.path.exists(self.domain_file))
         assert(os.path.isfile(self.domain_file))
@@ -105,3 +139,87 @@ class Problem(object):
 
     def __lt__(self, other):
         return str(self) < str(other)
+
+
+def discover_suite(
+    benchmarks_dir=None, domains=None, min_rewards=None, manifest=None, processes=None
+):
+    """Return a list of :class:`Problem` objects for all instances in
+    *benchmarks_dir*, which defaults to the value of the environment
+    variable ``PROST_BENCHMARKS``.
+
+    Every subdirectory whose name ends with a year (e.g.
+    ``elevators-2011``) is a domain, and its instances are found with
+    the same naming rules :class:`Problem` uses. If *domains* is given,
+    only the listed domains are included.
+
+    *min_rewards* may map (domain, problem number) pairs to the minimal
+    reward of the instance. Instances without a minimal reward use the
+    minimal average reward of all planners in reports.
+
+    The RDDL files are analyzed with *processes* parallel processes and
+    the results are cached in *manifest*, a
+    :class:`~prostlab.manifest.BenchmarkManifest` that is loaded (and
+    refreshed) for *benchmarks_dir* if not given. The size statistics of
+    the domain and instance files (e.g., ``num_objects`` and
+    ``num_action_fluents``) are added to the properties of each problem.
+
+    >>> suite = discover_suite(domains=["elevators-2011", "wildfire-2014"])
+
+    """
+    if manifest is None:
+        manifest = BenchmarkManifest.load(
+            benchmarks_dir, refresh=True, processes=processes
+        )
+    benchmarks_dir = manifest.benchmarks_dir
+    min_rewards = min_rewards or {}
+
+    files_by_dir = {}
+    for key in manifest.entries:
+        directory, name = os.path.split(key)
+        files_by_dir.setdefault(directory, []).append(name)
+
+    suite = []
+    for domain in sorted(files_by_dir):
+        if not re.match(r".+-\d{4}$", domain):
+            continue
+        if domains is not None and domain not in domains:
+            continue
+        domain_dir = os.path.join(benchmarks_dir, domain)
+        domain_entry = manifest.get(os.path.join(domain_dir, get_domain_file_name(domain)))
+        if domain_entry is None:
+            logging.warning(f"No domain file found for {domain} in {domain_dir}.")
+            continue
+        problem_regex = _get_problem_file_regex(domain)
+        problems = []
+        for name in files_by_dir[domain]:
+            match = problem_regex.match(name)
+            if match:
+                problems.append(int(match.group(1)))
+        for problem in sorted(problems):
+            problem_entry = manifest.get(
+                os.path.join(domain_dir, get_problem_file_name(domain, problem))
+            )
+            if problem_entry is None or not problem_entry["horizon"]:
+                logging.warning(
+                    f"Skipping {domain} instance {problem} without a horizon."
+                )
+                continue
+            properties = dict(domain_entry["statistics"])
+            properties.update(problem_entry["statistics"])
+            suite.append(
+                Problem(
+                    domain,
+                    problem,
+                    min_rewards.get((domain, problem)),
+                    benchmarks_dir=domain_dir,
+                    properties=properties,
+                    manifest=manifest,
+                )
+            )
+    logging.info(
+        "Discovered {} problems in {} domains.".format(
+            len(suite), len({problem.domain for problem in suite})
+        )
+    )
+    return suite
@@ -0,0 +1,1367 @@
+#! /usr/bin/env python
+#
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Supervise rddlsim and Prost for a single run of a Prost experiment.
+
+The supervisor is copied to the experiment directory and executed in
+the run directory. It only uses the standard library. It starts
+rddlsim, waits until the server listens on its port, starts Prost,
+streams the output of the planner to ``run.log`` and ``run.err`` and
+the output of the server to ``server.log`` and ``server.err``, and
+stops the server once the planner is done. Its own messages are written
+to ``supervisor.log``. Everything the supervisor learns about the run,
+including the time spent in each of these phases, is added to the
+``properties`` file. The peak resident memory of the planner in KiB is
+stored as ``raw_memory``. It is measured by a separate process that
+executes the planner of each attempt (see :func:`measure_memory`), so
+that it excludes the servers and the profiler. If the supervisor kills
+the planner of the final attempt because it exceeds the time limit,
+``raw_memory`` is not stored.
+
+With ``--server-pool``, runs on the same node share rddlsim servers
+(see :class:`PooledServer`) instead of starting one server per run.
+
+With ``--stage-code``, the code of the planner revision is copied to
+node-local storage once per node (see :func:`stage_code`), and the
+planner and the server are executed from there.
+
+With ``--compress-logs``, the standard output of the planner and the
+server is compressed while it is written, to ``run.log.gz`` and
+``server.log.gz``. Since lab can then no longer limit the size of
+``run.log``, the supervisor applies the given output limits to the
+uncompressed data itself (see :class:`LimitedLog`). Error output is
+never compressed, so that lab still reports it as unexplained errors.
+
+With ``--profile``, the planner is executed under the sampling profiler
+``perf``, if it is available on the node. The profile is compressed to
+``perf.data.gz`` in the run directory, and the functions in which the
+search spends most of its time are added to the properties (see
+:func:`summarize_profile`).
+
+With ``--anytime-checkpoints``, the planner is asked to report the
+action it would take at the given times of each step via the environment
+variable :data:`ANYTIME_CHECKPOINTS_VARIABLE`. Planners that do not
+support anytime profiles ignore the variable.
+
+With ``--calibrate``, the speed of the node is measured once with a
+short benchmark, cached on the node and added to the properties as
+``node_speed_factor`` (see :func:`get_speed_factor`).
+
+If several memory tiers are given, the run starts with the first tier
+as memory limit. If it fails because it runs out of memory, it is
+repeated with the next tier. Runs that fail for reasons unrelated to
+the planner (see :data:`INFRASTRUCTURE_FAILURES`) are repeated up to
+``--max-retries`` times. Each attempt has the wall-clock limit
+``--time-limit``, but all attempts together must finish within
+``--total-time-limit``. The standard output of all attempts is
+streamed to ``run.log``, so that lab's output limits apply to it while
+the run is executed. If an attempt is repeated, the line
+:data:`REPEATED_ATTEMPT_MARKER` follows its output, and parsers only
+read the output after the last such line. The error output of attempts
+that may still be repeated is buffered in the run directory and only
+copied to ``run.err`` if the attempt is final, so that lab does not
+report the errors of repeated attempts.
+"""
+
+import argparse
+import asyncio
+import fcntl
+import gzip
+import hashlib
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+
+PROPERTIES_FILE = "properties"
+
+OUT_OF_MEMORY = "out_of_memory"
+SERVER_NOT_READY = "server_not_ready"
+
+# Messages that indicate that a process ran out of memory.
+OUT_OF_MEMORY_PATTERNS = [
+    "std::bad_alloc",
+    "java.lang.OutOfMemoryError",
+    "MemoryError",
+    "Could not reserve enough space",
+    "Cannot allocate memory",
+]
+
+# Failures of the infrastructure and the messages that indicate them.
+# Runs with these failures are repeated, since they are not caused by
+# the planner.
+INFRASTRUCTURE_FAILURES = {
+    "port_in_use": ["Address already in use", "java.net.BindException"],
+    "connection_refused": ["Connection refused"],
+    "jvm_crash": [
+        "A fatal error has been detected by the Java Runtime Environment",
+        "hs_err_pid",
+    ],
+    # Detected by the supervisor instead of a message.
+    SERVER_NOT_READY: [],
+}
+
+# Files next to run.log and run.err that may contain these messages.
+SERVER_LOGS = ["server.log", "server.err"]
+
+# Number of bytes at the end of the output of an attempt that are
+# searched for these messages.
+OUTPUT_TAIL_SIZE = 64 * 1024
+
+# Line written to run.log after the output of an attempt that is repeated.
+REPEATED_ATTEMPT_MARKER = "prostlab: the output above belongs to a repeated attempt"
+
+# Suffix of compressed logs.
+COMPRESSED_SUFFIX = ".gz"
+
+# Number of staged code directories that are kept on a node.
+STAGED_CODE_COPIES = 5
+
+# Seconds since their last use after which staged code directories may
+# be removed, so that copies used by running runs stay.
+STAGED_CODE_MIN_AGE = 24 * 60 * 60
+
+# File to which the process that executes the planner writes the peak
+# memory of the planner.
+PLANNER_MEMORY_FILE = "planner-memory"
+
+# Sampling profiler and the file it writes the profile to.
+PROFILER = "perf"
+PROFILE_DATA = "perf.data"
+
+# Names of the processes whose samples are summarized.
+PROFILED_COMMANDS = ["search"]
+
+# Number of functions stored in the profile_hot_functions property.
+NUM_HOT_FUNCTIONS = 30
+
+# Environment variable that holds the comma-separated anytime checkpoints
+# in seconds for the planner.
+ANYTIME_CHECKPOINTS_VARIABLE = "PROST_ANYTIME_CHECKPOINTS"
+
+
+def _get_node_local_path(name):
+    """Return a path for *name* in the temporary directory of the node.
+
+    The temporary directory is shared by all users, so the path contains
+    the user id. Otherwise, the first user to create the file or
+    directory would lock out everybody else.
+    """
+    return os.path.join(
+        tempfile.gettempdir(), "prostlab-{}-{}".format(os.getuid(), name)
+    )
+
+
+# Node-local file that caches the results of the calibration benchmark.
+CALIBRATION_FILE = _get_node_local_path("calibration.json")
+
+# Increase the version whenever the calibration benchmark changes, so
+# that cached results are not used anymore.
+CALIBRATION_VERSION = 1
+
+# Seconds the calibration benchmark takes on the reference machine.
+CALIBRATION_REFERENCE_TIME = 0.4
+
+# Seconds to wait before the n-th retry after an infrastructure failure
+# are n times this value.
+RETRY_BACKOFF = 5
+
+# Attempts are only repeated if at least this many seconds remain until
+# the deadline of the run.
+MIN_ATTEMPT_TIME = 10
+
+# Interval in seconds for checking whether the server is ready.
+POLL_INTERVAL = 0.05
+
+# Seconds the server may take to terminate after receiving SIGTERM.
+KILL_TIMEOUT = 5
+
+# Interval in seconds for checking whether a pooled server is still used.
+REAPER_INTERVAL = 1
+
+# Processes that have to be killed if the supervisor is terminated.
+_processes = set()
+_terminated = False
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--server", required=True, help="run-server.py")
+    parser.add_argument("--planner", required=True, help="prost.py")
+    parser.add_argument("--benchmarks-dir", default="./")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--planner-seed", type=int, default=1)
+    parser.add_argument("--rddlsim-runtime", type=int, default=0)
+    parser.add_argument("--num-runs", type=int, required=True)
+    parser.add_argument("--problem", required=True)
+    parser.add_argument("--parser-options", default="")
+    parser.add_argument("--driver-options", default="")
+    parser.add_argument("--search-engine", required=True)
+    parser.add_argument(
+        "--memory-tiers",
+        type=lambda value: [int(tier) for tier in value.split(",")],
+        required=True,
+        help="comma-separated memory limits in MiB",
+    )
+    parser.add_argument(
+        "--start-tier", type=int, default=0, help="index of the first memory tier"
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=0,
+        help="maximum number of repetitions after infrastructure failures",
+    )
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        default=None,
+        help="wall-clock time limit in seconds for each attempt",
+    )
+    parser.add_argument(
+        "--total-time-limit",
+        type=float,
+        default=None,
+        help="wall-clock time limit in seconds for all attempts",
+    )
+    parser.add_argument(
+        "--server-timeout",
+        type=float,
+        default=120,
+        help="seconds to wait until the server listens on its port",
+    )
+    parser.add_argument(
+        "--server-grace-time",
+        type=float,
+        default=2,
+        help="seconds the server may take to stop after the planner finished",
+    )
+    parser.add_argument(
+        "--server-pool",
+        action="store_true",
+        help="share rddlsim servers with other runs on this node",
+    )
+    parser.add_argument(
+        "--server-pool-dir",
+        default=_get_node_local_path("server-pool"),
+        help="node-local directory for coordinating the pool (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--server-pool-benchmarks-dir",
+        help="directory with the RDDL files of all runs for pooled servers",
+    )
+    parser.add_argument(
+        "--code-dir",
+        help="directory of the planner revision that contains planner and server",
+    )
+    parser.add_argument(
+        "--stage-code",
+        action="store_true",
+        help="execute planner and server from a node-local copy of --code-dir",
+    )
+    parser.add_argument(
+        "--stage-dir",
+        default=_get_node_local_path("code"),
+        help="node-local directory for staged code (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--compress-logs",
+        action="store_true",
+        help="compress the standard output of the planner and the server",
+    )
+    for kind in ["soft", "hard"]:
+        parser.add_argument(
+            "--{}-stdout-limit".format(kind),
+            type=float,
+            default=None,
+            help="{} limit in KiB for the uncompressed run.log".format(kind),
+        )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="record a profile of the planner with perf",
+    )
+    parser.add_argument(
+        "--profile-frequency",
+        type=int,
+        default=99,
+        help="samples per second recorded by the profiler (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--anytime-checkpoints",
+        help="comma-separated times in seconds at which the planner reports "
+        "its decision in each step",
+    )
+    parser.add_argument(
+        "--calibrate",
+        action="store_true",
+        help="add the speed factor of this node to the properties",
+    )
+    return parser.parse_args()
+
+
+def add_properties(new_props):
+    """Add *new_props* to the properties file of the run."""
+    props = {}
+    if os.path.exists(PROPERTIES_FILE):
+        with open(PROPERTIES_FILE) as f:
+            props = json.load(f)
+    props.update(new_props)
+    tmp_file = PROPERTIES_FILE + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(props, f, indent=2, separators=(",", ": "), sort_keys=True)
+    os.replace(tmp_file, PROPERTIES_FILE)
+
+
+def get_driver_options(args, memory_limit):
+    """Prepend the seed and the RAM limit for *memory_limit* MiB to the
+    driver options, so that user-defined values take precedence."""
+    ram = (memory_limit - 512) * 1024
+    return "-s {} -ram {} {}".format(args.planner_seed, ram, args.driver_options).strip()
+
+
+def get_server_command(args, port, benchmarks_dir):
+    return [
+        args.server,
+        "-b",
+        benchmarks_dir,
+        "-p",
+        str(port),
+        "-s",
+        str(args.seed),
+        "-t",
+        str(args.rddlsim_runtime),
+        "-r",
+        str(args.num_runs),
+    ]
+
+
+def get_planner_command(args, port, memory_limit):
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--measure-memory",
+        PLANNER_MEMORY_FILE,
+        "--",
+        args.planner,
+        args.problem,
+        "-p",
+        str(port),
+    ]
+    if args.profile:
+        command = [
+            PROFILER,
+            "record",
+            "--quiet",
+            "--call-graph=fp",
+            "--freq={}".format(args.profile_frequency),
+            "--output=" + PROFILE_DATA,
+            "--",
+        ] + command
+    if args.parser_options:
+        command += ["--parser-options", args.parser_options]
+    command.append(
+        "[PROST {} -se [{}]]".format(
+            get_driver_options(args, memory_limit), args.search_engine
+        )
+    )
+    return command
+
+
+def measure_memory(filename, command):
+    """Execute *command*, write its peak resident memory in KiB to
+    *filename* and return its exit code.
+
+    The supervisor executes the planner through this function in a
+    separate process, whose only child is the planner. The peak memory
+    of its terminated children therefore is the peak memory of the
+    planner and the processes it waits for.
+    """
+    returncode = subprocess.call(command)
+    with open(filename, "w") as f:
+        f.write(str(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss))
+    return returncode
+
+
+def get_planner_environment(args):
+    env = dict(os.environ)
+    if args.anytime_checkpoints:
+        env[ANYTIME_CHECKPOINTS_VARIABLE] = args.anytime_checkpoints
+    return env
+
+
+def _limit_memory(memory_limit):
+    def set_limit():
+        limit = memory_limit * 1024 * 1024
+        _, hard_limit = resource.getrlimit(resource.RLIMIT_AS)
+        if hard_limit != resource.RLIM_INFINITY:
+            limit = min(limit, hard_limit)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard_limit))
+
+    return set_limit
+
+
+def _kill_process_group(process, sig=signal.SIGKILL):
+    try:
+        os.killpg(process.pid, sig)
+    except OSError:
+        pass
+
+
+def _terminate():
+    """Kill all children when the run is aborted, e.g., because it
+    exceeded its output limit."""
+    global _terminated
+    _terminated = True
+    logging.error("Supervisor terminated, killing all processes")
+    for process in list(_processes):
+        _kill_process_group(process)
+
+
+def _is_listening(port):
+    """Return whether a local socket listens on *port*.
+
+    We don't try to connect to the server, since rddlsim would treat
+    the connection as a session of the planner.
+    """
+    found_table = False
+    for table in ["/proc/net/tcp", "/proc/net/tcp6"]:
+        if not os.path.exists(table):
+            continue
+        found_table = True
+        with open(table) as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                local_port = int(fields[1].rsplit(":", 1)[1], 16)
+                # State 0A is TCP_LISTEN.
+                if local_port == port and fields[3] == "0A":
+                    return True
+    if not found_table:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            return sock.connect_ex(("localhost", port)) == 0
+    return False
+
+
+class LimitedLog(object):
+    """Binary output file that is optionally compressed with gzip.
+
+    Like lab, the log only accepts *hard_limit* KiB of (uncompressed)
+    data. Writing more terminates the process that produces the output,
+    and writing more than *soft_limit* KiB is reported when the log is
+    closed. Both errors are written to the standard error of the
+    supervisor, so that lab reports them.
+    """
+
+    def __init__(self, filename, compress=False, soft_limit=None, hard_limit=None):
+        if compress:
+            filename += COMPRESSED_SUFFIX
+            self.file = gzip.open(filename, "wb", compresslevel=6)
+        else:
+            self.file = open(filename, "wb")
+        self.name = filename
+        self.soft_limit = None if soft_limit is None else int(soft_limit * 1024)
+        self.hard_limit = None if hard_limit is None else int(hard_limit * 1024)
+        self.size = 0
+        self.exceeded = False
+        # The process that writes to the log, set by _start_process().
+        self.process = None
+
+    def write(self, data):
+        if self.exceeded:
+            return
+        if self.hard_limit is not None and self.size + len(data) > self.hard_limit:
+            self.exceeded = True
+            data = data[: self.hard_limit - self.size]
+            _report_error(
+                "planner wrote {} KiB (hard limit) to {} -> abort command".format(
+                    self.hard_limit / 1024, self.name
+                )
+            )
+            if self.process is not None:
+                _kill_process_group(self.process, signal.SIGTERM)
+        self.file.write(data)
+        self.size += len(data)
+
+    def flush(self):
+        # Compressed logs are only flushed when they are closed, since
+        # every flush ends a compressed block.
+        if not isinstance(self.file, gzip.GzipFile):
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+        if (
+            not self.exceeded
+            and self.soft_limit is not None
+            and self.size > self.soft_limit
+        ):
+            _report_error(
+                "planner finished and wrote {} KiB to {} (soft limit: {} KiB)".format(
+                    self.size / 1024, self.name, self.soft_limit / 1024
+                )
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+
+class OutputTail(object):
+    """Forward binary output to *stream* and keep the last *size* bytes
+    of it for classifying failures."""
+
+    def __init__(self, stream, size=OUTPUT_TAIL_SIZE):
+        self.stream = stream
+        self.size = size
+        self.data = b""
+
+    def write(self, data):
+        self.stream.write(data)
+        self.data = (self.data + data)[-self.size :]
+
+    def flush(self):
+        self.stream.flush()
+
+
+def _report_error(message):
+    logging.error(message)
+    sys.stderr.write(message + "\n")
+    sys.stderr.flush()
+
+
+def read_log(filename):
+    """Return the content of the log *filename* and of its compressed
+    version, or an empty string if neither exists."""
+    content = ""
+    for path, open_log in [
+        (filename, open),
+        (filename + COMPRESSED_SUFFIX, gzip.open),
+    ]:
+        if os.path.exists(path):
+            with open_log(path, "rt", errors="replace") as f:
+                content += f.read()
+    return content
+
+
+async def _pump(reader, output):
+    """Copy everything from *reader* to the binary file *output*."""
+    while True:
+        data = await reader.read(1 << 16)
+        if not data:
+            break
+        output.write(data)
+        output.flush()
+
+
+async def _start_process(command, memory_limit, stdout, stderr, env=None):
+    logging.info("Starting {}".format(command))
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        preexec_fn=_limit_memory(memory_limit),
+        # Start a new process group, so that we can kill all
+        # processes that the command starts.
+        start_new_session=True,
+    )
+    _processes.add(process)
+    for output in [stdout, stderr]:
+        if isinstance(output, OutputTail):
+            output = output.stream
+        if isinstance(output, LimitedLog):
+            output.process = process
+    pumps = [
+        asyncio.ensure_future(_pump(process.stdout, stdout)),
+        asyncio.ensure_future(_pump(process.stderr, stderr)),
+    ]
+    return process, pumps
+
+
+async def _wait_until_ready(port, has_exited, timeout):
+    """Return True as soon as the server listens on *port*, and False if
+    the server terminates (i.e., *has_exited* returns True) or *timeout*
+    seconds pass before."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if has_exited():
+            return False
+        if _is_listening(port):
+            return True
+        await asyncio.sleep(POLL_INTERVAL)
+    return False
+
+
+async def _stop_process(process, grace_time):
+    """Give *process* *grace_time* seconds to stop by itself, before
+    terminating and finally killing its process group."""
+    for sig, timeout in [
+        (None, grace_time),
+        (signal.SIGTERM, KILL_TIMEOUT),
+        (signal.SIGKILL, None),
+    ]:
+        if sig is not None:
+            _kill_process_group(process, sig)
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+            break
+        except asyncio.TimeoutError:
+            pass
+    # Kill processes the command left behind.
+    _kill_process_group(process)
+    _processes.discard(process)
+
+
+class Server(object):
+    """An rddlsim server that is used by a single run."""
+
+    def __init__(self, args, memory_limit, port, benchmarks_dir):
+        self.args = args
+        self.memory_limit = memory_limit
+        self.port = port
+        self.benchmarks_dir = benchmarks_dir
+        self.process = None
+        self.properties = {}
+
+    async def start(self):
+        """Start the server and return whether it listens on its port."""
+        log, err = SERVER_LOGS
+        self.logs = [
+            LimitedLog(log, compress=self.args.compress_logs),
+            LimitedLog(err),
+        ]
+        self.process, self.pumps = await _start_process(
+            get_server_command(self.args, self.port, self.benchmarks_dir),
+            self.memory_limit,
+            *self.logs
+        )
+        return await _wait_until_ready(
+            self.port, self.has_exited, self.args.server_timeout
+        )
+
+    def has_exited(self):
+        return self.process.returncode is not None
+
+    async def stop(self, grace_time=None):
+        if grace_time is None:
+            grace_time = self.args.server_grace_time
+        await _stop_process(self.process, grace_time)
+        await asyncio.gather(*self.pumps)
+        for log in self.logs:
+            log.close()
+            if os.path.getsize(log.name) == 0:
+                os.remove(log.name)
+
+
+class _PoolLock(object):
+    """Exclusive lock on a file that is released when the process dies."""
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def __enter__(self):
+        self.file = open(self.filename, "a")
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+        return False
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_pool_state(state_file):
+    if not os.path.exists(state_file):
+        return None
+    with open(state_file) as f:
+        return json.load(f)
+
+
+def _get_leases(lease_dir):
+    """Return the leases of living runs and remove the others."""
+    leases = []
+    for name in os.listdir(lease_dir):
+        if _is_alive(int(name)):
+            leases.append(name)
+        else:
+            # The run died without releasing its lease.
+            os.remove(os.path.join(lease_dir, name))
+    return leases
+
+
+def _stop_detached_process(pid):
+    """Terminate and finally kill the process group of *pid*."""
+    for sig in [signal.SIGTERM, signal.SIGKILL]:
+        try:
+            os.killpg(pid, sig)
+        except OSError:
+            return
+        deadline = time.time() + KILL_TIMEOUT
+        while time.time() < deadline:
+            if not _is_alive(pid):
+                return
+            time.sleep(POLL_INTERVAL)
+
+
+def reap_server_pool(pool_dir, pid):
+    """Stop the pooled server with process ID *pid* in *pool_dir* as soon
+    as no run holds a lease on it anymore.
+
+    The reaper runs in its own session next to the server, so that the
+    server stays available when the run that started it ends.
+    """
+    lock_file = os.path.join(pool_dir, "lock")
+    state_file = os.path.join(pool_dir, "server.json")
+    lease_dir = os.path.join(pool_dir, "leases")
+    while True:
+        time.sleep(REAPER_INTERVAL)
+        with _PoolLock(lock_file):
+            state = _read_pool_state(state_file)
+            if state is not None and state["pid"] == pid:
+                if _is_alive(pid) and _get_leases(lease_dir):
+                    continue
+                # Later runs start a new server.
+                os.remove(state_file)
+        logging.info("No leases left, stopping server {}".format(pid))
+        _stop_detached_process(pid)
+        return
+
+
+class PooledServer(object):
+    """An rddlsim server that is shared by the runs on a node.
+
+    Servers are identified by the benchmarks directory, the seed, the
+    number of rounds and the timeout they are started with, since
+    rddlsim fixes these values for all of its sessions. Each session
+    chooses its instance, so all runs of an experiment can share a
+    server that loads the RDDL files of the whole experiment.
+
+    The state of each server is stored in a node-local directory that
+    is protected by a lock. A run that finds no running server starts
+    one in a new session, together with a reaper process (see
+    :func:`reap_server_pool`). All runs register a lease while they use
+    the server and release it when they are done, without waiting for
+    other runs. The reaper stops the server once no lease is left, so
+    no run's time or time limit depends on other runs and no server
+    outlives the runs that use it, which grid engines may rely on.
+    Since the server outlives the run that started it, its output is
+    written to the pool directory instead of the run directory.
+    """
+
+    def __init__(self, args, memory_limit):
+        self.args = args
+        self.memory_limit = memory_limit
+        benchmarks_dir = os.path.abspath(args.server_pool_benchmarks_dir)
+        key = hashlib.sha1(
+            json.dumps(
+                [benchmarks_dir, args.seed, args.num_runs, args.rddlsim_runtime]
+            ).encode()
+        ).hexdigest()
+        self.benchmarks_dir = benchmarks_dir
+        self.pool_dir = os.path.join(args.server_pool_dir, key)
+        self.lock_file = os.path.join(self.pool_dir, "lock")
+        self.lease_dir = os.path.join(self.pool_dir, "leases")
+        self.state_file = os.path.join(self.pool_dir, "server.json")
+        self.lease_file = os.path.join(self.lease_dir, str(os.getpid()))
+        self.process = None
+        self.ready = False
+        self.port = None
+        self.properties = {}
+
+    def _start_server(self):
+        log, err = [os.path.join(self.pool_dir, name) for name in SERVER_LOGS]
+        command = get_server_command(self.args, self.port, self.benchmarks_dir)
+        logging.info("Starting {}".format(command))
+        with open(log, "wb") as stdout, open(err, "wb") as stderr:
+            return subprocess.Popen(
+                command,
+                stdout=stdout,
+                stderr=stderr,
+                preexec_fn=_limit_memory(self.memory_limit),
+                start_new_session=True,
+            )
+
+    def _start_reaper(self):
+        subprocess.Popen(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--reap-server-pool",
+                self.pool_dir,
+                str(self.process.pid),
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+    async def start(self):
+        os.makedirs(self.lease_dir, exist_ok=True)
+        # Other runs wait until we started the server or decided to reuse one.
+        with _PoolLock(self.lock_file):
+            state = _read_pool_state(self.state_file)
+            if (
+                state is not None
+                and _is_alive(state["pid"])
+                and _is_listening(state["port"])
+            ):
+                self.port = state["port"]
+                logging.info("Reusing pooled server on port {}".format(self.port))
+            else:
+                self.port = get_free_port()
+                self.process = self._start_server()
+                if not await _wait_until_ready(
+                    self.port, self.has_exited, self.args.server_timeout
+                ):
+                    # Let the failure be classified by the server output.
+                    for name in SERVER_LOGS:
+                        shutil.copy(os.path.join(self.pool_dir, name), name)
+                    return False
+                with open(self.state_file + ".tmp", "w") as f:
+                    json.dump({"pid": self.process.pid, "port": self.port}, f)
+                os.replace(self.state_file + ".tmp", self.state_file)
+                self._start_reaper()
+                logging.info("Started pooled server on port {}".format(self.port))
+            with open(self.lease_file, "w"):
+                pass
+        self.ready = True
+        self.properties = {
+            "server_pool_owner": self.process is not None,
+            "server_pool_port": self.port,
+            "server_pool_dir": self.pool_dir,
+        }
+        return True
+
+    def has_exited(self):
+        return self.process is not None and self.process.poll() is not None
+
+    async def stop(self):
+        if os.path.exists(self.lease_file):
+            os.remove(self.lease_file)
+        if self.process is not None and not self.ready:
+            # No other run uses a server that never became ready.
+            _kill_process_group(self.process)
+            self.process.wait()
+
+
+async def run_attempt(args, memory_limit, time_limit, stdout, stderr):
+    """Run rddlsim and Prost with *memory_limit* MiB each and a
+    wall-clock limit of *time_limit* seconds (or None) for Prost, and
+    write the output of Prost to the binary files *stdout* and *stderr*.
+
+    Return the exit code of the planner, a failure detected by the
+    supervisor (or None) and the time spent in each phase.
+    """
+    timings = {}
+    start = time.time()
+    if args.server_pool:
+        server = PooledServer(args, memory_limit)
+    else:
+        server = Server(args, memory_limit, args.port, args.benchmarks_dir)
+    ready = await server.start()
+    timings["server_startup_time"] = time.time() - start
+    failure = None
+    if ready:
+        if os.path.exists(PLANNER_MEMORY_FILE):
+            os.remove(PLANNER_MEMORY_FILE)
+        planner_start = time.time()
+        planner, planner_pumps = await _start_process(
+            get_planner_command(args, server.port, memory_limit),
+            memory_limit,
+            stdout,
+            stderr,
+            env=get_planner_environment(args),
+        )
+        try:
+            returncode = await asyncio.wait_for(planner.wait(), time_limit)
+        except asyncio.TimeoutError:
+            logging.error("Planner exceeded the time limit, killing it")
+            _kill_process_group(planner)
+            returncode = await planner.wait()
+        _kill_process_group(planner)
+        _processes.discard(planner)
+        await asyncio.gather(*planner_pumps)
+        timings["planner_run_time"] = time.time() - planner_start
+        if os.path.exists(PLANNER_MEMORY_FILE):
+            with open(PLANNER_MEMORY_FILE) as f:
+                timings["raw_memory"] = int(f.read())
+            os.remove(PLANNER_MEMORY_FILE)
+    else:
+        logging.error("Server did not listen on port {}".format(server.port))
+        if not server.has_exited():
+            failure = SERVER_NOT_READY
+        returncode = 1
+
+    shutdown_start = time.time()
+    await server.stop()
+    timings["server_shutdown_time"] = time.time() - shutdown_start
+    timings["attempt_wall_time"] = time.time() - start
+    timings.update(server.properties)
+    return returncode, failure, timings
+
+
+def classify_failure(returncode, files, output=b""):
+    """Return the reason why a process with exit code *returncode*
+    failed, judging by the content of *files* and the binary *output*.
+
+    The result is None for successful processes, ``"out_of_memory"``,
+    a key of :data:`INFRASTRUCTURE_FAILURES` or ``"planner"`` for all
+    other failures.
+    """
+    if returncode == 0:
+        return None
+    content = output.decode(errors="replace")
+    content += "".join(read_log(filename) for filename in files)
+    # Memory errors take precedence: a server that cannot allocate its
+    # heap also causes refused connections.
+    if any(pattern in content for pattern in OUT_OF_MEMORY_PATTERNS):
+        return OUT_OF_MEMORY
+    for failure, patterns in INFRASTRUCTURE_FAILURES.items():
+        if any(pattern in content for pattern in patterns):
+            return failure
+    return "planner"
+
+
+def get_free_port():
+    """Return a port that is currently not in use on this machine."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("", 0))
+        return sock.getsockname()[1]
+
+
+def _copy_file(filename, stream):
+    with open(filename, "rb") as f:
+        shutil.copyfileobj(f, stream)
+    stream.flush()
+
+
+def _remove_stale_copies(stage_dir, keep):
+    """Remove the copies in *stage_dir* that are neither among the
+    *keep* most recently used ones nor used within the last
+    STAGED_CODE_MIN_AGE seconds."""
+    copies = []
+    for name in os.listdir(stage_dir):
+        path = os.path.join(stage_dir, name)
+        if os.path.isdir(path):
+            copies.append((os.path.getmtime(path), name))
+    copies.sort(reverse=True)
+    for last_used, name in copies[keep:]:
+        if time.time() - last_used < STAGED_CODE_MIN_AGE:
+            continue
+        path = os.path.join(stage_dir, name)
+        lock_name = name.split(".tmp")[0] + ".lock"
+        with _PoolLock(os.path.join(stage_dir, lock_name)):
+            if time.time() - os.path.getmtime(path) >= STAGED_CODE_MIN_AGE:
+                logging.info("Removing stale staged code {}".format(path))
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def stage_code(code_dir, stage_dir, keep=STAGED_CODE_COPIES):
+    """Return a node-local copy of *code_dir* in *stage_dir* and whether
+    this call created it.
+
+    Copies are named after the code directory, which prostlab names
+    after the revision and its build options, so the content of a code
+    directory never changes. Only the first run on a node copies the
+    code, while the other runs wait for the lock. A copy is only used if
+    it is complete, which is marked by a file that is written after
+    copying. Runs touch the copy they use, and the run that copies the
+    code removes stale copies, keeping the *keep* most recently used
+    ones.
+    """
+    name = os.path.basename(os.path.normpath(code_dir))
+    staged_dir = os.path.join(stage_dir, name)
+    complete_file = os.path.join(staged_dir, ".prostlab-staged")
+    os.makedirs(stage_dir, exist_ok=True)
+    with _PoolLock(os.path.join(stage_dir, name + ".lock")):
+        if os.path.exists(complete_file):
+            os.utime(staged_dir)
+            return staged_dir, False
+        tmp_dir = "{}.tmp{}".format(staged_dir, os.getpid())
+        for path in [tmp_dir, staged_dir]:
+            if os.path.exists(path):
+                shutil.rmtree(path)
+        shutil.copytree(code_dir, tmp_dir, symlinks=True)
+        with open(os.path.join(tmp_dir, ".prostlab-staged"), "w") as f:
+            f.write(os.path.abspath(code_dir))
+        os.rename(tmp_dir, staged_dir)
+        os.utime(staged_dir)
+    _remove_stale_copies(stage_dir, keep)
+    return staged_dir, True
+
+
+def _use_staged_code(args):
+    start = time.time()
+    staged_dir, copied = stage_code(args.code_dir, args.stage_dir)
+    for name in ["planner", "server"]:
+        path = os.path.relpath(getattr(args, name), args.code_dir)
+        setattr(args, name, os.path.join(staged_dir, path))
+    logging.info("Using staged code in {}".format(staged_dir))
+    add_properties(
+        {
+            "code_staged_dir": staged_dir,
+            "code_staged_by_run": copied,
+            "code_staging_time": time.time() - start,
+        }
+    )
+
+
+def can_profile():
+    """Return whether perf is installed and may record processes of
+    this user."""
+    if shutil.which(PROFILER) is None:
+        return False
+    try:
+        result = subprocess.run(
+            [PROFILER, "record", "--quiet", "--output=/dev/null", "--", "true"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    except OSError:
+        return False
+    return result.returncode == 0
+
+
+def parse_profile_report(report):
+    """Return a list of ``[function, object, percentage]`` entries for
+    the lines of *report*, which perf writes with ``;`` as field
+    separator and sorted by object and function."""
+    functions = []
+    for line in report.splitlines():
+        parts = line.strip().split(";", 2)
+        if len(parts) != 3 or not parts[0].endswith("%"):
+            continue
+        percentage, dso, symbol = parts
+        # Strip the privilege level, e.g., "[.] " for user space.
+        if symbol.startswith("[") and "] " in symbol:
+            symbol = symbol.split("] ", 1)[1]
+        functions.append([symbol.strip(), dso.strip(), float(percentage[:-1])])
+    functions.sort(key=lambda function: -function[2])
+    return functions
+
+
+def summarize_profile():
+    """Add the functions that take the most time in the profiled
+    processes to the properties and compress the profile.
+
+    Symbols are resolved on the node that recorded the profile, since
+    the binaries and their debug information may be missing elsewhere.
+    """
+    if not os.path.exists(PROFILE_DATA):
+        logging.error("Profiler did not write {}".format(PROFILE_DATA))
+        add_properties({"profile_error": "missing profile data"})
+        return
+    start = time.time()
+    result = subprocess.run(
+        [
+            PROFILER,
+            "report",
+            "--input=" + PROFILE_DATA,
+            "--stdio",
+            "--quiet",
+            "--no-children",
+            "--call-graph=none",
+            "--sort=dso,symbol",
+            "--comms=" + ",".join(PROFILED_COMMANDS),
+            "--field-separator=;",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        universal_newlines=True,
+    )
+    functions = parse_profile_report(result.stdout)
+    with open(PROFILE_DATA, "rb") as src, gzip.open(
+        PROFILE_DATA + COMPRESSED_SUFFIX, "wb"
+    ) as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(PROFILE_DATA)
+    # Perf keeps the profile of the previous attempt.
+    if os.path.exists(PROFILE_DATA + ".old"):
+        os.remove(PROFILE_DATA + ".old")
+    add_properties(
+        {
+            "profile_hot_functions": functions[:NUM_HOT_FUNCTIONS],
+            "profile_summary_time": time.time() - start,
+        }
+    )
+
+
+def _calibration_benchmark():
+    """A deterministic mix of arithmetic, hashing and memory accesses,
+    the main ingredients of the search."""
+    table = {}
+    values = list(range(1 << 16))
+    x = 1
+    for _ in range(2000000):
+        x = (x * 1103515245 + 12345) & 0x7FFFFFFF
+        key = x & 0xFFFF
+        table[key] = table.get(key, 0) + values[(x >> 8) & 0xFFFF]
+    return len(table)
+
+
+def calibrate(repetitions=3):
+    """Return the fastest of *repetitions* executions of the calibration
+    benchmark in seconds."""
+    times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        _calibration_benchmark()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def get_speed_factor(calibration_file=CALIBRATION_FILE):
+    """Return the speed of this node relative to the reference machine
+    and whether it was measured by this call.
+
+    Times measured on the node are multiplied with the factor to
+    estimate the time on the reference machine, e.g., nodes that are
+    twice as fast have a factor of 2. The benchmark is only executed by
+    the first run on the node, while other runs wait for the lock and
+    use the cached result. Since the benchmark runs in Python, results
+    are cached per Python version. If the cache cannot be accessed, the
+    benchmark is executed without caching the result.
+    """
+    try:
+        return _get_cached_speed_factor(calibration_file)
+    except (OSError, ValueError) as err:
+        logging.warning("Cannot use calibration cache: {}".format(err))
+        return CALIBRATION_REFERENCE_TIME / calibrate(), True
+
+
+def _get_cached_speed_factor(calibration_file):
+    key = "{}-python{}-v{}".format(
+        socket.gethostname(), platform.python_version(), CALIBRATION_VERSION
+    )
+    with _PoolLock(calibration_file + ".lock"):
+        results = {}
+        if os.path.exists(calibration_file):
+            with open(calibration_file) as f:
+                results = json.load(f)
+        if key in results:
+            return results[key], False
+        benchmark_time = calibrate()
+        results[key] = CALIBRATION_REFERENCE_TIME / benchmark_time
+        tmp_file = "{}.tmp{}".format(calibration_file, os.getpid())
+        with open(tmp_file, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, calibration_file)
+        logging.info("Calibration benchmark took {:.3f}s".format(benchmark_time))
+    return results[key], True
+
+
+def _add_log_properties(log):
+    add_properties(
+        {
+            "run_log_size": log.size,
+            "run_log_compressed_size": os.path.getsize(
+                "run.log" + COMPRESSED_SUFFIX
+            ),
+        }
+    )
+
+
+async def supervise(args):
+    """Run attempts until one succeeds or may not be repeated and return
+    the exit code of the final attempt.
+
+    Each attempt may take the time limit of an attempt, but only as
+    long as the total time limit of the run allows.
+    """
+    deadline = None
+    if args.total_time_limit is not None:
+        deadline = time.time() + args.total_time_limit
+    tiers = args.memory_tiers
+    tier = args.start_tier
+    retries = 0
+    attempts = []
+    run_log = None
+    output = sys.stdout.buffer
+    if args.compress_logs:
+        run_log = output = LimitedLog(
+            "run.log",
+            compress=True,
+            soft_limit=args.soft_stdout_limit,
+            hard_limit=args.hard_stdout_limit,
+        )
+    try:
+        while True:
+            memory_limit = tiers[tier]
+            time_limit = args.time_limit
+            if deadline is not None:
+                remaining = deadline - time.time()
+                time_limit = remaining if time_limit is None else min(time_limit, remaining)
+            may_repeat = tier < len(tiers) - 1 or retries < args.max_retries
+            stdout = OutputTail(output)
+            if may_repeat:
+                err_file = "run-attempt{}.err".format(len(attempts))
+                with open(err_file, "wb") as err:
+                    stderr = OutputTail(err)
+                    returncode, failure, timings = await run_attempt(
+                        args, memory_limit, time_limit, stdout, stderr
+                    )
+            else:
+                stderr = OutputTail(sys.stderr.buffer)
+                returncode, failure, timings = await run_attempt(
+                    args, memory_limit, time_limit, stdout, stderr
+                )
+            failure = failure or classify_failure(
+                returncode, SERVER_LOGS, stdout.data + stderr.data
+            )
+            attempt = {
+                "memory_tier": tier,
+                "memory_limit": memory_limit,
+                "time_limit": time_limit,
+                "port": args.port,
+                "returncode": returncode,
+                "failure": failure,
+            }
+            attempt.update(timings)
+            attempts.append(attempt)
+            logging.info("Attempt finished: {}".format(attempt))
+            props = {
+                "memory_tier": tier,
+                "memory_tier_limit": memory_limit,
+                "port": args.port,
+                "attempts": attempts,
+            }
+            props.update(timings)
+            add_properties(props)
+
+            repeat = False
+            backoff = RETRY_BACKOFF * (retries + 1)
+            if _terminated:
+                pass
+            elif (
+                may_repeat
+                and deadline is not None
+                and deadline - time.time() - backoff < MIN_ATTEMPT_TIME
+            ):
+                logging.info("No time left for repeating the attempt")
+            elif may_repeat and failure == OUT_OF_MEMORY and tier < len(tiers) - 1:
+                logging.info("Out of memory, escalating to the next memory tier")
+                tier += 1
+                repeat = True
+            elif (
+                may_repeat
+                and failure in INFRASTRUCTURE_FAILURES
+                and retries < args.max_retries
+            ):
+                retries += 1
+                if failure == "port_in_use":
+                    args.port = get_free_port()
+                logging.info(
+                    "Infrastructure failure ({}), retry {} of {}".format(
+                        failure, retries, args.max_retries
+                    )
+                )
+                await asyncio.sleep(backoff)
+                repeat = True
+            if repeat:
+                # Keep the error output of repeated attempts for debugging.
+                output.write("\n{}\n".format(REPEATED_ATTEMPT_MARKER).encode())
+                output.flush()
+            else:
+                if may_repeat:
+                    _copy_file(err_file, sys.stderr.buffer)
+                    os.remove(err_file)
+                return returncode
+    finally:
+        if run_log is not None:
+            run_log.close()
+            _add_log_properties(run_log)
+
+
+def main():
+    if sys.argv[1:2] == ["--measure-memory"]:
+        filename, separator = sys.argv[2:4]
+        assert separator == "--"
+        returncode = measure_memory(filename, sys.argv[4:])
+        if returncode < 0:
+            # Terminate with the signal that terminated the command.
+            signal.signal(-returncode, signal.SIG_DFL)
+            os.kill(os.getpid(), -returncode)
+        sys.exit(returncode)
+    if sys.argv[1:2] == ["--reap-server-pool"]:
+        pool_dir, pid = sys.argv[2:4]
+        logging.basicConfig(
+            filename=os.path.join(pool_dir, "reaper.log"),
+            level=logging.INFO,
+            format="%(asctime)-s %(levelname)-8s %(message)s",
+        )
+        reap_server_pool(pool_dir, int(pid))
+        return
+    logging.basicConfig(
+        filename="supervisor.log",
+        level=logging.INFO,
+        format="%(asctime)-s %(levelname)-8s %(message)s",
+    )
+    args = parse_args()
+    if args.stage_code:
+        _use_staged_code(args)
+    if args.calibrate:
+        speed_factor, calibrated = get_speed_factor()
+        add_properties(
+            {"node_speed_factor": speed_factor, "node_calibrated_by_run": calibrated}
+        )
+    if args.profile:
+        args.profile = can_profile()
+        if not args.profile:
+            logging.warning("Cannot record profiles with {}".format(PROFILER))
+        add_properties({"profiled": args.profile, "profile_tool": PROFILER})
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.add_signal_handler(signal.SIGTERM, _terminate)
+    try:
+        returncode = loop.run_until_complete(supervise(args))
+    finally:
+        loop.close()
+    if args.profile:
+        summarize_profile()
+    # Negative exit codes denote signals, which we report like a shell.
+    sys.exit(returncode if returncode >= 0 else 128 - returncode)
+
+
+if __name__ == "__main__":
+    main()
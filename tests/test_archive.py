@@ -0,0 +1,120 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gzip
+import json
+import os
+
+import pytest
+
+from prostlab.archive import INDEX_FILE, RunArchive, RunArchiver
+
+
+def _add_run(exp_path, run_id, finished=True):
+    run_dir = exp_path / "runs-00001-00100" / "{:0>5}".format(run_id)
+    run_dir.mkdir(parents=True)
+    (run_dir / "static-properties").write_text(
+        json.dumps({"id": ["alg", "task{}".format(run_id)], "run_dir": str(run_dir)})
+    )
+    (run_dir / "properties").write_text(
+        json.dumps({"attempts": [{"failure": None}], "reward": run_id})
+    )
+    if finished:
+        (run_dir / "driver.log").write_text("planner wall-clock time: 1.00s\n")
+    (run_dir / "run.log").write_text("run {}\n".format(run_id))
+    with gzip.open(str(run_dir / "server.log.gz"), "wt") as f:
+        f.write("server {}\n".format(run_id))
+    os.symlink("../../benchmarks/task.rddl", str(run_dir / "task.rddl"))
+    return run_dir
+
+
+@pytest.fixture
+def exp_path(tmp_path):
+    exp_path = tmp_path / "exp"
+    for run_id in range(1, 4):
+        _add_run(exp_path, run_id)
+    _add_run(exp_path, 4, finished=False)
+    RunArchiver()(str(exp_path), runs_per_archive=2)
+    return exp_path
+
+
+def test_archiver_keeps_unfinished_runs(exp_path):
+    runs_dir = exp_path / "runs-00001-00100"
+    assert sorted(os.listdir(str(runs_dir))) == ["00004"]
+    with open(str(exp_path / INDEX_FILE)) as f:
+        assert json.load(f) == {
+            "runs-00001-00100/00001": "archives/runs-00001-00002.zip",
+            "runs-00001-00100/00002": "archives/runs-00001-00002.zip",
+            "runs-00001-00100/00003": "archives/runs-00003-00004.zip",
+        }
+
+
+def test_archive_round_trip(exp_path, tmp_path):
+    archive = RunArchive(str(exp_path))
+    run_dir = "runs-00001-00100/00003"
+    assert archive.run_dirs == [
+        "runs-00001-00100/00001",
+        "runs-00001-00100/00002",
+        run_dir,
+    ]
+    assert archive.read_log(run_dir, "run.log") == "run 3\n"
+    assert archive.read_log(run_dir, "server.log") == "server 3\n"
+    assert archive.read_log(run_dir, "run.err") is None
+    props = archive.fetch_run(run_dir)
+    assert props["reward"] == 3
+    assert props["id"] == ["alg", "task3"]
+    assert props["run_archive"] == "archives/runs-00003-00004.zip"
+    assert "error" not in props
+
+    dest = tmp_path / "extracted"
+    archive.extract(run_dir, str(dest))
+    archive.close()
+    assert os.readlink(str(dest / "task.rddl")) == "../../benchmarks/task.rddl"
+    assert (dest / "driver.log").read_text() == "planner wall-clock time: 1.00s\n"
+    with gzip.open(str(dest / "server.log.gz"), "rt") as f:
+        assert f.read() == "server 3\n"
+
+
+def test_archiver_appends_to_existing_archives(exp_path):
+    run_dir = exp_path / "runs-00001-00100" / "00004"
+    (run_dir / "driver.log").write_text("planner wall-clock time: 1.00s\n")
+    RunArchiver()(str(exp_path), runs_per_archive=2)
+    assert not (exp_path / "runs-00001-00100").exists()
+    archive = RunArchive(str(exp_path))
+    assert archive.read_log("runs-00001-00100/00003", "run.log") == "run 3\n"
+    assert archive.read_log("runs-00001-00100/00004", "run.log") == "run 4\n"
+    assert archive.index["runs-00001-00100/00004"] == "archives/runs-00003-00004.zip"
+
+
+def test_update_runs(exp_path, tmp_path):
+    def update(run_dir):
+        assert os.path.islink(os.path.join(run_dir, "task.rddl"))
+        with open(os.path.join(run_dir, "properties")) as f:
+            props = json.load(f)
+        props["reward"] *= 10
+        with open(os.path.join(run_dir, "properties"), "w") as f:
+            json.dump(props, f)
+
+    RunArchive(str(exp_path)).update_runs(update)
+    archive = RunArchive(str(exp_path))
+    assert [archive.fetch_run(run_dir)["reward"] for run_dir in archive.run_dirs] == [
+        10,
+        20,
+        30,
+    ]
+    archive.extract("runs-00001-00100/00001", str(tmp_path / "extracted"))
+    assert os.path.islink(str(tmp_path / "extracted" / "task.rddl"))
+    assert archive.read_log("runs-00001-00100/00001", "server.log") == "server 1\n"
@@ -0,0 +1,85 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+
+import pytest
+
+from prostlab.database import ResultsDatabase
+
+
+def _get_run(domain, algorithm, reward):
+    return {"domain": domain, "algorithm": algorithm, "reward": reward}
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ResultsDatabase(str(tmp_path / "results.db"))
+    # The newer experiment is added first.
+    db.add_runs(
+        "exp2",
+        {
+            "00001": _get_run("elevators", "uct", 2),
+            "00002": _get_run("navigation", "uct", 2),
+        },
+        fetch_time=2000,
+    )
+    db.add_runs(
+        "exp1",
+        {
+            "00001": _get_run("elevators", "uct", 1),
+            "00003": _get_run("tamarisk", "thts", 1),
+        },
+        fetch_time=datetime.datetime.fromtimestamp(1000),
+    )
+    return db
+
+
+def test_latest_run_wins(db):
+    runs = db.get_runs()
+    assert sorted(runs) == ["00001", "00002", "00003"]
+    assert runs["00001"]["reward"] == 2
+    assert db.get_runs({"experiment": "exp1"})["00001"]["reward"] == 1
+
+
+def test_since_and_until(db):
+    assert sorted(db.get_runs({"since": 1500})) == ["00001", "00002"]
+    assert sorted(db.get_runs({"until": 1500})) == ["00001", "00003"]
+    assert db.get_runs({"until": 1500})["00001"]["reward"] == 1
+    since = datetime.datetime.fromtimestamp(1000)
+    until = datetime.datetime.fromtimestamp(2000)
+    assert sorted(db.get_runs({"since": since, "until": until})) == [
+        "00001",
+        "00002",
+        "00003",
+    ]
+    assert db.get_runs({"since": 2001}) == {}
+
+
+def test_filters(db):
+    runs = db.get_runs({"domain": ["elevators", "tamarisk"]})
+    assert sorted(runs) == ["00001", "00003"]
+    assert runs["00001"]["reward"] == 2
+    assert sorted(db.get_runs({"algorithm": "thts", "experiment": "exp1"})) == [
+        "00003"
+    ]
+    assert db.get_experiments() == ["exp1", "exp2"]
+
+
+def test_replace_run(db):
+    db.add_runs("exp1", {"00001": _get_run("elevators", "uct", 3)}, fetch_time=3000)
+    assert db.get_runs()["00001"]["reward"] == 3
+    assert len(db.get_runs({"experiment": "exp1"})) == 2
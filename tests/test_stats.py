@@ -0,0 +1,129 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import math
+
+import pytest
+
+from prostlab import stats
+
+
+@pytest.mark.parametrize(
+    "x, df, expected",
+    [
+        # Critical values of the chi-squared distribution.
+        (3.841458820694124, 1, 0.05),
+        (6.634896601021214, 1, 0.01),
+        (5.991464547107979, 2, 0.05),
+        (11.070497693516351, 5, 0.05),
+        (18.307038053275146, 10, 0.05),
+        (124.34211340400407, 100, 0.05),
+        # With two degrees of freedom, P(X >= x) = exp(-x / 2).
+        (2.0, 2, math.exp(-1)),
+        (30.0, 2, math.exp(-15)),
+        (0.0, 3, 1.0),
+    ],
+)
+def test_chi2_sf(x, df, expected):
+    assert stats.chi2_sf(x, df) == pytest.approx(expected, rel=1e-8)
+
+
+@pytest.mark.parametrize(
+    "t, df, expected",
+    [
+        # Critical values of Student's t-distribution.
+        (6.313751514675041, 1, 0.05),
+        (2.015048372669157, 5, 0.05),
+        (2.228138851986274, 10, 0.025),
+        (2.845339709785683, 20, 0.005),
+        # With one degree of freedom, the distribution is the Cauchy
+        # distribution, with two it has a closed form as well.
+        (1.0, 1, 0.25),
+        (-1.0, 1, 0.75),
+        (3.0, 2, 0.5 - 3 / (2 * math.sqrt(2 + 9))),
+        (0.0, 7, 0.5),
+    ],
+)
+def test_t_sf(t, df, expected):
+    assert stats.t_sf(t, df) == pytest.approx(expected, rel=1e-8)
+
+
+def test_t_quantile_inverts_t_sf():
+    assert stats.t_quantile(0.975, 10) == pytest.approx(2.228138851986274, rel=1e-9)
+
+
+def test_rank_averages_ties():
+    assert stats.rank([3, 1, 3, 2]) == [3.5, 1.0, 3.5, 2.0]
+
+
+def test_friedman_test_without_ties():
+    # The first treatment is best and the last one worst in all blocks:
+    # the statistic is 12 / (n k (k + 1)) * sum(R^2) - 3 n (k + 1) = 8.
+    blocks = [[3, 2, 1], [30, 20, 10], [0.3, 0.2, 0.1], [7, 5, 3]]
+    statistic, p_value, rank_sums, compare = stats.friedman_test(blocks)
+    assert statistic == pytest.approx(8.0)
+    assert p_value == pytest.approx(math.exp(-4))
+    assert rank_sums == [4, 8, 12]
+    # All blocks agree, so any difference of the rank sums is significant.
+    assert compare(4, 8) == 0.0
+    assert compare(8, 8) == 1.0
+
+
+def test_friedman_test_with_ties():
+    # Reference values from scipy.stats.friedmanchisquare.
+    blocks = [[1, 2, 3], [2, 2, 1], [3, 1, 2], [3, 2, 1], [2, 1, 1]]
+    statistic, p_value, rank_sums, compare = stats.friedman_test(blocks)
+    assert rank_sums == [7.5, 11.0, 11.5]
+    assert statistic == pytest.approx(2.1111111111111174)
+    assert p_value == pytest.approx(0.3479990407922542)
+    assert compare(7.5, 7.5) == pytest.approx(1.0)
+    assert compare(7.5, 11.5) < compare(7.5, 11.0) < 1.0
+
+
+def test_friedman_test_without_differences():
+    statistic, p_value, _, compare = stats.friedman_test([[1, 1], [2, 2]])
+    assert (statistic, p_value) == (0.0, 1.0)
+    assert compare(3, 3) == 1.0
+
+
+@pytest.mark.parametrize(
+    "differences, expected_statistic, expected_p_value",
+    [
+        # Exact p-values, as computed by scipy.stats.wilcoxon with
+        # alternative="greater" and method="exact".
+        ([1, 2, 3, 4, 5], 15, 1 / 32),
+        ([1, -2, 3, 4, 5], 13, 3 / 32),
+        ([-1, -2, -3], 0, 1.0),
+        # Zero differences are dropped.
+        ([0, 0, 1, 2], 3, 1 / 4),
+    ],
+)
+def test_wilcoxon_test_exact(differences, expected_statistic, expected_p_value):
+    statistic, p_value = stats.wilcoxon_test(differences)
+    assert statistic == expected_statistic
+    assert p_value == pytest.approx(expected_p_value)
+
+
+def test_wilcoxon_test_with_ties():
+    # Reference values from scipy.stats.wilcoxon with
+    # alternative="greater", correction=True and method="approx".
+    statistic, p_value = stats.wilcoxon_test([1, 1, 2, 2, 3, 3, -1, 4, 5, 5])
+    assert statistic == 53.0
+    assert p_value == pytest.approx(0.0052351380392808445)
+
+
+def test_wilcoxon_test_without_differences():
+    assert stats.wilcoxon_test([0, 0]) == (0.0, 1.0)
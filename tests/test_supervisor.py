@@ -0,0 +1,289 @@
+# Prost Lab uses the Lab package to conduct experiments with the
+# Prost planning system.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import gzip
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from prostlab import supervisor
+
+
+# Listens on the port given with -p until it is terminated.
+FAKE_SERVER = """\
+import socket, sys
+args = sys.argv[1:]
+sock = socket.socket()
+sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+sock.bind(("localhost", int(args[args.index("-p") + 1])))
+sock.listen(5)
+while True:
+    sock.accept()[0].close()
+"""
+
+# Runs out of memory below FAKE_MIN_RAM KiB and otherwise prints the
+# n-th message of FAKE_ERRORS to stderr and fails in its n-th call.
+FAKE_PLANNER = """\
+import os, re, sys
+calls = int(open("planner-calls").read()) if os.path.exists("planner-calls") else 0
+with open("planner-calls", "w") as f:
+    f.write(str(calls + 1))
+ram = int(re.search(r"-ram (\\d+)", sys.argv[-1]).group(1))
+if ram < int(os.environ.get("FAKE_MIN_RAM", "0")):
+    sys.exit("terminate called after throwing an instance of 'std::bad_alloc'")
+errors = [error for error in os.environ.get("FAKE_ERRORS", "").split(",") if error]
+if calls < len(errors):
+    sys.exit(errors[calls])
+print(">>> END OF SESSION  -- AVERAGE REWARD: 1.0")
+"""
+
+
+def _write_script(path, content):
+    with open(path, "w") as f:
+        f.write("#! {}\n{}".format(sys.executable, content))
+    os.chmod(path, 0o755)
+    return str(path)
+
+
+@pytest.fixture
+def run_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(supervisor, "RETRY_BACKOFF", 0)
+    _write_script(tmp_path / "server.py", FAKE_SERVER)
+    _write_script(tmp_path / "planner.py", FAKE_PLANNER)
+    return tmp_path
+
+
+def _get_args(monkeypatch, *options):
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "supervisor.py",
+            "--server=server.py",
+            "--planner=planner.py",
+            "--port={}".format(supervisor.get_free_port()),
+            "--num-runs=1",
+            "--problem=elevators_inst_mdp__1",
+            "--search-engine=IPC2011",
+            "--server-grace-time=0",
+        ]
+        + list(options),
+    )
+    args = supervisor.parse_args()
+    args.server = os.path.abspath(args.server)
+    args.planner = os.path.abspath(args.planner)
+    return args
+
+
+def _supervise(args):
+    returncode = asyncio.run(supervisor.supervise(args))
+    with open(supervisor.PROPERTIES_FILE) as f:
+        return returncode, json.load(f)
+
+
+def test_supervise_success(run_dir, monkeypatch):
+    args = _get_args(monkeypatch, "--memory-tiers=1024")
+    returncode, props = _supervise(args)
+    assert returncode == 0
+    assert [attempt["failure"] for attempt in props["attempts"]] == [None]
+    assert props["raw_memory"] > 0
+    assert not os.path.exists(supervisor.PLANNER_MEMORY_FILE)
+
+
+def test_supervise_escalates_memory_tiers(run_dir, monkeypatch, capfdbinary):
+    # The planner needs more than the RAM of the first two tiers.
+    monkeypatch.setenv("FAKE_MIN_RAM", str((2048 - 512) * 1024 + 1))
+    args = _get_args(monkeypatch, "--memory-tiers=1024,2048,3072")
+    returncode, props = _supervise(args)
+    assert returncode == 0
+    assert [attempt["failure"] for attempt in props["attempts"]] == [
+        supervisor.OUT_OF_MEMORY,
+        supervisor.OUT_OF_MEMORY,
+        None,
+    ]
+    assert [attempt["memory_limit"] for attempt in props["attempts"]] == [
+        1024,
+        2048,
+        3072,
+    ]
+    assert props["memory_tier"] == 2
+    assert props["memory_tier_limit"] == 3072
+    output = capfdbinary.readouterr()
+    assert output.out.count(supervisor.REPEATED_ATTEMPT_MARKER.encode()) == 2
+    # Errors of repeated attempts are kept apart from the errors of the run.
+    assert b"bad_alloc" not in output.err
+    for attempt in range(2):
+        assert b"bad_alloc" in (run_dir / "run-attempt{}.err".format(attempt)).read_bytes()
+    assert not (run_dir / "run-attempt2.err").exists()
+
+
+def test_supervise_reports_out_of_memory_in_last_tier(run_dir, monkeypatch, capfdbinary):
+    monkeypatch.setenv("FAKE_MIN_RAM", str(10 ** 9))
+    args = _get_args(monkeypatch, "--memory-tiers=1024,2048")
+    returncode, props = _supervise(args)
+    assert returncode == 1
+    assert [attempt["failure"] for attempt in props["attempts"]] == [
+        supervisor.OUT_OF_MEMORY
+    ] * 2
+    assert capfdbinary.readouterr().err.count(b"bad_alloc") == 1
+
+
+def test_supervise_retries_infrastructure_failures(run_dir, monkeypatch):
+    monkeypatch.setenv("FAKE_ERRORS", "Connection refused,Address already in use")
+    args = _get_args(monkeypatch, "--memory-tiers=1024", "--max-retries=2")
+    first_port = args.port
+    returncode, props = _supervise(args)
+    assert returncode == 0
+    attempts = props["attempts"]
+    assert [attempt["failure"] for attempt in attempts] == [
+        "connection_refused",
+        "port_in_use",
+        None,
+    ]
+    # Runs move to a new port after the port was in use.
+    assert attempts[0]["port"] == attempts[1]["port"] == first_port
+    assert attempts[2]["port"] != first_port
+
+
+def test_supervise_gives_up_after_max_retries(run_dir, monkeypatch):
+    monkeypatch.setenv("FAKE_ERRORS", "Connection refused,Connection refused")
+    args = _get_args(monkeypatch, "--memory-tiers=1024", "--max-retries=1")
+    returncode, props = _supervise(args)
+    assert returncode == 1
+    assert [attempt["failure"] for attempt in props["attempts"]] == [
+        "connection_refused"
+    ] * 2
+
+
+def test_supervise_does_not_repeat_planner_failures(run_dir, monkeypatch):
+    monkeypatch.setenv("FAKE_ERRORS", "Segmentation fault")
+    args = _get_args(monkeypatch, "--memory-tiers=1024,2048", "--max-retries=2")
+    returncode, props = _supervise(args)
+    assert returncode == 1
+    assert [attempt["failure"] for attempt in props["attempts"]] == ["planner"]
+
+
+def test_classify_failure(tmp_path):
+    assert supervisor.classify_failure(0, [], b"std::bad_alloc") is None
+    assert supervisor.classify_failure(1, [], b"") == "planner"
+    assert (
+        supervisor.classify_failure(1, [], b"java.lang.OutOfMemoryError")
+        == supervisor.OUT_OF_MEMORY
+    )
+    server_log = tmp_path / "server.log"
+    server_log.write_text("java.net.BindException: Address already in use\n")
+    assert supervisor.classify_failure(1, [str(server_log)]) == "port_in_use"
+    # Memory errors take precedence over the infrastructure failures
+    # they cause.
+    assert (
+        supervisor.classify_failure(
+            1, [str(server_log)], b"Could not reserve enough space"
+        )
+        == supervisor.OUT_OF_MEMORY
+    )
+    # Compressed logs and missing files are read as well.
+    with gzip.open(str(tmp_path / "run.log.gz"), "wt") as f:
+        f.write("A fatal error has been detected by the Java Runtime Environment")
+    assert (
+        supervisor.classify_failure(
+            134, [str(tmp_path / "run.log"), str(tmp_path / "missing.log")]
+        )
+        == "jvm_crash"
+    )
+
+
+def _wait_for(condition, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(supervisor.POLL_INTERVAL)
+    return False
+
+
+def test_pooled_server_leases_and_reaper(run_dir, monkeypatch):
+    args = _get_args(
+        monkeypatch,
+        "--memory-tiers=1024",
+        "--server-pool",
+        "--server-pool-dir={}".format(run_dir / "pool"),
+        "--server-pool-benchmarks-dir={}".format(run_dir),
+    )
+    owner = supervisor.PooledServer(args, 1024)
+    assert asyncio.run(owner.start())
+    assert owner.properties["server_pool_owner"]
+    assert os.path.exists(owner.lease_file)
+    server = owner.process
+
+    # A second run on the node reuses the server. Its lease belongs to
+    # another living process.
+    other_run = subprocess.Popen(["sleep", "60"])
+    try:
+        user = supervisor.PooledServer(args, 1024)
+        user.lease_file = os.path.join(user.lease_dir, str(other_run.pid))
+        assert asyncio.run(user.start())
+        assert user.port == owner.port
+        assert not user.properties["server_pool_owner"]
+        assert user.process is None
+
+        # The server stays while a run holds a lease.
+        asyncio.run(owner.stop())
+        assert not os.path.exists(owner.lease_file)
+        time.sleep(3 * supervisor.REAPER_INTERVAL)
+        assert server.poll() is None
+        assert supervisor._is_listening(owner.port)
+    finally:
+        # Runs that die without releasing their lease do not keep the
+        # server alive.
+        other_run.kill()
+        other_run.wait()
+    try:
+        assert _wait_for(lambda: server.poll() is not None)
+        assert not os.path.exists(owner.state_file)
+        assert os.listdir(owner.lease_dir) == []
+    finally:
+        supervisor._kill_process_group(server)
+        server.wait()
+
+
+def test_pooled_server_is_restarted_after_reaping(run_dir, monkeypatch):
+    args = _get_args(
+        monkeypatch,
+        "--memory-tiers=1024",
+        "--server-pool",
+        "--server-pool-dir={}".format(run_dir / "pool"),
+        "--server-pool-benchmarks-dir={}".format(run_dir),
+    )
+    servers = []
+    try:
+        for _ in range(2):
+            run = supervisor.PooledServer(args, 1024)
+            assert asyncio.run(run.start())
+            assert run.properties["server_pool_owner"]
+            servers.append(run.process)
+            asyncio.run(run.stop())
+            assert _wait_for(lambda: run.process.poll() is not None)
+        assert servers[0].pid != servers[1].pid
+    finally:
+        for server in servers:
+            supervisor._kill_process_group(server)
+            server.wait()